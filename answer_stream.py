@@ -0,0 +1,212 @@
+import re
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+# En-têtes des deux sections demandées au LLM (voir PiagetRAG._create_prompt_template)
+ANSWER_HEADER = re.compile(r'^[\s#*]*R[ÉE]PONSE[\s*:]*')
+# La mise en forme markdown éventuelle (« **SOURCES:** », « ## SOURCES ») fait partie de l'en-tête
+SOURCES_HEADER = re.compile(r'[#*]*[ \t]*SOURCES[ \t*]*:?[ \t*]*')
+# Fin de texte qui peut être le début de l'en-tête SOURCES (« ** », « ## SOU »...)
+PARTIAL_SOURCES_HEADER = re.compile(r'(?:[#*]+[ \t]*)?(?:S(?:O(?:U(?:R(?:C(?:E)?)?)?)?)?)?\Z')
+# Mise en forme restée en tête de la section SOURCES (fin de l'en-tête reçue dans le fragment suivant)
+SOURCES_PREFIX = re.compile(r'^[\s#*]*(?:SOURCES)?[\s*:]*')
+# Longueur au-delà de laquelle un début de réponse sans en-tête RÉPONSE est affiché tel quel
+MAX_HEADER_LENGTH = 20
+
+class AnswerSectionParser:
+    """Découpage incrémental d'une réponse en sections RÉPONSE et SOURCES.
+
+    Les fragments reçus du LLM sont passés à `feed`, qui retourne la partie du
+    texte de la section RÉPONSE qui peut déjà être affichée : l'en-tête RÉPONSE est
+    retiré, et la fin d'un fragment qui pourrait être le début de l'en-tête SOURCES
+    (y compris sa mise en forme markdown, « ** » ou « ## ») est retenue jusqu'au
+    fragment suivant. La section SOURCES est accumulée dans
+    `sources_text`. `close` retourne le texte encore retenu."""
+
+    def __init__(self):
+        self.state = 'header'
+        self.pending = ""
+        self.sources_text = ""
+        self.started = False
+
+    def feed(self, text: str) -> str:
+        if self.state == 'sources':
+            self.sources_text += text
+            return ""
+        self.pending += text
+        if self.state == 'header':
+            match = ANSWER_HEADER.match(self.pending)
+            if match and match.end() < len(self.pending):
+                self.pending = self.pending[match.end():]
+            elif len(self.pending) > MAX_HEADER_LENGTH or not _could_start_header(self.pending):
+                # Réponse sans en-tête RÉPONSE
+                pass
+            else:
+                return ""
+            self.state = 'answer'
+        return self._emit_answer()
+
+    def _emit_answer(self) -> str:
+        match = SOURCES_HEADER.search(self.pending)
+        if match:
+            visible = self.pending[:match.start()].rstrip()
+            self.sources_text += self.pending[match.end():]
+            self.pending = ""
+            self.state = 'sources'
+        else:
+            # Fin du texte qui pourrait être le début de l'en-tête SOURCES, et espaces
+            # qui le précèdent (la réponse ne se termine pas par la ligne vide avant l'en-tête)
+            held = len(self.pending[:PARTIAL_SOURCES_HEADER.search(self.pending).start()].rstrip())
+            visible = self.pending[:held]
+            self.pending = self.pending[held:]
+        if not self.started:
+            visible = visible.lstrip()
+            self.started = bool(visible)
+        return visible
+
+    def close(self) -> str:
+        """Termine l'analyse et retourne le texte de la section RÉPONSE encore retenu."""
+        if self.state == 'sources':
+            return ""
+        if self.state == 'header':
+            match = ANSWER_HEADER.match(self.pending)
+            if match:
+                self.pending = self.pending[match.end():]
+        visible = self.pending.rstrip() if self.started else self.pending.strip()
+        self.pending = ""
+        self.state = 'sources'
+        return visible
+
+def _could_start_header(text: str) -> bool:
+    """Indique si le texte reçu peut encore être le début de l'en-tête RÉPONSE."""
+    stripped = text.lstrip(" \t\r\n#*")
+    return any(header.startswith(stripped) or stripped.startswith(header) for header in ("RÉPONSE", "REPONSE"))
+
+def parse_sources(sources_text: str) -> List[Dict[str, str]]:
+    """Analyse la section SOURCES d'une réponse.
+
+    Args:
+        sources_text: Texte de la section, avec ou sans l'en-tête « SOURCES »
+
+    Returns:
+        Liste de dictionnaires avec 'title', 'date', 'url' et 'citation' (chaînes
+        éventuellement vides) ; 'text' contient le reste de la source sans ses
+        métadonnées lorsque aucune citation entre guillemets n'a été trouvée
+    """
+    sources_text = SOURCES_PREFIX.sub('', sources_text).strip()
+    if not sources_text:
+        return []
+
+    # Diviser le texte en sources individuelles (numérotées)
+    source_blocks = []
+    current_block = ""
+    for line in sources_text.split('\n'):
+        if line.strip() and any(line.strip().startswith(str(i) + ".") for i in range(1, 20)):
+            if current_block:
+                source_blocks.append(current_block.strip())
+            current_block = line
+        else:
+            current_block += "\n" + line if current_block else line
+    if current_block:
+        source_blocks.append(current_block.strip())
+
+    sources = []
+    for source in source_blocks:
+        # Supprimer le numéro au début et les préfixes "SOURCES1." ou "SOURCES:"
+        cleaned_source = re.sub(r'^\d+\.\s*', '', source).strip()
+        cleaned_source = re.sub(r'^SOURCES\d*\.?\s*', '', cleaned_source).strip()
+        cleaned_source = re.sub(r'^SOURCES\s*:\s*', '', cleaned_source).strip()
+
+        # La citation est le texte entre guillemets
+        citation_match = re.search(r'"([^"]+)"', cleaned_source)
+        citation = ""
+        if citation_match:
+            citation = citation_match.group(1).strip()
+            remaining_text = cleaned_source.replace(citation_match.group(0), "").strip()
+        else:
+            remaining_text = cleaned_source
+
+        title, date, url = "", "", ""
+        # Titre et date, par exemple "Titre (1972)" ou "- Titre (1972)", puis l'URL
+        title_date_match = re.search(r'[-–—]?\s*([^\(]+)\s*\((\d{4})\)', remaining_text)
+        if title_date_match:
+            title = title_date_match.group(1).strip()
+            title = re.sub(r'^SOURCES\d*\.?\s*', '', title).strip()
+            title = re.sub(r'^[-–—]\s*', '', title).strip()
+            date = title_date_match.group(2).strip()
+            after_title_date = remaining_text[remaining_text.find(title_date_match.group(0)) + len(title_date_match.group(0)):]
+            url_match = re.search(r'(https?://\S+)', after_title_date)
+            if url_match:
+                url = url_match.group(1).strip()
+        else:
+            # Date seule, précédée éventuellement du titre
+            date_match = re.search(r'\((\d{4})\)', remaining_text)
+            if date_match:
+                date = date_match.group(1).strip()
+                before_date = remaining_text[:remaining_text.find(date_match.group(0))].strip()
+                if before_date:
+                    title = before_date.strip('- ').strip()
+                    title = re.sub(r'^SOURCES\d*\.?\s*', '', title).strip()
+                    title = re.sub(r'^[-–—]\s*', '', title).strip()
+            url_match = re.search(r'(https?://\S+)', remaining_text)
+            if url_match:
+                url = url_match.group(1).strip()
+
+        text = ""
+        if not citation:
+            # Texte de la source sans le titre, la date et l'URL
+            text = cleaned_source
+            if title:
+                text = text.replace(title, "").strip()
+            if date:
+                text = text.replace(f"({date})", "").strip()
+            if url:
+                text = text.replace(url, "").strip()
+            text = re.sub(r'[-–—]\s*', '', text).strip()
+        sources.append({'title': title, 'date': date, 'url': url, 'citation': citation, 'text': text})
+    return sources
+
+class AnswerStream:
+    """Réponse du LLM reçue fragment par fragment.
+
+    L'itération produit le texte de la section RÉPONSE au fur et à mesure de sa
+    génération (voir AnswerSectionParser). Une fois l'itération terminée, `text`
+    contient la réponse complète, `sources_text` la section SOURCES et `sources`
+    sa version structurée (voir parse_sources) ; `on_complete` est alors appelé
+    avec la réponse complète (mise en cache). `first_token_time` est le délai, en
+    secondes, entre le début de l'itération et le premier texte affichable."""
+
+    def __init__(self, chunks: Iterable[str], on_complete: Optional[Callable[[str], Any]] = None):
+        self.chunks = chunks
+        self.on_complete = on_complete
+        self.text = None
+        self.sources_text = ""
+        self.sources = []
+        self.first_token_time = None
+
+    def __iter__(self) -> Iterator[str]:
+        if self.text is not None:
+            raise RuntimeError("La réponse a déjà été lue")
+        parser = AnswerSectionParser()
+        parts = []
+        start = time.perf_counter()
+        for chunk in self.chunks:
+            parts.append(chunk)
+            visible = parser.feed(chunk)
+            if visible:
+                if self.first_token_time is None:
+                    self.first_token_time = time.perf_counter() - start
+                yield visible
+        visible = parser.close()
+        if visible:
+            yield visible
+        self.text = "".join(parts)
+        sources_text = SOURCES_PREFIX.sub('', parser.sources_text).strip()
+        self.sources_text = f"SOURCES\n{sources_text}" if sources_text else ""
+        self.sources = parse_sources(self.sources_text)
+        if self.on_complete is not None:
+            self.on_complete(self.text)
+
+    def read(self) -> str:
+        """Lit la réponse jusqu'au bout et retourne le texte de la section RÉPONSE."""
+        return "".join(self)
@@ -1,114 +1,880 @@
+import argparse
+import hashlib
 import json
+import multiprocessing
 import os
 import pickle
+import queue
+import sqlite3
+import threading
 import faiss
 import numpy as np
 import time
-from typing import List, Dict, Any
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Sequence, Tuple
 from tqdm import tqdm
 from sentence_transformers import SentenceTransformer
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
+from text_chunker import SentenceSpanChunker
+from document_store import DocumentStore, DocumentStoreWriter, store_exists, write_document_store
+from vector_index import (INDEX_TYPES, VECTOR_ENCODINGS, VECTORS_FILENAME, add_in_blocks, benchmark_index,
+                          new_index, report_quantization, requires_training, set_search_params, train_index,
+                          write_index_manifest)
+
+EMBEDDING_MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
+INDEX_FILENAME = "piaget_index.faiss"
+# Ancien format des documents (voir document_store.py pour la conversion)
+DOCUMENTS_FILENAME = "piaget_documents.pkl"
+BUILD_MANIFEST_FILENAME = "piaget_build_manifest.json"
+EMBEDDING_CACHE_FILENAME = "embedding_cache.sqlite"
+
+def hash_text(text: str) -> str:
+    """Retourne l'empreinte SHA-256 d'un texte."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def hash_work(item: Dict[str, Any]) -> str:
+    """Retourne l'empreinte d'une œuvre (texte et métadonnées)."""
+    fields = [item.get('title') or '', item.get('date') or '', item.get('url') or '', item['text']]
+    return hash_text('\x00'.join(str(field) for field in fields))
+
+class EmbeddingCache:
+    """Cache disque des embeddings, indexé par (modèle d'embedding, empreinte du chunk)."""
+
+    def __init__(self, path: str, model_name: str):
+        self.model_name = model_name
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, chunk_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, chunk_hash))"
+        )
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Retourne les vecteurs déjà en cache pour les empreintes données."""
+        hashes = list(hashes)
+        found = {}
+        # SQLite limite le nombre de paramètres par requête
+        for i in range(0, len(hashes), 500):
+            batch = hashes[i:i+500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.connection.execute(
+                f"SELECT chunk_hash, vector FROM embeddings WHERE model = ? AND chunk_hash IN ({placeholders})",
+                [self.model_name, *batch]
+            )
+            for chunk_hash, vector in rows:
+                found[chunk_hash] = np.frombuffer(vector, dtype=np.float32)
+        return found
+
+    def put_many(self, hashes: List[str], vectors: np.ndarray):
+        """Enregistre les vecteurs calculés pour les empreintes données."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, chunk_hash, vector) VALUES (?, ?, ?)",
+            ((self.model_name, chunk_hash, vector.tobytes()) for chunk_hash, vector in zip(hashes, vectors))
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+def load_build_manifest(output_dir: str) -> Optional[Dict[str, Any]]:
+    """Charge le manifeste de la construction précédente, s'il existe."""
+    path = os.path.join(output_dir, BUILD_MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def chunking_settings(chunk_size: int, chunk_overlap: int, chunker: str = "recursive",
+                      max_tokens: Optional[int] = None, dedup: bool = False,
+                      dedup_threshold: Optional[float] = None) -> Dict[str, Any]:
+    """Réglages qui déterminent les chunks d'une construction.
+
+    Les plages de chunks d'une construction ne sont réutilisables que par une
+    construction aux réglages identiques : le dédoublonnage, en particulier,
+    retire des chunks et ajoute des alias aux chunks conservés."""
+    return {
+        'chunk_size': chunk_size,
+        'chunk_overlap': chunk_overlap,
+        'chunker': chunker,
+        'max_tokens': max_tokens,
+        'dedup': dedup,
+        'dedup_threshold': dedup_threshold if dedup else None
+    }
+
+def same_chunking(manifest: Dict[str, Any], settings: Dict[str, Any]) -> bool:
+    """Indique si le manifeste a été construit avec les réglages donnés (voir chunking_settings).
+
+    Les anciens manifestes, sans 'dedup', ne sont pas considérés comme compatibles."""
+    defaults = {'chunker': "recursive"}
+    return all(manifest.get(name, defaults.get(name)) == value for name, value in settings.items())
+
+def save_build_manifest(output_dir: str, works: List[Dict[str, Any]], chunk_size: int, chunk_overlap: int,
+                        chunker: str = "recursive", max_tokens: Optional[int] = None,
+                        source_fingerprint: Optional[str] = None, dedup: bool = False,
+                        dedup_threshold: Optional[float] = None):
+    """Sauvegarde l'empreinte et la plage de chunks de chaque œuvre, et les réglages de découpage.
+
+    `source_fingerprint` est l'empreinte du corpus fournie par le manifeste des
+    œuvres modifiées du scraper (voir `load_changed_works`)."""
+    manifest = {
+        'source_fingerprint': source_fingerprint,
+        'embedding_model': EMBEDDING_MODEL_NAME,
+        **chunking_settings(chunk_size, chunk_overlap, chunker, max_tokens, dedup, dedup_threshold),
+        'works': works
+    }
+    with open(os.path.join(output_dir, BUILD_MANIFEST_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+def load_changed_works(path: str) -> Dict[str, Any]:
+    """Charge le manifeste des œuvres ajoutées, modifiées et retirées écrit par data_scrap.py."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
 
 def load_data(json_path: str) -> List[Dict[str, Any]]:
     """Charge les données JSON."""
+    return list(iter_works(json_path))
+
+def iter_works(json_path: str, read_size: int = 1 << 16) -> Iterator[Dict[str, Any]]:
+    """Lit les œuvres une à une, sans charger tout le corpus en mémoire.
+
+    Accepte soit un tableau JSON (format de data_scrap.py), soit un fichier JSONL
+    contenant une œuvre par ligne."""
     with open(json_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+        # Le format est donné par le premier caractère non blanc
+        stripped = ""
+        while not stripped:
+            data = f.read(read_size)
+            if not data:
+                return
+            stripped = data.lstrip()
+        if stripped.startswith('['):
+            yield from _iter_json_array(f, stripped[1:], read_size)
+            return
+        # JSONL : une œuvre par ligne
+        f.seek(0)
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
 
-def prepare_documents(raw_data: List[Dict[str, Any]], chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Document]:
-    """Prépare les documents en les divisant en chunks."""
-    text_splitter = RecursiveCharacterTextSplitter(
+def _iter_json_array(f, buffer: str, read_size: int) -> Iterator[Dict[str, Any]]:
+    """Décode les éléments d'un tableau JSON au fil de la lecture du fichier."""
+    decoder = json.JSONDecoder()
+    eof = False
+    while True:
+        # Ignorer les espaces et les virgules entre deux éléments
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if not buffer:
+            if eof:
+                raise ValueError("Tableau JSON non terminé")
+            data = f.read(read_size)
+            eof = not data
+            buffer += data
+            continue
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            # Élément incomplet : lire davantage (taille doublée pour les longs textes)
+            if eof:
+                raise
+            data = f.read(max(read_size, len(buffer)))
+            eof = not data
+            buffer += data
+            continue
+        yield item
+        buffer = buffer[end:]
+
+def create_text_splitter(chunk_size: int = 1000, chunk_overlap: int = 200) -> RecursiveCharacterTextSplitter:
+    """Crée le découpeur de texte utilisé pour les chunks."""
+    return RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
         separators=["\n\n", "\n", ". ", " ", ""]
     )
+
+def load_token_counter(model_name: str = EMBEDDING_MODEL_NAME):
+    """Retourne une fonction qui compte les tokens de chaque texte avec le tokenizer du modèle d'embedding."""
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(f"sentence-transformers/{model_name}")
+
+    def count_tokens(texts: List[str]) -> List[int]:
+        return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)['input_ids']]
+    return count_tokens
+
+def create_chunker(chunk_size: int = 1000, chunk_overlap: int = 200, chunker: str = "recursive",
+                   max_tokens: Optional[int] = None):
+    """Retourne la fonction de découpage d'un texte.
+
+    Args:
+        chunker: "recursive" (chunks sous forme de chaînes) ou "sentences" (intervalles
+            (début, fin) de phrases entières, voir text_chunker.py)
+        max_tokens: Limite de tokens par chunk, mesurée avec le tokenizer du modèle (sentences)
+    """
+    if chunker == "sentences":
+        token_counter = load_token_counter() if max_tokens else None
+        return SentenceSpanChunker(chunk_size, chunk_overlap, max_tokens, token_counter).split_spans
+    if max_tokens:
+        raise ValueError("max_tokens n'est disponible qu'avec le découpeur 'sentences'")
+    return create_text_splitter(chunk_size, chunk_overlap).split_text
+
+def make_document(text: str, metadata: Dict[str, Any]) -> Document:
+    """Crée un Document qui partage le dictionnaire de métadonnées fourni (sans copie)."""
+    construct = getattr(Document, 'model_construct', None) or Document.construct
+    return construct(page_content=text, metadata=metadata)
+
+# Découpeur propre à chaque processus du pool de chunking
+_worker_split = None
+
+def _init_chunking_worker(chunk_size: int, chunk_overlap: int, chunker: str, max_tokens: Optional[int]):
+    global _worker_split
+    _worker_split = create_chunker(chunk_size, chunk_overlap, chunker, max_tokens)
+
+def _split_text_in_worker(text: str) -> List[Any]:
+    return _worker_split(text)
+
+def _iter_split_works(items: Iterable[Tuple[Any, Optional[str]]], chunk_size: int, chunk_overlap: int,
+                      workers: int, chunker: str = "recursive",
+                      max_tokens: Optional[int] = None) -> Iterable[Tuple[Any, Optional[List[Any]]]]:
+    """Découpe les textes fournis et restitue les paires (clé, chunks) dans leur ordre d'origine.
+
+    Un texte à None n'est pas découpé (chunks à None). Avec plusieurs workers, les
+    textes sont répartis sur un pool de processus avec un nombre borné de tâches
+    en vol, ce qui garde la mémoire sous contrôle."""
+    if workers <= 1:
+        split = create_chunker(chunk_size, chunk_overlap, chunker, max_tokens)
+        for key, text in items:
+            yield key, split(text) if text is not None else None
+        return
     
-    documents = []
-    print(f"Traitement de {len(raw_data)} documents...")
-    for item in tqdm(raw_data, desc="Création des chunks"):
-        chunks = text_splitter.split_text(item['text'])
-        for chunk in chunks:
-            doc = Document(
-                page_content=chunk,
-                metadata={
-                    'title': item['title'],
-                    'date': item['date'],
-                    'url': item['url']
-                }
-            )
-            documents.append(doc)
-    
-    print(f"Nombre total de chunks créés: {len(documents)}")
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_chunking_worker,
+                             initargs=(chunk_size, chunk_overlap, chunker, max_tokens)) as executor:
+        for key, text in items:
+            future = executor.submit(_split_text_in_worker, text) if text is not None else None
+            pending.append((key, future))
+            # Restituer dans l'ordre dès que la fenêtre de tâches en vol est pleine
+            while len(pending) > workers * 4:
+                done_key, done_future = pending.popleft()
+                yield done_key, done_future.result() if done_future is not None else None
+        while pending:
+            done_key, done_future = pending.popleft()
+            yield done_key, done_future.result() if done_future is not None else None
+
+def prepare_documents(raw_data: Iterable[Dict[str, Any]], chunk_size: int = 1000, chunk_overlap: int = 200,
+                      workers: int = 1, chunker: str = "recursive", max_tokens: Optional[int] = None) -> List[Document]:
+    """Prépare les documents en les divisant en chunks."""
+    documents, _ = chunk_works(raw_data, chunk_size=chunk_size, chunk_overlap=chunk_overlap, workers=workers,
+                               chunker=chunker, max_tokens=max_tokens)
     return documents
 
-def create_embeddings_and_index(documents: List[Document], output_dir: str):
-    """Crée les embeddings, l'index FAISS et sauvegarde les données."""
+def chunk_works(raw_data: Iterable[Dict[str, Any]], chunk_size: int = 1000, chunk_overlap: int = 200,
+                previous_documents: Optional[Sequence[Document]] = None,
+                previous_manifest: Optional[Dict[str, Any]] = None,
+                workers: int = 1, chunker: str = "recursive",
+                max_tokens: Optional[int] = None) -> Tuple[List[Document], List[Dict[str, Any]]]:
+    """Divise les œuvres en chunks et retourne les documents avec le manifeste des œuvres.
+
+    Voir `iter_work_chunks` pour les paramètres."""
+    documents = []
+    works = []
+    for work_hash, work_documents in iter_work_chunks(raw_data, chunk_size, chunk_overlap, previous_documents,
+                                                      previous_manifest, workers, chunker, max_tokens):
+        works.append({'hash': work_hash, 'start': len(documents), 'end': len(documents) + len(work_documents)})
+        documents.extend(work_documents)
+    return documents, works
+
+def iter_work_chunks(raw_data: Iterable[Dict[str, Any]], chunk_size: int = 1000, chunk_overlap: int = 200,
+                     previous_documents: Optional[Sequence[Document]] = None,
+                     previous_manifest: Optional[Dict[str, Any]] = None,
+                     workers: int = 1, chunker: str = "recursive",
+                     max_tokens: Optional[int] = None) -> Iterator[Tuple[str, List[Document]]]:
+    """Divise les œuvres en chunks et produit, pour chaque œuvre, son empreinte et ses documents.
+
+    Si une construction précédente compatible est fournie, les chunks des œuvres
+    inchangées (même empreinte) sont repris tels quels au lieu d'être recalculés.
+    Avec `workers > 1`, le découpage est réparti sur un pool de processus ; l'ordre
+    des chunks reste celui des œuvres. Les chunks d'une même œuvre partagent un
+    seul dictionnaire de métadonnées. `raw_data` peut être un itérateur (voir
+    `iter_works`) : les œuvres sont alors découpées au fur et à mesure de leur lecture.
+    Avec `chunker="sentences"`, les chunks sont alignés sur les phrases et leurs
+    métadonnées portent aussi leur intervalle 'start'/'end' dans le texte de l'œuvre
+    et ce texte ('work_text', partagé par les chunks de l'œuvre), ce qui permet au
+    magasin de documents de ne stocker chaque texte qu'une fois, à l'identique."""
+    # Plages de chunks des œuvres de la construction précédente, par empreinte ; les
+    # chunks sont produits ici sans dédoublonnage, qui doit donc être absent de la
+    # construction précédente
+    previous_ranges = {}
+    if (previous_documents is not None and previous_manifest is not None
+            and same_chunking(previous_manifest, chunking_settings(chunk_size, chunk_overlap, chunker, max_tokens))
+            # Les intervalles de caractères des chunks ne sont conservés que par les magasins récents
+            and not (chunker == "sentences" and getattr(previous_documents, 'char_spans', True) is None)):
+        for work in previous_manifest['works']:
+            previous_ranges[work['hash']] = (work['start'], work['end'])
+
+    n_works = 0
+    n_chunks = 0
+    reused_works = 0
+    total = len(raw_data) if hasattr(raw_data, '__len__') else None
+    if total is not None:
+        print(f"Traitement de {total} documents...")
+
+    def texts_to_split(items):
+        for item in items:
+            work_hash = hash_work(item)
+            yield (item, work_hash), item['text'] if work_hash not in previous_ranges else None
+
+    split_works = _iter_split_works(texts_to_split(raw_data), chunk_size, chunk_overlap, workers, chunker, max_tokens)
+    for (item, work_hash), chunks in tqdm(split_works, total=total, desc="Création des chunks"):
+        if chunks is None:
+            previous_start, previous_end = previous_ranges[work_hash]
+            work_documents = list(previous_documents[previous_start:previous_end])
+            if chunker == "sentences":
+                # Le texte de l'œuvre (inchangé) accompagne de nouveau ses chunks
+                work_documents = [make_document(doc.page_content, {**doc.metadata, 'work_text': item['text']})
+                                  for doc in work_documents]
+            reused_works += 1
+        else:
+            metadata = {
+                'title': item['title'],
+                'date': item['date'],
+                'url': item['url']
+            }
+            if chunker == "sentences":
+                text = item['text']
+                work_documents = [make_document(text[start:end],
+                                                {**metadata, 'start': start, 'end': end, 'work_text': text})
+                                  for start, end in chunks]
+            else:
+                work_documents = [make_document(chunk, metadata) for chunk in chunks]
+        n_works += 1
+        n_chunks += len(work_documents)
+        yield work_hash, work_documents
+
+    print(f"{n_works} documents traités")
+    if previous_ranges:
+        print(f"Œuvres inchangées reprises: {reused_works}, œuvres redécoupées: {n_works - reused_works}")
+    print(f"Nombre total de chunks créés: {n_chunks}")
+
+class NearDuplicateFilter:
+    """Élimine les chunks quasi identiques (rééditions, traductions, éditions qui se recouvrent).
+
+    Chaque chunk reçoit une signature MinHash calculée sur ses n-grammes de mots ;
+    un index LSH (bandes de la signature) propose les candidats, retenus si la
+    similarité de Jaccard estimée atteint `threshold`. Le premier chunk rencontré
+    est conservé comme représentant ; les œuvres des doublons écartés sont ajoutées
+    à ses métadonnées sous la clé 'aliases' pour que les citations puissent pointer
+    vers toutes les éditions."""
+
+    # Nombre premier supérieur à 2^32 pour le hachage universel (a·x + b) mod p
+    PRIME = 4294967311
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 8, shingle_size: int = 5):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm doit être un multiple de bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        random_state = np.random.RandomState(0)
+        self.a = random_state.randint(1, 2**32 - 1, size=(num_perm, 1), dtype=np.uint64)
+        self.b = random_state.randint(0, 2**32 - 1, size=(num_perm, 1), dtype=np.uint64)
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = []
+        self.representatives = []
+        self.seen = 0
+        self.removed = 0
+
+    def signature(self, text: str) -> np.ndarray:
+        """Signature MinHash des n-grammes de mots du texte."""
+        words = text.lower().split()
+        size = min(self.shingle_size, len(words)) or 1
+        shingles = {' '.join(words[i:i+size]) for i in range(max(len(words) - size + 1, 1))}
+        hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        return ((self.a * hashes + self.b) % self.PRIME).min(axis=1).astype(np.uint32)
+
+    def _find_duplicate(self, signature: np.ndarray, band_keys: List[bytes]) -> Optional[int]:
+        candidates = set()
+        for band, key in enumerate(band_keys):
+            candidates.update(self.buckets[band].get(key, ()))
+        for candidate in sorted(candidates):
+            if np.mean(self.signatures[candidate] == signature) >= self.threshold:
+                return candidate
+        return None
+
+    def filter(self, documents: Iterable[Document]) -> List[Document]:
+        """Retourne les documents qui ne sont pas des doublons de chunks déjà vus."""
+        kept = []
+        for doc in documents:
+            self.seen += 1
+            signature = self.signature(doc.page_content)
+            band_keys = [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+            duplicate_of = self._find_duplicate(signature, band_keys)
+            if duplicate_of is not None:
+                self._add_alias(self.representatives[duplicate_of], doc.metadata)
+                self.removed += 1
+                continue
+            for band, key in enumerate(band_keys):
+                self.buckets[band].setdefault(key, []).append(len(self.signatures))
+            self.signatures.append(signature)
+            self.representatives.append(doc)
+            kept.append(doc)
+        return kept
+
+    @staticmethod
+    def _add_alias(representative: Document, metadata: Dict[str, Any]):
+        alias = {'title': metadata.get('title'), 'date': metadata.get('date'), 'url': metadata.get('url') or ""}
+        if alias['url'] == (representative.metadata.get('url') or "") and alias['title'] == representative.metadata.get('title'):
+            return  # Doublon au sein de la même œuvre
+        aliases = representative.metadata.get('aliases', [])
+        if alias in aliases:
+            return
+        # Copie : le dictionnaire de métadonnées est partagé par les chunks de l'œuvre
+        representative.metadata = {**representative.metadata, 'aliases': aliases + [alias]}
+
+    def report(self):
+        ratio = 100 * self.removed / self.seen if self.seen else 0.0
+        print(f"Doublons approchés éliminés: {self.removed} chunks sur {self.seen} (index réduit de {ratio:.1f}%)")
+
+# Modèle d'embedding propre à chaque processus du pool d'encodage
+_worker_embedding_model = None
+
+def _init_encoding_worker(model_name: str, threads: int):
+    global _worker_embedding_model
+    import torch
+    torch.set_num_threads(threads)
+    _worker_embedding_model = SentenceTransformer(model_name, device="cpu")
+
+def _encode_in_worker(texts: List[str], batch_size: int) -> np.ndarray:
+    return _worker_embedding_model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+
+def _embedding_dimension_in_worker() -> int:
+    return _worker_embedding_model.get_sentence_embedding_dimension()
+
+class EncodingPool:
+    """Pool de processus d'encodage, chacun chargeant le modèle une seule fois.
+
+    Expose la même interface que SentenceTransformer (`encode`,
+    `get_sentence_embedding_dimension`) : chaque appel à `encode` est réparti en
+    tranches contiguës sur les workers et les vecteurs sont réassemblés dans l'ordre.
+    Les workers sont lancés avec "spawn" pour ne pas hériter des threads de torch."""
+
+    def __init__(self, model_name: str, workers: int, threads_per_worker: int = 1):
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_init_encoding_worker,
+                                            initargs=(model_name, threads_per_worker))
+        self.dimension = self.executor.submit(_embedding_dimension_in_worker).result()
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, texts: List[str], batch_size: int = 32, **kwargs) -> np.ndarray:
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        # Une tranche par worker, d'au moins un lot
+        shard_size = max(batch_size, -(-len(texts) // self.workers))
+        futures = [self.executor.submit(_encode_in_worker, texts[i:i + shard_size], batch_size)
+                   for i in range(0, len(texts), shard_size)]
+        return np.concatenate([future.result() for future in futures])
+
+    def close(self):
+        self.executor.shutdown()
+
+class EmbeddingMatrix:
+    """Matrice float32 préallouée dans laquelle l'encodeur écrit les embeddings bloc par bloc.
+
+    np.empty ne réserve que de la mémoire virtuelle : une capacité surestimée ne coûte
+    que les pages effectivement écrites. La matrice n'est réallouée que si la capacité
+    est dépassée."""
+
+    def __init__(self, dimension: int, capacity: int):
+        self.data = np.empty((max(capacity, 1), dimension), dtype=np.float32)
+        self.size = 0
+
+    def reserve(self, rows: int) -> np.ndarray:
+        """Réserve les `rows` lignes suivantes et retourne une vue modifiable sur celles-ci."""
+        if self.size + rows > len(self.data):
+            grown = np.empty((max(2 * len(self.data), self.size + rows), self.data.shape[1]), dtype=np.float32)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        view = self.data[self.size:self.size + rows]
+        self.size += rows
+        return view
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """Vue (sans copie) sur les lignes écrites."""
+        return self.data[:self.size]
+
+def _produce_blocks(documents: Iterable[Document], block_size: int, blocks: queue.Queue,
+                    collected: Optional[List[Document]]):
+    """Producteur : découpe le flux de documents en blocs et les place dans la file bornée."""
+    try:
+        block = []
+        for doc in documents:
+            if collected is not None:
+                collected.append(doc)
+            block.append(doc)
+            if len(block) >= block_size:
+                blocks.put(block)
+                block = []
+        if block:
+            blocks.put(block)
+        blocks.put(None)
+    except BaseException as e:
+        blocks.put(e)
+
+def embed_documents_pipelined(documents: Iterable[Document], embedding_model, cache: Optional[EmbeddingCache] = None,
+                              use_cache: bool = True, index=None, expected_chunks: int = 0,
+                              block_size: int = 4096, encode_batch_size: int = 64, queue_size: int = 4,
+                              store_writer: Optional[DocumentStoreWriter] = None,
+                              keep_embeddings: bool = True) -> Tuple[Optional[List[Document]], Optional[np.ndarray]]:
+    """Encode un flux de documents pendant qu'il est produit et retourne les documents et leurs embeddings normalisés.
+
+    Un thread producteur consomme `documents` (typiquement le découpage en cours) et
+    remplit une file bornée de blocs ; l'encodeur écrit chaque bloc directement dans
+    une matrice préallouée. Si `index` est fourni (index sans entraînement), chaque
+    bloc y est ajouté dès qu'il est encodé. Les chunks présents dans le cache ne sont
+    pas ré-encodés si `use_cache` est vrai ; le cache est alimenté dans tous les cas.
+    Si `store_writer` est fourni, les documents de chaque bloc y sont écrits au lieu
+    d'être conservés (documents retournés à None) ; sans `keep_embeddings`, les
+    vecteurs ne sont conservés que dans l'index (embeddings retournés à None)."""
+    dimension = embedding_model.get_sentence_embedding_dimension()
+    matrix = EmbeddingMatrix(dimension, expected_chunks if keep_embeddings else 0)
+    collected = [] if store_writer is None else None
+    blocks = queue.Queue(maxsize=queue_size)
+    producer = threading.Thread(target=_produce_blocks, args=(documents, block_size, blocks, collected), daemon=True)
+    producer.start()
+
+    reused = 0
+    total = 0
+    encoded = 0
+    encode_time = 0.0
+    with tqdm(desc="Génération des embeddings", unit=" chunks") as progress:
+        while True:
+            block = blocks.get()
+            if block is None:
+                break
+            if isinstance(block, BaseException):
+                raise block
+
+            texts = [doc.page_content for doc in block]
+            hashes = [hash_text(text) for text in texts]
+            cached = cache.get_many(set(hashes)) if cache is not None and use_cache else {}
+
+            # Textes à encoder, sans doublons, dans leur ordre d'apparition
+            missing = {}
+            for chunk_hash, text in zip(hashes, texts):
+                if chunk_hash not in cached and chunk_hash not in missing:
+                    missing[chunk_hash] = (len(missing), text)
+            if missing:
+                # SentenceTransformer trie les textes d'un même appel par longueur : un
+                # grand bloc donne des lots homogènes et peu de remplissage
+                encode_start = time.time()
+                computed = embedding_model.encode([text for _, text in missing.values()],
+                                                  batch_size=encode_batch_size, convert_to_numpy=True)
+                encode_time += time.time() - encode_start
+                encoded += len(missing)
+                if cache is not None:
+                    cache.put_many(list(missing), computed)
+
+            rows = matrix.reserve(len(block)) if keep_embeddings else np.empty((len(block), dimension), dtype=np.float32)
+            for row, chunk_hash in enumerate(hashes):
+                if chunk_hash in cached:
+                    rows[row] = cached[chunk_hash]
+                    reused += 1
+                else:
+                    rows[row] = computed[missing[chunk_hash][0]]
+            faiss.normalize_L2(rows)
+            if index is not None:
+                index.add(rows)
+            if store_writer is not None:
+                for doc in block:
+                    store_writer.add(doc)
+            total += len(block)
+            progress.update(len(block))
+    producer.join()
+
+    print(f"Chunks réutilisés depuis le cache: {reused}, chunks ré-encodés: {total - reused}")
+    if encode_time > 0:
+        print(f"Débit d'encodage: {encoded / encode_time:.1f} chunks/s ({encoded} textes uniques en {encode_time:.2f} s)")
+    return collected, matrix.embeddings if keep_embeddings else None
+
+def create_embeddings_and_index(documents: Iterable[Document], output_dir: str, incremental: bool = False,
+                                index_type: str = "flat", index_params: Optional[Dict[str, Any]] = None,
+                                search_params: Optional[Dict[str, Any]] = None, benchmark: bool = False,
+                                vector_encoding: str = "float32", rescore_factor: int = 0,
+                                expected_chunks: int = 0, encode_workers: int = 1, encode_batch_size: int = 64,
+                                encode_threads: Optional[int] = None, cache_path: Optional[str] = None,
+                                stream_store: bool = False) -> Sequence[Document]:
+    """Crée les embeddings, l'index FAISS et sauvegarde les données ; retourne les documents.
+
+    `documents` peut être un flux (découpage en cours) : l'encodage démarre dès les
+    premiers blocs et les vecteurs sont ajoutés à l'index bloc par bloc (voir
+    `embed_documents_pipelined`). `expected_chunks` dimensionne la matrice préallouée.
+    En mode incrémental, seuls les chunks absents du cache d'embeddings sont encodés.
+    `index_type` choisit l'index (voir vector_index.INDEX_TYPES) ; `index_params` est
+    transmis à new_index et `search_params` (nprobe, ef_search) est enregistré dans
+    le manifeste comme réglage par défaut de la recherche. Avec `benchmark`, le rappel
+    et la latence de l'index sont mesurés par rapport à l'index exact.
+    `vector_encoding` choisit le stockage des vecteurs (float32, fp16, int8, pq). Avec
+    `rescore_factor > 0`, les vecteurs float32 sont aussi sauvegardés pour re-noter
+    exactement `rescore_factor` fois plus de candidats lors de la recherche.
+    Avec `encode_workers > 1`, l'encodage est réparti sur un pool de processus
+    (voir `EncodingPool`), chacun limité à `encode_threads` threads torch.
+    `cache_path` désigne le cache d'embeddings (par défaut dans `output_dir`). Avec
+    `stream_store`, les chunks sont écrits dans le magasin de documents au fil de
+    l'encodage au lieu d'être gardés en mémoire, et les vecteurs ne sont conservés
+    hors de l'index que si l'entraînement, le benchmark ou la re-notation l'exigent ;
+    le magasin écrit est alors retourné."""
     # Création du répertoire de sortie s'il n'existe pas
     os.makedirs(output_dir, exist_ok=True)
-    
-    # Extraction des textes
-    print("Extraction des textes pour les embeddings...")
-    texts = [doc.page_content for doc in documents]
-    
+    index_params = index_params or {}
+
     # Création des embeddings
-    print(f"Création des embeddings pour {len(texts)} chunks...")
+    print("Création des embeddings...")
     start_time = time.time()
-    embedding_model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-    
-    # Utilisation de tqdm pour montrer la progression
-    batch_size = 32  # Ajustez selon votre mémoire disponible
-    embeddings = []
-    
-    for i in tqdm(range(0, len(texts), batch_size), desc="Génération des embeddings"):
-        batch = texts[i:i+batch_size]
-        batch_embeddings = embedding_model.encode(batch)
-        embeddings.extend(batch_embeddings)
-    
-    embeddings = np.array(embeddings)
+    if encode_workers > 1:
+        threads = encode_threads or max(1, (os.cpu_count() or 1) // encode_workers)
+        print(f"Encodage sur {encode_workers} processus de {threads} thread(s)")
+        embedding_model = EncodingPool(EMBEDDING_MODEL_NAME, encode_workers, threads)
+    else:
+        embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    dimension = embedding_model.get_sentence_embedding_dimension()
+
+    # Les index sans entraînement reçoivent les vecteurs au fil de l'encodage
+    index = None
+    if not requires_training(index_type, vector_encoding):
+        index = new_index(dimension, index_type=index_type, vector_encoding=vector_encoding, **index_params)
+    keep_embeddings = (not stream_store or index is None or benchmark or bool(rescore_factor)
+                       or vector_encoding != "float32")
+    store_writer = DocumentStoreWriter(output_dir) if stream_store else None
+
+    cache = EmbeddingCache(cache_path or os.path.join(output_dir, EMBEDDING_CACHE_FILENAME), EMBEDDING_MODEL_NAME)
+    try:
+        documents, embeddings = embed_documents_pipelined(documents, embedding_model, cache=cache,
+                                                          use_cache=incremental, index=index,
+                                                          expected_chunks=expected_chunks,
+                                                          encode_batch_size=encode_batch_size,
+                                                          store_writer=store_writer,
+                                                          keep_embeddings=keep_embeddings)
+    except BaseException:
+        if store_writer is not None:
+            store_writer.abort()
+        raise
+    finally:
+        cache.close()
+        if isinstance(embedding_model, EncodingPool):
+            embedding_model.close()
     elapsed_time = time.time() - start_time
     print(f"Embeddings créés en {elapsed_time:.2f} secondes")
+
+    if index is None:
+        # Index à entraîner : tous les vecteurs doivent être connus avant l'ajout
+        print(f"Création de l'index FAISS ({index_type})...")
+        start_time = time.time()
+        index = new_index(dimension, index_type=index_type, n_vectors=len(embeddings),
+                          vector_encoding=vector_encoding, **index_params)
+        train_index(index, embeddings)
+        add_in_blocks(index, embeddings)
+        print(f"Index entraîné et rempli en {time.time() - start_time:.2f} secondes")
+    print(f"Index {index_type} créé avec {index.ntotal} vecteurs de dimension {dimension}")
+
+    if benchmark:
+        benchmark_index(index, embeddings, index_type)
+    if vector_encoding != "float32" or rescore_factor:
+        report_quantization(index, embeddings, rescore_factor=rescore_factor, search_params=search_params)
+
+    # Sauvegarde de l'index FAISS, avec le réglage de recherche retenu comme réglage
+    # par défaut du fichier (le manifeste l'enregistre aussi)
+    print("Sauvegarde de l'index FAISS...")
+    set_search_params(index, **(search_params or {}))
+    faiss.write_index(index, os.path.join(output_dir, INDEX_FILENAME))
+    manifest_extra = {'index_type': index_type, 'vector_encoding': vector_encoding, 'search_params': search_params or {}}
+    if rescore_factor:
+        # Vecteurs float32 lus à la demande (mmap) pour la re-notation exacte des candidats
+        np.save(os.path.join(output_dir, VECTORS_FILENAME), embeddings)
+        manifest_extra.update({'rescore_vectors': VECTORS_FILENAME, 'rescore_factor': rescore_factor})
+    write_index_manifest(os.path.join(output_dir, INDEX_FILENAME), EMBEDDING_MODEL_NAME, dimension, **manifest_extra)
+    print(f"Index FAISS sauvegardé dans {output_dir}/{INDEX_FILENAME}")
+
+    # Sauvegarde des documents (métadonnées)
+    print("Sauvegarde des documents...")
+    if store_writer is not None:
+        store_writer.close()
+        return DocumentStore(output_dir)
+    write_document_store(documents, output_dir)
+    return documents
+
+def load_previous_build(output_dir: str) -> Tuple[Optional[Sequence[Document]], Optional[Dict[str, Any]]]:
+    """Charge les documents et le manifeste de la construction précédente."""
+    manifest = load_build_manifest(output_dir)
+    if manifest is None or manifest.get('embedding_model') != EMBEDDING_MODEL_NAME:
+        return None, None
+    if store_exists(output_dir):
+        # Les chunks repris sont matérialisés avant la réécriture du magasin
+        return DocumentStore(output_dir), manifest
+    documents_path = os.path.join(output_dir, DOCUMENTS_FILENAME)
+    if not os.path.exists(documents_path):
+        return None, None
+    with open(documents_path, 'rb') as f:
+        documents = pickle.load(f)
+    return documents, manifest
+
+# Taille et chevauchement des chunks
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# Processus de découpage par défaut : au-delà de 4, le gain est faible et chaque
+# processus supplémentaire charge son découpeur et prend des cœurs à l'encodage
+DEFAULT_CHUNK_WORKERS = min(4, os.cpu_count() or 1)
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Prétraitement des œuvres de Jean Piaget")
+    parser.add_argument("--input", default="data/piaget_data.json", help="Fichier JSON des œuvres")
+    parser.add_argument("--output-dir", default="data/processed", help="Répertoire des données prétraitées")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Ne redécoupe et ne ré-encode que les œuvres et chunks nouveaux ou modifiés")
+    parser.add_argument("--changed-works", default=None, metavar="MANIFESTE",
+                        help="Manifeste des œuvres modifiées du scraper (piaget_changed_works.json) : "
+                             "active --incremental et ne fait rien si le corpus n'a pas changé depuis la dernière construction")
+    parser.add_argument("--workers", type=int, default=DEFAULT_CHUNK_WORKERS,
+                        help="Nombre de processus pour le découpage en chunks (1 = séquentiel ; "
+                             "par défaut: min(4, nombre de cœurs))")
+    parser.add_argument("--encode-workers", type=int, default=1,
+                        help="Nombre de processus d'encodage, chacun chargeant le modèle (1 = processus principal)")
+    parser.add_argument("--encode-batch-size", type=int, default=64, help="Taille des lots d'encodage")
+    parser.add_argument("--encode-threads", type=int, default=None,
+                        help="Threads torch par processus d'encodage (par défaut: cœurs / processus)")
+    parser.add_argument("--chunker", choices=["recursive", "sentences"], default="recursive",
+                        help="Découpage récursif par caractères ou par phrases entières (texte stocké une seule fois)")
+    parser.add_argument("--max-tokens", type=int, default=None,
+                        help="Nombre maximal de tokens du modèle d'embedding par chunk (découpeur sentences)")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Élimine les chunks quasi identiques (MinHash/LSH) avant l'encodage")
+    parser.add_argument("--dedup-threshold", type=float, default=0.8,
+                        help="Similarité de Jaccard minimale pour considérer deux chunks comme doublons")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat",
+                        help="Type d'index FAISS (flat = recherche exacte)")
+    parser.add_argument("--nlist", type=int, default=None, help="Nombre de listes IVF (ivf_flat, ivf_pq)")
+    parser.add_argument("--hnsw-m", type=int, default=32, help="Nombre de voisins par nœud HNSW")
+    parser.add_argument("--pq-m", type=int, default=48, help="Nombre de sous-quantificateurs PQ (ivf_pq)")
+    parser.add_argument("--nprobe", type=int, default=None, help="nprobe par défaut de la recherche (IVF)")
+    parser.add_argument("--ef-search", type=int, default=None, help="efSearch par défaut de la recherche (HNSW)")
+    parser.add_argument("--vector-encoding", choices=VECTOR_ENCODINGS, default="float32",
+                        help="Stockage des vecteurs dans l'index (fp16/int8: quantification scalaire, pq: par produit)")
+    parser.add_argument("--rescore", type=int, default=0, metavar="FACTEUR",
+                        help="Conserve les vecteurs float32 pour re-noter exactement FACTEUR×k candidats (0 = désactivé)")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Mesure le rappel@k et la latence p50/p99 par rapport à l'index exact")
+    return parser
+
+def parse_args():
+    return build_arg_parser().parse_args()
+
+def preprocess_works(works_source: Iterable[Dict[str, Any]], output_dir: str, args: argparse.Namespace,
+                     previous_dir: Optional[str] = None, expected_chunks: int = 0,
+                     source_fingerprint: Optional[str] = None) -> Sequence[Document]:
+    """Découpe, encode et indexe un flux d'œuvres, puis écrit l'index, le magasin et le manifeste.
+
+    Args:
+        works_source: Œuvres (dictionnaires title/date/text/url), éventuellement un flux
+        output_dir: Répertoire où écrire la construction
+        args: Options de la ligne de commande (voir build_arg_parser)
+        previous_dir: Répertoire de la construction précédente (chunks repris), par
+            défaut `output_dir` ; le cache d'embeddings est celui de `output_dir`
+        expected_chunks: Estimation du nombre de chunks (préallocation)
+        source_fingerprint: Empreinte du corpus enregistrée dans le manifeste
+
+    Returns:
+        Les documents indexés
+    """
+    previous_dir = previous_dir or output_dir
+    chunk_size, chunk_overlap = CHUNK_SIZE, CHUNK_OVERLAP
+    previous_documents, previous_manifest = None, None
+    if args.incremental and args.dedup:
+        # Les doublons dépendent de tout le corpus : les œuvres sont redécoupées,
+        # seul le cache d'embeddings est réutilisé
+        print("Dédoublonnage actif: seul le cache d'embeddings est réutilisé.\n")
+    elif args.incremental:
+        previous_documents, previous_manifest = load_previous_build(previous_dir)
+        if previous_manifest is None:
+            print("Aucune construction précédente compatible trouvée, reconstruction complète.\n")
     
-    # Normalisation des embeddings
-    print("Normalisation des embeddings...")
-    faiss.normalize_L2(embeddings)
-    
-    # Création de l'index
-    print("Création de l'index FAISS...")
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatIP(dimension)
-    index.add(embeddings)
-    
-    print(f"Index créé avec {len(embeddings)} vecteurs de dimension {dimension}")
+    # Pipeline : les œuvres sont lues en flux, découpées au fur et à mesure et
+    # les chunks encodés par blocs pendant que le découpage se poursuit
+    works = []
+    duplicate_filter = NearDuplicateFilter(threshold=args.dedup_threshold) if args.dedup else None
     
-    # Sauvegarde de l'index FAISS
-    print("Sauvegarde de l'index FAISS...")
-    faiss.write_index(index, os.path.join(output_dir, "piaget_index.faiss"))
-    print(f"Index FAISS sauvegardé dans {output_dir}/piaget_index.faiss")
+    def iter_documents():
+        start = 0
+        for work_hash, work_documents in iter_work_chunks(works_source, chunk_size, chunk_overlap,
+                                                          previous_documents, previous_manifest, args.workers,
+                                                          args.chunker, args.max_tokens):
+            if duplicate_filter is not None:
+                work_documents = duplicate_filter.filter(work_documents)
+            works.append({'hash': work_hash, 'start': start, 'end': start + len(work_documents)})
+            start += len(work_documents)
+            yield from work_documents
     
-    # Sauvegarde des documents (métadonnées)
-    print("Sauvegarde des métadonnées des documents...")
-    with open(os.path.join(output_dir, "piaget_documents.pkl"), 'wb') as f:
-        pickle.dump(documents, f)
-    print(f"Documents sauvegardés dans {output_dir}/piaget_documents.pkl")
+    index_params = {'hnsw_m': args.hnsw_m, 'pq_m': args.pq_m}
+    if args.nlist:
+        index_params['nlist'] = args.nlist
+    search_params = {name: value for name, value in [('nprobe', args.nprobe), ('ef_search', args.ef_search)]
+                     if value is not None}
+    # Sans dédoublonnage, les chunks vont directement dans le magasin au fil de l'encodage ;
+    # le filtre ajoute des alias aux chunks déjà vus et a besoin qu'ils restent en mémoire
+    documents = create_embeddings_and_index(iter_documents(), output_dir, incremental=args.incremental,
+                                            index_type=args.index_type, index_params=index_params,
+                                            search_params=search_params, benchmark=args.benchmark,
+                                            vector_encoding=args.vector_encoding, rescore_factor=args.rescore,
+                                            expected_chunks=expected_chunks, encode_workers=args.encode_workers,
+                                            encode_batch_size=args.encode_batch_size,
+                                            encode_threads=args.encode_threads,
+                                            stream_store=duplicate_filter is None)
+    del previous_documents
+    if duplicate_filter is not None:
+        duplicate_filter.report()
+    save_build_manifest(output_dir, works, chunk_size, chunk_overlap, args.chunker, args.max_tokens,
+                        source_fingerprint, args.dedup, args.dedup_threshold)
+    return documents
 
 def main():
+    args = parse_args()
     # Chemin vers le fichier JSON
-    json_path = "data/piaget_data.json"
-    output_dir = "data/processed"
+    json_path = args.input
+    output_dir = args.output_dir
     
     start_time = time.time()
     print("=== DÉBUT DU PRÉTRAITEMENT ===\n")
     
-    print("Chargement des données...")
-    raw_data = load_data(json_path)
-    print(f"{len(raw_data)} documents chargés depuis {json_path}\n")
-    
-    print("Préparation des documents...")
-    documents = prepare_documents(raw_data)
-    print(f"Préparation des documents terminée.\n")
+    source_fingerprint = None
+    if args.changed_works:
+        changes = load_changed_works(args.changed_works)
+        source_fingerprint = changes.get('fingerprint')
+        args.incremental = True
+        print(f"Œuvres ajoutées: {len(changes['added'])}, modifiées: {len(changes['changed'])}, "
+              f"retirées: {len(changes['removed'])}")
+        build_manifest = load_build_manifest(output_dir)
+        settings = chunking_settings(CHUNK_SIZE, CHUNK_OVERLAP, args.chunker, args.max_tokens,
+                                     args.dedup, args.dedup_threshold)
+        if (source_fingerprint and build_manifest is not None
+                and build_manifest.get('source_fingerprint') == source_fingerprint
+                and same_chunking(build_manifest, settings)):
+            print("Le corpus n'a pas changé depuis la dernière construction, rien à faire.")
+            return
     
-    print("Création des embeddings et de l'index...")
-    create_embeddings_and_index(documents, output_dir)
+    print(f"Lecture, découpage et encodage des documents depuis {json_path}...")
+    # Borne supérieure du nombre de chunks pour préallouer la matrice d'embeddings
+    expected_chunks = os.path.getsize(json_path) // (CHUNK_SIZE - CHUNK_OVERLAP) + 1
+    documents = preprocess_works(iter_works(json_path), output_dir, args, expected_chunks=expected_chunks,
+                                 source_fingerprint=source_fingerprint)
     
     total_time = time.time() - start_time
     print(f"\n=== PRÉTRAITEMENT TERMINÉ EN {total_time:.2f} SECONDES ===\n")
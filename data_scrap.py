@@ -5,227 +5,374 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from http_fetcher import fetch_pages
+from scrape_journal import ScrapeJournal
+# clean_text et extract_title_and_date restent importables depuis ce module
+from text_cleaner import clean_text, extract_title_and_date, parse_work, save_raw_html, save_raw_html_index
+import argparse
+import queue
+import threading
 import time
 import json
 import os
-import re
-import unicodedata
 
 # Configuration
 BASE_URL = "https://oeuvres.unige.ch"
 START_URL = "https://oeuvres.unige.ch/piaget/chrono?hashtag=%23ed1"
 OUTPUT_DIR = "data"
 OUTPUT_FILE = os.path.join(OUTPUT_DIR, "piaget_data.json")
+# Journal de reprise et manifeste des œuvres modifiées, à côté du fichier de sortie
+JOURNAL_FILENAME = "piaget_scrape_journal.jsonl"
+CHANGES_FILENAME = "piaget_changed_works.json"
+RAW_HTML_DIRNAME = "raw_html"
 DELAY_BETWEEN_REQUESTS = 0.5 # secondes, pour être poli avec le serveur mais plus rapide
+PAGE_LOAD_TIMEOUT = 15 # secondes d'attente maximale de l'élément attendu
+DEFAULT_BROWSERS = 4 # navigateurs lancés en parallèle par le pool
+HTTP_CONCURRENCY = 8 # requêtes HTTP simultanées par hôte
+HTTP_RATE = 5.0 # requêtes HTTP par seconde au maximum
 
 # Créer le dossier de sortie s'il n'existe pas
 if not os.path.exists(OUTPUT_DIR):
     os.makedirs(OUTPUT_DIR)
 
-def get_page(url):
-    """Charge une page avec Selenium et retourne un objet BeautifulSoup."""
+# Chemin du chromedriver, installé une seule fois par processus
+_chromedriver_path = None
+_chromedriver_lock = threading.Lock()
+
+def get_chromedriver_path():
+    """Installe chromedriver au premier appel et retourne son chemin."""
+    global _chromedriver_path
+    with _chromedriver_lock:
+        if _chromedriver_path is None:
+            _chromedriver_path = ChromeDriverManager().install()
+        return _chromedriver_path
+
+def create_driver():
+    """Lance un Chrome headless."""
+    # Configuration de Chrome en mode headless (sans interface graphique)
+    chrome_options = Options()
+    chrome_options.add_argument("--headless=new")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_argument("--disable-blink-features=AutomationControlled")  # Pour éviter la détection
+    chrome_options.add_argument("--disable-extensions")
+    chrome_options.add_argument("--dns-prefetch-disable")
+    chrome_options.add_argument("--disable-infobars")
+    chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
+    
+    service = Service(get_chromedriver_path())
+    driver = webdriver.Chrome(service=service, options=chrome_options)
+    driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT * 2)
+    return driver
+
+def load_page(driver, url, wait_selector="article"):
+    """Charge une page dans un driver existant et retourne son objet BeautifulSoup.
+
+    Attend l'apparition de `wait_selector` (sélecteur CSS) au lieu d'une pause fixe ;
+    si l'élément n'apparaît pas, la page est retournée telle quelle."""
+    print(f"Chargement de la page : {url}")
+    driver.get(url)
     try:
-        # Configuration de Chrome en mode headless (sans interface graphique)
-        chrome_options = Options()
-        chrome_options.add_argument("--headless=new")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--window-size=1920,1080")
-        chrome_options.add_argument("--disable-blink-features=AutomationControlled")  # Pour éviter la détection
-        chrome_options.add_argument("--disable-extensions")
-        chrome_options.add_argument("--dns-prefetch-disable")
-        chrome_options.add_argument("--disable-infobars")
-        chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
-        
-        # Créer le service avec ChromeDriverManager
-        service = Service(ChromeDriverManager().install())
-        
-        # Créer le driver
-        driver = webdriver.Chrome(service=service, options=chrome_options)
-        
-        # Charger la page
-        print(f"Chargement de la page : {url}")
-        driver.get(url)
-        
-        # Attendre que la page soit chargée - temps d'attente réduit
+        WebDriverWait(driver, PAGE_LOAD_TIMEOUT).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, wait_selector)))
+    except TimeoutException:
+        print(f"Avertissement : '{wait_selector}' absent après {PAGE_LOAD_TIMEOUT} s sur {url}")
+    return BeautifulSoup(driver.page_source, 'html.parser')
+
+class DriverPool:
+    """Pool de navigateurs headless lancés une fois et réutilisés pour toutes les pages.
+
+    Chaque page emprunte un navigateur libre et le rend ensuite. Une page trop lente
+    (délai de chargement dépassé) est rechargée une fois avec le même navigateur,
+    puis abandonnée. Un navigateur qui plante ou perd sa session est fermé, relancé,
+    et la page est rechargée une fois. Avec `lazy`, les navigateurs ne sont lancés
+    qu'à la première page qui en a besoin."""
+
+    def __init__(self, size=DEFAULT_BROWSERS, lazy=False):
+        self.size = size
+        self.drivers = queue.Queue()
+        if lazy:
+            for _ in range(size):
+                self.drivers.put(None)
+            return
+        print(f"Lancement de {size} navigateur(s)...")
+        with ThreadPoolExecutor(max_workers=size) as executor:
+            for driver in executor.map(lambda _: create_driver(), range(size)):
+                self.drivers.put(driver)
+
+    def get_page(self, url, wait_selector="article"):
+        """Charge une page avec un navigateur du pool et retourne un objet BeautifulSoup (None en cas d'échec)."""
+        driver = self.drivers.get()
         try:
-            wait = WebDriverWait(driver, 5)  # Réduit de 15 à 5 secondes
-            wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-            time.sleep(0.5)  # Réduit de 2 à 0.5 secondes
+            for attempt in range(2):
+                if driver is None:
+                    driver = self._start()
+                    if driver is None:
+                        break
+                try:
+                    return load_page(driver, url, wait_selector)
+                except TimeoutException:
+                    # Page lente : le navigateur fonctionne et reste en service
+                    print(f"Délai de chargement dépassé sur {url} (tentative {attempt + 1}/2)")
+                except WebDriverException as e:
+                    print(f"Navigateur en échec sur {url} ({e.__class__.__name__}), redémarrage...")
+                    self._quit(driver)
+                    driver = None
+            print(f"Erreur lors du chargement de la page {url}")
+            return None
+        finally:
+            # None : navigateur à relancer par la prochaine page
+            self.drivers.put(driver)
+
+    @staticmethod
+    def _start():
+        try:
+            return create_driver()
         except Exception as e:
-            print(f"Avertissement : Problème de chargement : {e}")
-        
-        # Affichage minimal pour le suivi
+            print(f"Impossible de lancer le navigateur: {e}")
+            return None
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def close(self):
+        while not self.drivers.empty():
+            driver = self.drivers.get_nowait()
+            if driver is not None:
+                self._quit(driver)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def get_page(url, wait_selector="body"):
+    """Charge une page avec un navigateur dédié et retourne un objet BeautifulSoup.
+
+    Pour plusieurs pages, utiliser un DriverPool qui évite de relancer Chrome à chaque page."""
+    driver = None
+    try:
+        driver = create_driver()
+        soup = load_page(driver, url, wait_selector)
         print(f"Page chargée: {driver.title}")
-        
-        # Récupérer le contenu de la page
-        page_content = driver.page_source
-        
-        # Fermer le driver
-        driver.quit()
-        
-        # Créer et retourner l'objet BeautifulSoup
-        return BeautifulSoup(page_content, 'html.parser')
+        return soup
     except Exception as e:
         print(f"Erreur lors du chargement de la page {url}: {e}")
         return None
+    finally:
+        if driver is not None:
+            driver.quit()
 
 def get_soup(url):
-    """Télécharge une page et retourne un objet BeautifulSoup."""
-    try:
-        response = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=10)  # Timeout réduit
-        response.raise_for_status() # Lève une exception pour les codes d'erreur HTTP
-        return BeautifulSoup(response.content, 'html.parser')
-    except requests.RequestException as e:
-        print(f"Erreur lors de la requête vers {url}: {e}")
+    """Télécharge une page en HTTP (sans navigateur) et retourne un objet BeautifulSoup."""
+    page = fetch_pages([url])[0]
+    if page['text'] is None:
+        print(f"Erreur lors de la requête vers {url}: {page['error']}")
         return None
+    return BeautifulSoup(page['text'], 'html.parser')
 
-def extract_title_and_date(title_text):
-    """Extrait la date et le titre propre d'une chaîne de format "Piaget (1911) Titre de l'œuvre"."""
-    # Supprimer les balises HTML
-    title_text = re.sub(r'<.*?>', '', title_text)
-    
-    # Extraire la date entre parenthèses
-    date_match = re.search(r'\((\d{4})\)', title_text)
-    if date_match:
-        date = date_match.group(1)
-        # Supprimer le numéro (ex: "1.") au début
-        title_text = re.sub(r'^\d+\.\s*', '', title_text)
-        # Supprimer le nom de l'auteur et la date
-        title_text = re.sub(r'^Piaget\s+\(\d{4}\)\s*', '', title_text)
-        title = title_text.strip()
-    else:
-        date = None
-        title = title_text.strip()
-    
-    # Nettoyer le titre
-    title = re.sub(r'\s+', ' ', title).strip()
+def find_work_links(main_soup):
+    """Retourne les liens vers les œuvres de la page principale."""
+    # Récupération directe des liens (plus efficace)
+    links = main_soup.find_all('a', class_='bibl')
+    print(f"Trouvé {len(links)} liens avec classe bibl")
     
-    return title, date
+    # Filtrer les liens valides
+    valid_links = [link for link in links if link.get('href') and link.get('href').startswith('piaget')]
+    print(f"\nTrouvé {len(valid_links)} liens vers des œuvres.")
+    return valid_links
 
-# Garder la fonction clean_title existante pour le nettoyage des accents
+def work_url(base_url, link):
+    """Construit l'URL complète d'une œuvre."""
+    return f"{base_url}/piaget/{link.get('href')}"
 
-def clean_text(text, title=None):
-    """Nettoye le texte en enlevant les balises HTML, les caractères spéciaux et en normalisant les accents.
-    Si un titre est fourni, il sera également retiré du début du texte."""
-    # Supprimer les balises HTML
-    text = re.sub(r'<.*?>', '', text)
-    
-    # Normaliser les accents pour préserver les caractères français
-    text = unicodedata.normalize('NFKC', text)
-    
-    # Supprimer les caractères spéciaux de contrôle
-    text = re.sub(r'[\x00-\x1F\x7F-\x9F]', '', text)
-    
-    # Retirer le titre du texte s'il est présent au début
-    if title:
-        # Échapper les caractères spéciaux dans le titre pour l'utiliser dans une regex
-        escaped_title = re.escape(title)
-        # Retirer le titre avec ou sans la date et autres caractères
-        text = re.sub(r'^' + escaped_title + r'\s*\(\d{4}\)[a-z]*\s*', '', text)
-        text = re.sub(r'^' + escaped_title + r'\s*', '', text)
-    
-    # Supprimer les dates en début de texte (ex: "(1907)a") et les caractères spéciaux
-    text = re.sub(r'^\(\d{4}\)[a-z]*\s*', '', text)
-    
-    # Nettoyer les caractères spéciaux isolés qui pourraient rester
-    text = re.sub(r'\s+[a-z]\s*\.\s*', ' ', text)  # Supprime les lettres isolées suivies d'un point
+def scrape_piaget_oeuvres(browsers=DEFAULT_BROWSERS, fetch_mode="http", base_url=BASE_URL, start_url=START_URL,
+                          output_file=OUTPUT_FILE, concurrency=HTTP_CONCURRENCY, rate=HTTP_RATE, resume=False,
+                          on_work=None):
+    """Scrape les œuvres de Piaget depuis la page principale.
+
+    En mode "http", les pages sont téléchargées directement (voir http_fetcher.py)
+    et Selenium ne sert qu'aux pages dont le HTML statique ne contient pas le texte.
+    En mode "selenium", toutes les pages sont chargées par un pool de `browsers`
+    navigateurs lancés une seule fois. L'ordre des œuvres est celui des liens de la
+    page principale. `base_url` et `start_url` permettent de viser un autre serveur.
+
+    Chaque œuvre est ajoutée au journal (voir scrape_journal.py) dès qu'elle est
+    traitée ; avec `resume`, une exécution interrompue reprend là où elle s'est
+    arrêtée. En mode "http", les œuvres déjà connues sont demandées avec
+    If-None-Match / If-Modified-Since et ne sont pas retraitées si le serveur
+    répond 304. Le manifeste des œuvres ajoutées, modifiées et retirées est écrit
+    à côté du fichier de sortie pour data_preprocess.py (--changed-works). Les
+    pages HTML brutes sont conservées dans le cache raw_html/ pour pouvoir
+    renettoyer les textes sans rescraper (voir text_cleaner.py).
+
+    Si `on_work` est fourni, chaque œuvre lui est transmise dès qu'elle est prête
+    (voir ingest.py) et la fonction retourne une liste vide au lieu de relire
+    toutes les œuvres en mémoire."""
+    output_dir = os.path.dirname(output_file) or '.'
+    os.makedirs(output_dir, exist_ok=True)
+    journal = ScrapeJournal(os.path.join(output_dir, JOURNAL_FILENAME), resume, on_work)
+    cache_dir = os.path.join(output_dir, RAW_HTML_DIRNAME)
+    with DriverPool(browsers, lazy=fetch_mode == "http") as pool:
+        if fetch_mode == "http":
+            urls = _scrape_with_http(pool, journal, cache_dir, base_url, start_url, concurrency, rate)
+        else:
+            urls = _scrape_with_pool(pool, journal, cache_dir, base_url, start_url)
+    if urls is None:
+        return []
+    # Les œuvres en échec gardent leur dernière version connue
+    for url in urls:
+        if not journal.done(url):
+            journal.notify(url)
     
-    # Supprimer les références bibliographiques à la fin
-    text = re.sub(r'\.[a-z]+\.\s*\d{4}\..*$', '', text)
+    # Sauvegarder les données, œuvre par œuvre depuis le journal
+    count = 0
+    tmp_path = output_file + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write("[")
+        for oeuvre in journal.iter_works(urls):
+            f.write(",\n  " if count else "\n  ")
+            f.write(json.dumps(oeuvre, indent=2, ensure_ascii=False).replace("\n", "\n  "))
+            count += 1
+        f.write("\n]" if count else "]")
+    os.replace(tmp_path, output_file)
     
-    # Nettoyer les espaces et la ponctuation
-    text = text.replace('\n', ' ').replace('\r', '')
-    text = re.sub(r'\s+', ' ', text).strip()
+    changes = journal.changes(urls)
+    with open(os.path.join(output_dir, CHANGES_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(changes, f, indent=2, ensure_ascii=False)
+    journal.compact(urls)
     
-    # Nettoyer les espaces avant la ponctuation
-    text = re.sub(r'\s+\.', '.', text)
-    text = re.sub(r'\s+,', ',', text)
-    text = re.sub(r'\s+;', ';', text)
-    text = re.sub(r'\s+:', ':', text)
+    print(f"\n{count} œuvres scrapées et sauvegardées dans {output_file}")
+    print(f"Ajoutées: {len(changes['added'])}, modifiées: {len(changes['changed'])}, "
+          f"inchangées: {changes['unchanged']}, en échec: {len(changes['failed'])}, retirées: {len(changes['removed'])}")
+    if on_work is not None:
+        return []
     
-    # Nettoyer les espaces doubles après ponctuation
-    text = re.sub(r'([.,:;!?])\s+', r'\1 ', text)
+    oeuvres = list(journal.iter_works(urls))
+    # Affichage minimal des résultats
+    if oeuvres:
+        print(f"Premier document: {oeuvres[0]['title']} ({oeuvres[0]['date']})")
     
-    # Préserver les accents français au lieu de les remplacer
-    # Supprimé: text = text.replace('É', 'E').replace('È', 'E')...
+    return oeuvres
+
+def _load_works_with_pool(pool, journal, cache_dir, items, total):
+    """Charge les pages (indice, lien, URL) avec le pool de navigateurs et les journalise ; retourne leurs statuts."""
+    def process(item):
+        i, link, url = item
+        print(f"Traitement: {i+1}/{total} - {link.get('href')}")
+        work_soup = pool.get_page(url)
+        if not work_soup:
+            print(f"Erreur : Impossible de charger la page {url}")
+            return None
+        oeuvre = parse_work(work_soup, link.text, url)
+        if oeuvre is None:
+            return None
+        save_raw_html(cache_dir, url, str(work_soup))
+        return journal.record(oeuvre)
     
-    return text
+    # Un thread par navigateur ; map conserve l'ordre des pages
+    with ThreadPoolExecutor(max_workers=pool.size) as executor:
+        return list(executor.map(process, items))
+
+def _pending_works(journal, cache_dir, base_url, valid_links):
+    """Retourne les URL de toutes les œuvres et les (indice, lien, URL) pas encore traités dans l'exécution en cours."""
+    urls = [work_url(base_url, link) for link in valid_links]
+    save_raw_html_index(cache_dir, [(url, link.text) for url, link in zip(urls, valid_links)])
+    pending = []
+    for i, (link, url) in enumerate(zip(valid_links, urls)):
+        if journal.done(url):
+            # Déjà traitée avant l'interruption
+            journal.notify(url)
+        else:
+            pending.append((i, link, url))
+    if len(pending) < len(urls):
+        print(f"{len(urls) - len(pending)} œuvres déjà traitées dans le journal, {len(pending)} restantes")
+    return urls, pending
 
-def scrape_piaget_oeuvres():
-    """Scrape les œuvres de Piaget depuis la page principale."""
-    print(f"Accès à la page principale : {START_URL}")
-    main_soup = get_page(START_URL)
+def _scrape_with_pool(pool, journal, cache_dir, base_url, start_url):
+    """Charge la page principale puis les œuvres avec le pool de navigateurs ; retourne les URL des œuvres (None si la page principale échoue)."""
+    print(f"Accès à la page principale : {start_url}")
+    main_soup = pool.get_page(start_url, wait_selector="a.bibl")
     if not main_soup:
         print("Erreur : Impossible de charger la page principale")
-        return []
-    
-    # Récupération directe des liens (plus efficace)
-    links = main_soup.find_all('a', class_='bibl')
-    print(f"Trouvé {len(links)} liens avec classe bibl")
-    
-    # Filtrer les liens valides
-    valid_links = [link for link in links if link.get('href') and link.get('href').startswith('piaget')]
-    print(f"\nTrouvé {len(valid_links)} liens vers des œuvres.")
-    
-    # Initialiser la liste des œuvres
-    oeuvres = []
+        return None
     
-    # Traiter chaque œuvre
-    for i, link in enumerate(valid_links):  # Traiter toutes les œuvres
-        # Construire l'URL complète correctement
-        work_url = f"{BASE_URL}/piaget/{link.get('href')}"
-        print(f"Traitement: {i+1}/{len(valid_links)} - {link.get('href')}")
-        work_soup = get_page(work_url)
-        if not work_soup:
-            print(f"Erreur : Impossible de charger la page {work_url}")
-            continue
-        
-        # Récupérer l'article
-        article = work_soup.find('article')
-        if article:
-            # Extraire le titre complet de la page et le traiter directement
-            raw_title = work_soup.title.text if work_soup.title else link.text
-            title, date = extract_title_and_date(raw_title)
-            
-            # Extraire le texte brut
-            raw_text = article.get_text(strip=True)
-            
-            # Nettoyer le texte en retirant le titre et en appliquant les autres nettoyages
-            cleaned_text = clean_text(raw_text, title)
-            
-            # Affichage minimal pour le suivi
-            print(f"Œuvre traitée: {title} ({date}) - {len(cleaned_text)} caractères")
-            
-            # Ajouter l'œuvre à la liste avec le titre nettoyé et la date
-            oeuvres.append({
-                'title': title,
-                'date': date,
-                'text': cleaned_text,
-                'url': work_url
-            })
-        else:
-            print("Article non trouvé sur la page")
+    urls, pending = _pending_works(journal, cache_dir, base_url, find_work_links(main_soup))
+    _load_works_with_pool(pool, journal, cache_dir, pending, len(urls))
+    return urls
+
+def _scrape_with_http(pool, journal, cache_dir, base_url, start_url, concurrency, rate):
+    """Télécharge les pages en HTTP et ne recourt au pool de navigateurs que pour les pages sans article."""
+    fetch_options = {'per_host': concurrency, 'rate': rate}
+    print(f"Accès à la page principale : {start_url}")
+    main_page = fetch_pages([start_url], **fetch_options)[0]
+    main_soup = BeautifulSoup(main_page['text'], 'html.parser') if main_page['text'] else None
+    if main_soup is None or not main_soup.find('a', class_='bibl'):
+        # Liste générée en JavaScript ou page indisponible
+        print("Liste des œuvres absente du HTML statique, chargement avec Selenium")
+        main_soup = pool.get_page(start_url, wait_selector="a.bibl")
+        if not main_soup:
+            print("Erreur : Impossible de charger la page principale")
+            return None
     
-    # Sauvegarder les données
-    os.makedirs('data', exist_ok=True)
-    with open('data/piaget_data.json', 'w', encoding='utf-8') as f:
-        json.dump(oeuvres, f, indent=2, ensure_ascii=False)
+    urls, pending = _pending_works(journal, cache_dir, base_url, find_work_links(main_soup))
     
-    print(f"\n{len(oeuvres)} œuvres scrapées et sauvegardées dans data/piaget_data.json")
+    def on_result(position, page):
+        """Journalise la page dès son arrivée ; retourne False si elle doit passer par Selenium."""
+        _, link, url = pending[position]
+        if page['status'] == 304:
+            journal.record_not_modified(url)
+            return True
+        work_soup = BeautifulSoup(page['text'], 'html.parser') if page['text'] else None
+        if work_soup is None or not work_soup.find('article'):
+            return False
+        save_raw_html(cache_dir, url, page['text'])
+        journal.record(parse_work(work_soup, link.text, url),
+                       page['headers'].get('ETag'), page['headers'].get('Last-Modified'))
+        return True
     
-    # Affichage minimal des résultats
-    if oeuvres:
-        print(f"Premier document: {oeuvres[0]['title']} ({oeuvres[0]['date']})")
+    print(f"Téléchargement HTTP de {len(pending)} pages ({concurrency} connexions, {rate} requêtes/s max)...")
+    start_time = time.time()
+    handled = fetch_pages([url for _, _, url in pending], [journal.conditional_headers(url) for _, _, url in pending],
+                          on_result, **fetch_options)
+    print(f"Pages téléchargées en {time.time() - start_time:.2f} secondes")
     
-    return oeuvres
+    fallback = [item for item, done in zip(pending, handled) if not done]
+    if fallback:
+        # Pages qui nécessitent JavaScript ou dont le téléchargement a échoué
+        print(f"{len(fallback)} pages sans article en HTML statique, chargement avec Selenium")
+        _load_works_with_pool(pool, journal, cache_dir, fallback, len(urls))
+    return urls
 
 if __name__ == '__main__':
-    import time
+    parser = argparse.ArgumentParser(description="Scraping des œuvres de Jean Piaget")
+    parser.add_argument("--fetch", choices=["http", "selenium"], default="http",
+                        help="Téléchargement HTTP direct (Selenium en secours) ou Selenium pour toutes les pages")
+    parser.add_argument("--browsers", type=int, default=DEFAULT_BROWSERS,
+                        help="Nombre de navigateurs headless lancés une fois et réutilisés")
+    parser.add_argument("--concurrency", type=int, default=HTTP_CONCURRENCY,
+                        help="Requêtes HTTP simultanées par hôte")
+    parser.add_argument("--rate", type=float, default=HTTP_RATE,
+                        help="Nombre maximal de requêtes HTTP par seconde (0 = illimité)")
+    parser.add_argument("--base-url", default=BASE_URL, help="URL de base du site (serveur local de test)")
+    parser.add_argument("--start-url", default=START_URL, help="URL de la page listant les œuvres")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="Fichier JSON de sortie")
+    parser.add_argument("--resume", action="store_true",
+                        help="Reprend l'exécution interrompue à partir du journal au lieu d'en commencer une nouvelle")
+    args = parser.parse_args()
     start_time = time.time()
-    scraped_data = scrape_piaget_oeuvres()
+    scraped_data = scrape_piaget_oeuvres(args.browsers, args.fetch, args.base_url, args.start_url, args.output,
+                                         args.concurrency, args.rate, args.resume)
     end_time = time.time()
     if scraped_data:
         print(f"\nScraping terminé en {end_time - start_time:.2f} secondes")
@@ -0,0 +1,312 @@
+import argparse
+import json
+import mmap
+import os
+import pickle
+from typing import TYPE_CHECKING, List, Dict, Any, Iterable, Optional, Union
+import numpy as np
+
+# langchain n'est importé qu'à la création du premier Document
+if TYPE_CHECKING:
+    from langchain.schema import Document
+
+# Fichiers du magasin de documents colonnaire
+TEXT_FILENAME = "piaget_chunks.bin"
+SPANS_FILENAME = "piaget_chunk_spans.npy"
+WORK_IDS_FILENAME = "piaget_chunk_works.npy"
+WORKS_FILENAME = "piaget_works.json"
+# Intervalle (début, fin) de caractères de chaque chunk dans le texte de son œuvre (-1 si aucun)
+CHAR_SPANS_FILENAME = "piaget_chunk_chars.npy"
+# Autres éditions des chunks dédoublonnés (facultatif)
+ALIASES_FILENAME = "piaget_chunk_aliases.json"
+# Ancien format : offsets consécutifs (n + 1) au lieu d'intervalles
+OFFSETS_FILENAME = "piaget_chunk_offsets.npy"
+STORE_FILENAMES = [TEXT_FILENAME, WORK_IDS_FILENAME, WORKS_FILENAME]
+
+def store_exists(directory: str) -> bool:
+    """Indique si un magasin de documents complet existe dans le répertoire."""
+    return (all(os.path.exists(os.path.join(directory, name)) for name in STORE_FILENAMES)
+            and any(os.path.exists(os.path.join(directory, name)) for name in (SPANS_FILENAME, OFFSETS_FILENAME)))
+
+class DocumentStore:
+    """Magasin de chunks en lecture seule, projeté en mémoire (mmap).
+
+    Le texte est stocké dans un unique blob UTF-8 et chaque chunk est un intervalle
+    (début, fin) d'octets de ce blob ; avec le découpeur par phrases, le texte de
+    chaque œuvre n'est stocké qu'une fois et les chunks qui se chevauchent partagent
+    les mêmes octets ; l'intervalle de caractères de chaque chunk dans le texte de
+    son œuvre est alors conservé ('start'/'end' des métadonnées). Les titres, dates
+    et URL sont stockés une seule fois par œuvre et référencés par un identifiant
+    entier. Les objets Document ne sont créés qu'à la demande, pour les seuls
+    chunks consultés."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        spans_path = os.path.join(directory, SPANS_FILENAME)
+        if os.path.exists(spans_path):
+            self.spans = np.load(spans_path, mmap_mode='r')
+        else:
+            offsets = np.load(os.path.join(directory, OFFSETS_FILENAME))
+            self.spans = np.stack([offsets[:-1], offsets[1:]], axis=1)
+        self.work_ids = np.load(os.path.join(directory, WORK_IDS_FILENAME), mmap_mode='r')
+        # Absents des magasins écrits avant leur introduction
+        char_spans_path = os.path.join(directory, CHAR_SPANS_FILENAME)
+        self.char_spans = np.load(char_spans_path, mmap_mode='r') if os.path.exists(char_spans_path) else None
+        with open(os.path.join(directory, WORKS_FILENAME), 'r', encoding='utf-8') as f:
+            works = json.load(f)
+        self.titles = works['titles']
+        self.dates = works['dates']
+        self.urls = works['urls']
+        # Intervalle d'octets du texte complet de chaque œuvre, s'il est stocké d'un seul tenant
+        self.regions = works.get('regions', [None] * len(self.titles))
+        # Identifiant du titre de chaque œuvre : les éditions d'un même titre le partagent
+        title_index = {}
+        self.work_title_ids = np.array([title_index.setdefault(title, len(title_index)) for title in self.titles],
+                                       dtype=np.int32)
+        
+        # Identifiants des œuvres dont le chunk est un doublon, par indice de chunk
+        self.aliases = {}
+        aliases_path = os.path.join(directory, ALIASES_FILENAME)
+        if os.path.exists(aliases_path):
+            with open(aliases_path, 'r', encoding='utf-8') as f:
+                self.aliases = {int(idx): work_ids for idx, work_ids in json.load(f).items()}
+
+        self._text_file = open(os.path.join(directory, TEXT_FILENAME), 'rb')
+        if os.fstat(self._text_file.fileno()).st_size > 0:
+            self._text = mmap.mmap(self._text_file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            # mmap refuse les fichiers vides
+            self._text = b""
+
+    def __len__(self) -> int:
+        return len(self.work_ids)
+
+    def __getitem__(self, idx: Union[int, slice]) -> Union["Document", List["Document"]]:
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        idx = int(idx)
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(f"Chunk {idx} hors limites")
+        from langchain.schema import Document
+        return Document(page_content=self.text(idx), metadata=self.metadata(idx))
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def text(self, idx: int) -> str:
+        """Retourne le texte du chunk sans créer de Document."""
+        start, end = self.spans[idx]
+        return self._text[int(start):int(end)].decode('utf-8')
+
+    def context(self, idx: int, before: int = 500, after: int = 500) -> str:
+        """Retourne le chunk élargi au texte voisin de la même œuvre (environ `before`/`after` octets).
+
+        Le texte voisin est lu directement dans le blob, sans autre recherche."""
+        start, end = (int(value) for value in self.spans[idx])
+        region = self.regions[int(self.work_ids[idx])]
+        if region is None:
+            return self.text(idx)
+        start = max(region[0], start - before)
+        end = min(region[1], end + after)
+        # Les bornes peuvent tomber au milieu d'un caractère multi-octets
+        return self._text[start:end].decode('utf-8', errors='ignore')
+
+    def metadata(self, idx: int) -> Dict[str, Any]:
+        """Retourne les métadonnées (titre, date, URL, indice 'chunk_id' et, si connu,
+        intervalle 'start'/'end' dans le texte de l'œuvre) du chunk."""
+        work_id = int(self.work_ids[idx])
+        metadata = self.work_metadata(work_id)
+        metadata['chunk_id'] = int(idx)
+        if self.char_spans is not None and self.char_spans[idx][0] >= 0:
+            metadata['start'], metadata['end'] = (int(value) for value in self.char_spans[idx])
+        if int(idx) in self.aliases:
+            metadata['aliases'] = [self.work_metadata(alias_id) for alias_id in self.aliases[int(idx)]]
+        return metadata
+
+    def title_ids(self, indices: np.ndarray) -> np.ndarray:
+        """Retourne l'identifiant du titre de l'œuvre de chaque chunk, sans créer de Document."""
+        return self.work_title_ids[self.work_ids[indices]]
+
+    def work_metadata(self, work_id: int) -> Dict[str, Any]:
+        """Retourne le titre, la date et l'URL d'une œuvre."""
+        return {
+            'title': self.titles[work_id],
+            'date': self.dates[work_id],
+            'url': self.urls[work_id]
+        }
+
+    def close(self):
+        if isinstance(self._text, mmap.mmap):
+            self._text.close()
+        self._text_file.close()
+
+class DocumentStoreWriter:
+    """Écriture incrémentale du magasin de documents au format colonnaire.
+
+    Les documents sont ajoutés un par un avec `add` et leur texte est écrit
+    immédiatement ; seuls les intervalles et identifiants d'œuvre (quelques octets
+    par chunk) restent en mémoire. Les documents dont les métadonnées contiennent
+    'start' et 'end' (intervalle de caractères dans le texte de l'œuvre, voir
+    text_chunker.py) sont écrits comme intervalles d'un texte d'œuvre stocké une
+    seule fois. Si les métadonnées contiennent aussi le texte complet de l'œuvre
+    ('work_text', non conservé), ce texte est écrit tel quel au premier chunk de
+    l'œuvre, y compris le texte entre les chunks et celui des chunks écartés (par
+    exemple par le dédoublonnage) ; sinon, seules les parties non encore écrites
+    de chaque chunk sont ajoutées au blob et les intervalles entre chunks sont
+    remplis d'espaces. Les autres documents sont écrits bout à bout. Les fichiers
+    sont écrits sous un nom temporaire et renommés par `close`, pour qu'un lecteur
+    ne voie jamais un magasin à moitié écrit."""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.spans = []
+        self.char_spans = []
+        self.work_ids = []
+        self.aliases = {}
+        self.works = {'titles': [], 'dates': [], 'urls': [], 'regions': []}
+        self.work_index = {}
+        self.position = 0
+        # Œuvre en cours d'écriture en mode intervalles : identifiant, dernier début, caractères couverts
+        self._region_work, self._region_start, self._covered = None, 0, 0
+        # Texte d'œuvre écrit en entier : identifiant, texte, position dans le blob, curseur (caractère, octet)
+        self._text_work, self._work_text, self._work_position, self._cursor = None, None, 0, (0, 0)
+        self._text_tmp = os.path.join(directory, TEXT_FILENAME + ".tmp")
+        self._text_file = open(self._text_tmp, 'wb')
+
+    def __len__(self) -> int:
+        return len(self.work_ids)
+
+    def _intern_work(self, metadata: Dict[str, Any]) -> int:
+        """Internement des métadonnées par œuvre."""
+        key = (metadata.get('title'), metadata.get('date'), metadata.get('url') or "")
+        if key not in self.work_index:
+            self.work_index[key] = len(self.work_index)
+            self.works['titles'].append(key[0])
+            self.works['dates'].append(key[1])
+            self.works['urls'].append(key[2])
+            self.works['regions'].append(None)
+        return self.work_index[key]
+
+    def add(self, doc: "Document"):
+        """Ajoute un document à la fin du magasin."""
+        work_id = self._intern_work(doc.metadata)
+        if doc.metadata.get('aliases'):
+            self.aliases[len(self.work_ids)] = [self._intern_work(alias) for alias in doc.metadata['aliases']]
+        self.work_ids.append(work_id)
+
+        f = self._text_file
+        text = doc.page_content
+        if 'start' not in doc.metadata:
+            self._region_work = self._text_work = None
+            self.char_spans.append((-1, -1))
+            data = text.encode('utf-8')
+            f.write(data)
+            self.spans.append((self.position, self.position + len(data)))
+            self.position += len(data)
+            return
+
+        start, end = doc.metadata['start'], doc.metadata['end']
+        self.char_spans.append((start, end))
+        work_text = doc.metadata.get('work_text')
+        if work_text is not None:
+            if self._text_work != work_id or work_text is not self._work_text:
+                # Première occurrence de l'œuvre : son texte complet est écrit
+                self._region_work = None
+                data = work_text.encode('utf-8')
+                self._text_work, self._work_text, self._work_position = work_id, work_text, self.position
+                self._cursor = (0, 0)
+                self.works['regions'][work_id] = [self.position, self.position + len(data)]
+                f.write(data)
+                self.position += len(data)
+            chunk_start = self._work_position + self._byte_offset(start)
+            self.spans.append((chunk_start, chunk_start + len(text.encode('utf-8'))))
+            return
+
+        self._text_work = None
+        if self._region_work != work_id or start < self._region_start:
+            # Nouvelle région de texte pour cette œuvre
+            self._region_work, self._covered = work_id, start
+            self.works['regions'][work_id] = [self.position, self.position]
+        self._region_start = start
+        if start > self._covered:
+            # Espace entre deux chunks (blancs retirés par le découpeur)
+            f.write(b" " * (start - self._covered))
+            self.position += start - self._covered
+            self._covered = start
+        # Seule la partie du chunk au-delà du texte déjà écrit est ajoutée
+        already_written = text[:self._covered - start]
+        new_data = text[self._covered - start:].encode('utf-8')
+        f.write(new_data)
+        chunk_start = self.position - len(already_written.encode('utf-8'))
+        self.position += len(new_data)
+        self._covered = max(self._covered, end)
+        self.spans.append((chunk_start, self.position))
+        self.works['regions'][work_id][1] = self.position
+
+    def _byte_offset(self, char_offset: int) -> int:
+        """Position en octets d'un caractère du texte d'œuvre en cours (les chunks
+        arrivent dans l'ordre : seul l'écart avec le chunk précédent est encodé)."""
+        char_position, byte_position = self._cursor
+        if char_offset >= char_position:
+            byte_position += len(self._work_text[char_position:char_offset].encode('utf-8'))
+        else:
+            byte_position -= len(self._work_text[char_offset:char_position].encode('utf-8'))
+        self._cursor = (char_offset, byte_position)
+        return byte_position
+
+    def abort(self):
+        """Abandonne l'écriture sans toucher au magasin existant."""
+        self._text_file.close()
+        if os.path.exists(self._text_tmp):
+            os.remove(self._text_tmp)
+
+    def close(self):
+        """Termine l'écriture et remplace les fichiers du magasin."""
+        self._text_file.close()
+        directory = self.directory
+        tmp_paths = {TEXT_FILENAME: self._text_tmp}
+        for name, array in [(SPANS_FILENAME, np.array(self.spans, dtype=np.int64).reshape(-1, 2)),
+                            (CHAR_SPANS_FILENAME, np.array(self.char_spans, dtype=np.int64).reshape(-1, 2)),
+                            (WORK_IDS_FILENAME, np.array(self.work_ids, dtype=np.int32))]:
+            tmp_paths[name] = os.path.join(directory, name + ".tmp")
+            with open(tmp_paths[name], 'wb') as f:
+                np.save(f, array)
+        for name, content in [(WORKS_FILENAME, self.works), (ALIASES_FILENAME, self.aliases)]:
+            tmp_paths[name] = os.path.join(directory, name + ".tmp")
+            with open(tmp_paths[name], 'w', encoding='utf-8') as f:
+                json.dump(content, f, ensure_ascii=False)
+
+        for name, tmp_path in tmp_paths.items():
+            os.replace(tmp_path, os.path.join(directory, name))
+        # Le fichier d'offsets de l'ancien format n'est plus utilisé
+        if os.path.exists(os.path.join(directory, OFFSETS_FILENAME)):
+            os.remove(os.path.join(directory, OFFSETS_FILENAME))
+        print(f"Magasin de documents écrit dans {directory}: {len(self.work_ids)} chunks, "
+              f"{len(self.work_index)} œuvres, {self.position / 1e6:.1f} Mo de texte")
+
+def write_document_store(documents: Iterable["Document"], directory: str):
+    """Écrit les documents au format colonnaire (voir DocumentStoreWriter)."""
+    writer = DocumentStoreWriter(directory)
+    for doc in documents:
+        writer.add(doc)
+    writer.close()
+
+def convert_pickle(pickle_path: str, directory: Optional[str] = None):
+    """Convertit un ancien fichier piaget_documents.pkl au format colonnaire."""
+    with open(pickle_path, 'rb') as f:
+        documents = pickle.load(f)
+    write_document_store(documents, directory or os.path.dirname(pickle_path))
+
+def main():
+    parser = argparse.ArgumentParser(description="Conversion de piaget_documents.pkl au format colonnaire")
+    parser.add_argument("--pickle", default="data/processed/piaget_documents.pkl", help="Fichier pickle à convertir")
+    parser.add_argument("--output-dir", default=None, help="Répertoire de sortie (par défaut celui du pickle)")
+    args = parser.parse_args()
+    convert_pickle(args.pickle, args.output_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from urllib.parse import urlsplit
+import aiohttp
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+# Statuts pour lesquels la requête est retentée
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class RateLimiter:
+    """Plafond global de requêtes par seconde : les départs sont espacés d'au moins 1/rate secondes."""
+
+    def __init__(self, rate: Optional[float]):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class AsyncFetcher:
+    """Client HTTP asynchrone avec connexions persistantes, pour les pages statiques.
+
+    Une seule session aiohttp (pool de connexions keep-alive) sert toutes les
+    requêtes. Le nombre de requêtes simultanées par hôte est borné, le débit global
+    est plafonné à `rate` requêtes par seconde, et les erreurs réseau, délais
+    dépassés et statuts 429/5xx sont retentés avec un backoff exponentiel (en
+    respectant Retry-After).
+
+    S'utilise comme gestionnaire de contexte asynchrone :
+
+        async with AsyncFetcher() as fetcher:
+            pages = await fetcher.fetch_all(urls)
+    """
+
+    def __init__(self, per_host: int = 8, rate: Optional[float] = 5.0, retries: int = 3,
+                 backoff: float = 0.5, timeout: float = 30.0, user_agent: str = USER_AGENT):
+        self.per_host = per_host
+        self.rate_limiter = RateLimiter(rate)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.session = None
+        self._host_limits = {}
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit_per_host=self.per_host, keepalive_timeout=30)
+        self.session = aiohttp.ClientSession(connector=connector,
+                                             timeout=aiohttp.ClientTimeout(total=self.timeout),
+                                             headers={"User-Agent": self.user_agent})
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Télécharge une page.
+
+        Args:
+            url: URL de la page
+            headers: En-têtes supplémentaires de la requête
+
+        Returns:
+            Dictionnaire avec 'url', 'status', 'headers' et 'text' (None si la page n'a pas
+            pu être téléchargée ou si le statut n'est pas 200 ; 'error' décrit alors l'échec)
+        """
+        host_limit = self._host_limits.setdefault(urlsplit(url).netloc, asyncio.Semaphore(self.per_host))
+        status, error = None, None
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            async with host_limit:
+                await self.rate_limiter.wait()
+                try:
+                    async with self.session.get(url, headers=headers) as response:
+                        status = response.status
+                        if status not in RETRY_STATUSES:
+                            text = await response.text() if status == 200 else None
+                            return {'url': url, 'status': status, 'headers': dict(response.headers), 'text': text,
+                                    'error': None if status in (200, 304) else f"HTTP {status}"}
+                        error = f"HTTP {status}"
+                        retry_after = response.headers.get("Retry-After")
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    status, error = None, f"{e.__class__.__name__}: {e}"
+            if attempt < self.retries:
+                # Backoff exponentiel avec gigue, ou délai imposé par le serveur
+                delay = self.backoff * (2 ** attempt) * (1 + random.random())
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+                await asyncio.sleep(delay)
+        print(f"Échec du téléchargement de {url} après {self.retries + 1} tentatives: {error}")
+        return {'url': url, 'status': status, 'headers': {}, 'text': None, 'error': error}
+
+    async def fetch_all(self, urls: Sequence[str], headers: Optional[Sequence[Optional[Dict[str, str]]]] = None,
+                        on_result: Optional[Callable[[int, Dict[str, Any]], Any]] = None,
+                        max_pending: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Télécharge toutes les pages en parallèle et retourne les résultats dans l'ordre des URL.
+
+        Si `on_result` est fourni, il est appelé avec (indice, résultat) dès que chaque
+        page est téléchargée, ce qui permet de la traiter sans attendre les autres ;
+        le résultat retourné par `on_result` remplace alors celui de la page. Il est
+        exécuté dans un pool de threads, pour que l'analyse et l'écriture des pages ne
+        bloquent pas la boucle d'événements (il doit donc être thread-safe). Au plus
+        `max_pending` pages (par défaut 2 × per_host) sont en cours de téléchargement
+        ou de traitement : si `on_result` prend du retard ou bloque, les nouvelles
+        requêtes attendent au lieu d'accumuler les pages en mémoire."""
+        headers = headers or [None] * len(urls)
+        if on_result is None:
+            return await asyncio.gather(*(self.fetch(url, page_headers)
+                                          for url, page_headers in zip(urls, headers)))
+        loop = asyncio.get_running_loop()
+        pending = asyncio.Semaphore(max_pending or 2 * self.per_host)
+
+        with ThreadPoolExecutor(max_workers=self.per_host, thread_name_prefix="fetch-result") as executor:
+            async def fetch_one(i, url, page_headers):
+                async with pending:
+                    result = await self.fetch(url, page_headers)
+                    return await loop.run_in_executor(executor, on_result, i, result)
+            return await asyncio.gather(*(fetch_one(i, url, page_headers)
+                                          for i, (url, page_headers) in enumerate(zip(urls, headers))))
+
+def fetch_pages(urls: Sequence[str], headers: Optional[Sequence[Optional[Dict[str, str]]]] = None,
+                on_result: Optional[Callable[[int, Dict[str, Any]], Any]] = None,
+                **fetcher_options) -> List[Dict[str, Any]]:
+    """Version synchrone de AsyncFetcher.fetch_all (voir AsyncFetcher pour les options)."""
+    async def run():
+        async with AsyncFetcher(**fetcher_options) as fetcher:
+            return await fetcher.fetch_all(urls, headers, on_result)
+    return asyncio.run(run())
@@ -0,0 +1,209 @@
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from typing import Any, Dict, Iterator
+
+from data_preprocess import (BUILD_MANIFEST_FILENAME, EMBEDDING_CACHE_FILENAME, build_arg_parser,
+                             preprocess_works)
+from data_scrap import (BASE_URL, CHANGES_FILENAME, DEFAULT_BROWSERS, HTTP_CONCURRENCY, HTTP_RATE,
+                        OUTPUT_DIR, START_URL, scrape_piaget_oeuvres)
+
+# Nombre d'œuvres scrapées en attente de découpage : au-delà, le scraping attend
+QUEUE_SIZE = 32
+# Marqueur de fin du flux d'œuvres
+_END = object()
+# Suffixe du répertoire des constructions versionnées ; le répertoire de sortie est un lien vers l'une d'elles
+BUILDS_SUFFIX = ".builds"
+
+class IngestionAborted(Exception):
+    """Le prétraitement a échoué : le scraping en cours est interrompu."""
+
+class WorkStream:
+    """Flux d'œuvres entre le scraper (thread producteur) et le prétraitement.
+
+    Les œuvres passent par une file bornée : le scraper est ralenti si le découpage
+    et l'encodage prennent du retard, et aucune des deux étapes n'attend la fin de
+    l'autre. `put` bloque : il est appelé depuis les threads de traitement des pages
+    du scraper, jamais depuis sa boucle d'événements, et une file pleine suspend
+    seulement le lancement de nouvelles requêtes (voir AsyncFetcher.fetch_all). Une
+    erreur du scraper est relancée côté prétraitement ; si le prétraitement échoue,
+    `close` interrompt le scraper au prochain envoi."""
+
+    def __init__(self, maxsize: int = QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.closed = threading.Event()
+        self.count = 0
+
+    def put(self, work: Dict[str, Any]):
+        """Envoie une œuvre (appelé par un thread du scraper, bloque si la file est pleine)."""
+        while not self.closed.is_set():
+            try:
+                self.queue.put(work, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise IngestionAborted("Prétraitement interrompu")
+
+    def finish(self, error: BaseException = None):
+        """Signale la fin du scraping, éventuellement en échec."""
+        self.queue.put(error if error is not None else _END)
+
+    def close(self):
+        self.closed.set()
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        while True:
+            item = self.queue.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            self.count += 1
+            yield item
+
+def move_embedding_cache(source_dir: str, target_dir: str):
+    """Déplace le cache d'embeddings d'une construction à l'autre (simple renommage)."""
+    cache_path = os.path.join(source_dir, EMBEDDING_CACHE_FILENAME)
+    if os.path.exists(cache_path):
+        os.makedirs(target_dir, exist_ok=True)
+        os.replace(cache_path, os.path.join(target_dir, EMBEDDING_CACHE_FILENAME))
+
+def new_build_dir(output_dir: str) -> str:
+    """Répertoire versionné d'une nouvelle construction, à côté de `output_dir`."""
+    return os.path.join(output_dir + BUILDS_SUFFIX, time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}")
+
+def commit_build(build_dir: str, output_dir: str):
+    """Publie la nouvelle construction en remplaçant le lien symbolique `output_dir`.
+
+    `output_dir` est un lien vers le répertoire versionné de la construction en
+    service ; le nouveau lien est créé à côté puis mis en place par os.replace,
+    qui est atomique : les lecteurs voient soit l'ancienne construction, soit la
+    nouvelle, et une interruption laisse toujours l'une des deux en service."""
+    link_path = output_dir + ".link"
+    if os.path.lexists(link_path):
+        os.remove(link_path)
+    os.symlink(os.path.relpath(build_dir, os.path.dirname(os.path.abspath(output_dir))), link_path)
+    if os.path.isdir(output_dir) and not os.path.islink(output_dir):
+        # Construction d'une version précédente (vrai répertoire) : un lien ne peut pas
+        # la remplacer directement, elle est mise de côté (restaurée par cleanup_builds
+        # en cas d'interruption)
+        os.rename(output_dir, output_dir + ".old")
+    os.replace(link_path, output_dir)
+    cleanup_builds(output_dir)
+
+def cleanup_builds(output_dir: str):
+    """Supprime les constructions qui ne sont plus en service et les restes d'une exécution interrompue."""
+    old_dir = output_dir + ".old"
+    if os.path.isdir(old_dir):
+        if os.path.lexists(output_dir):
+            shutil.rmtree(old_dir)
+        else:
+            # Interruption entre la mise de côté et la publication du lien
+            os.rename(old_dir, output_dir)
+    link_path = output_dir + ".link"
+    if os.path.lexists(link_path):
+        os.remove(link_path)
+    builds_dir = output_dir + BUILDS_SUFFIX
+    if not os.path.isdir(builds_dir):
+        return
+    current = os.path.realpath(output_dir) if os.path.islink(output_dir) else None
+    for name in os.listdir(builds_dir):
+        path = os.path.join(builds_dir, name)
+        if os.path.realpath(path) != current:
+            shutil.rmtree(path, ignore_errors=True)
+
+def set_source_fingerprint(build_dir: str, fingerprint: str):
+    """Enregistre l'empreinte du corpus scrapé dans le manifeste de construction."""
+    path = os.path.join(build_dir, BUILD_MANIFEST_FILENAME)
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    manifest['source_fingerprint'] = fingerprint
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+def build_ingest_parser():
+    parser = build_arg_parser()
+    parser.description = "Scraping et prétraitement en flux des œuvres de Jean Piaget"
+    parser.add_argument("--fetch", choices=["http", "selenium"], default="http",
+                        help="Téléchargement HTTP direct (Selenium en secours) ou Selenium pour toutes les pages")
+    parser.add_argument("--browsers", type=int, default=DEFAULT_BROWSERS,
+                        help="Nombre de navigateurs headless lancés une fois et réutilisés")
+    parser.add_argument("--concurrency", type=int, default=HTTP_CONCURRENCY,
+                        help="Requêtes HTTP simultanées par hôte")
+    parser.add_argument("--rate", type=float, default=HTTP_RATE,
+                        help="Nombre maximal de requêtes HTTP par seconde (0 = illimité)")
+    parser.add_argument("--base-url", default=BASE_URL, help="URL de base du site (serveur local de test)")
+    parser.add_argument("--start-url", default=START_URL, help="URL de la page listant les œuvres")
+    parser.add_argument("--data-dir", default=OUTPUT_DIR,
+                        help="Répertoire du journal de scraping, du cache HTML et de piaget_data.json")
+    parser.add_argument("--resume", action="store_true",
+                        help="Reprend l'exécution de scraping interrompue à partir du journal")
+    return parser
+
+def main():
+    args = build_ingest_parser().parse_args()
+    # Les chunks et embeddings inchangés sont repris de la construction en service
+    args.incremental = True
+    output_dir = args.output_dir.rstrip(os.sep)
+    # Constructions abandonnées par une exécution interrompue
+    cleanup_builds(output_dir)
+    staging_dir = new_build_dir(output_dir)
+
+    start_time = time.time()
+    print("=== DÉBUT DE L'INGESTION ===\n")
+    # Le cache d'embeddings est enrichi pendant la construction et la suit
+    move_embedding_cache(output_dir, staging_dir)
+    stream = WorkStream()
+    scrape_times = {}
+
+    def scrape():
+        try:
+            scrape_piaget_oeuvres(args.browsers, args.fetch, args.base_url, args.start_url,
+                                  os.path.join(args.data_dir, "piaget_data.json"), args.concurrency,
+                                  args.rate, args.resume, on_work=stream.put)
+            scrape_times['end'] = time.time()
+            stream.finish()
+        except BaseException as e:
+            stream.finish(e)
+
+    scraper = threading.Thread(target=scrape, name="scraper", daemon=True)
+    scraper.start()
+    try:
+        documents = preprocess_works(stream, staging_dir, args, previous_dir=output_dir)
+    except BaseException:
+        stream.close()
+        scraper.join()
+        move_embedding_cache(staging_dir, output_dir)
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    scraper.join()
+    if stream.count == 0:
+        # Rien n'a été scrapé : la construction en service est conservée
+        move_embedding_cache(staging_dir, output_dir)
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        print("Aucune œuvre récupérée, la construction existante est conservée.")
+        return
+    end_time = time.time()
+
+    changes_path = os.path.join(args.data_dir, CHANGES_FILENAME)
+    if os.path.exists(changes_path):
+        with open(changes_path, 'r', encoding='utf-8') as f:
+            set_source_fingerprint(staging_dir, json.load(f).get('fingerprint'))
+    n_chunks = len(documents)
+    if hasattr(documents, 'close'):
+        documents.close()
+    commit_build(staging_dir, output_dir)
+
+    total_time = time.time() - start_time
+    print(f"\n=== INGESTION TERMINÉE EN {total_time:.2f} SECONDES ===\n")
+    print(f"- Œuvres: {stream.count}, chunks indexés: {n_chunks}")
+    if 'end' in scrape_times:
+        print(f"- Scraping terminé après {scrape_times['end'] - start_time:.2f} s, "
+              f"prétraitement {end_time - scrape_times['end']:.2f} s plus tard")
+    print(f"- Construction publiée dans {output_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -1,130 +1,368 @@
+import time
+# Début de l'import du module (voir startup_report)
+_IMPORT_START = time.perf_counter()
+import asyncio
+import hashlib
 import os
 import pickle
-from typing import List, Dict, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Dict, Any
 from dotenv import load_dotenv
-import faiss
 import numpy as np
-# Remplacer SentenceTransformer par une solution plus stable
-# from sentence_transformers import SentenceTransformer
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain.prompts import ChatPromptTemplate
-from langchain.schema import Document
+from functools import lru_cache
+from answer_stream import AnswerStream
+from query_cache import (ANSWER_CACHE_FILENAME, CACHE_DIR, QUERY_CACHE_FILENAME, AnswerCache,
+                         QueryEmbeddingCache, evidence_key)
+
+# faiss, langchain et langchain_openai sont importés à la première utilisation :
+# importer ce module ne charge ni ne vérifie aucune donnée
+if TYPE_CHECKING:
+    from langchain.prompts import ChatPromptTemplate
+    from langchain.schema import Document
 
 # Charger les variables d'environnement (pour la compatibilité avec l'ancienne version)
 load_dotenv()
 
-# Vérifier que les fichiers prétraités existent
 PROCESSED_DIR = "data/processed"
 INDEX_PATH = os.path.join(PROCESSED_DIR, "piaget_index.faiss")
+# Ancien format des documents, utilisé si le magasin colonnaire est absent
 DOCUMENTS_PATH = os.path.join(PROCESSED_DIR, "piaget_documents.pkl")
 
-if not os.path.exists(INDEX_PATH) or not os.path.exists(DOCUMENTS_PATH):
-    print("Erreur: Fichiers prétraités non trouvés.")
-    print("Veuillez d'abord exécuter le script preprocess.py pour générer les embeddings.")
-    exit(1)
+def check_preprocessed_files():
+    """Vérifie que les fichiers prétraités existent (FileNotFoundError sinon)."""
+    from document_store import store_exists
+    if not os.path.exists(INDEX_PATH) or not (store_exists(PROCESSED_DIR) or os.path.exists(DOCUMENTS_PATH)):
+        raise FileNotFoundError(
+            f"Fichiers prétraités non trouvés dans {PROCESSED_DIR}. "
+            "Veuillez d'abord exécuter le script data_preprocess.py pour générer les embeddings."
+        )
 
-class PiagetRAG:
-    def __init__(self, model_name="gpt-4.1-nano", api_key=None):
-        """
-        Initialise le système RAG pour Jean Piaget en chargeant les données prétraitées.
+# Modèle utilisé par data_preprocess.py, supposé pour les index sans manifeste
+DEFAULT_EMBEDDING_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
+OPENAI_EMBEDDING_MODEL = "text-embedding-3-small"
+# Limites d'une requête à l'API d'embeddings OpenAI (nombre d'entrées, tokens au total)
+OPENAI_MAX_BATCH_SIZE = 2048
+OPENAI_MAX_BATCH_TOKENS = 300000
+# Seuil de similarité des passages utilisés pour répondre (réduit de 0.6 à 0.5 pour être moins sélectif)
+ANSWER_SIMILARITY_THRESHOLD = 0.5
+NO_RESULTS_ANSWER = "Je ne trouve pas d'information pertinente dans mes écrits pour répondre à cette question."
+
+@lru_cache(maxsize=None)
+def _load_sentence_transformer(model_name):
+    """Charge un modèle Sentence-Transformers une seule fois par processus."""
+    # Import tardif : torch n'est chargé que si l'encodeur local est utilisé
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name, device="cpu")
+
+class SentenceTransformerEmbedder:
+    """Encode les requêtes localement sur CPU avec le modèle qui a servi à construire l'index."""
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.model = _load_sentence_transformer(model_name)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+    
+    def encode(self, texts, **kwargs):
+        return np.asarray(self.model.encode(list(texts), convert_to_numpy=True), dtype=np.float32)
+
+class OpenAIEmbeddingWrapper:
+    """Rend OpenAIEmbeddings compatible avec l'interface encode() utilisée par la recherche.
+
+    Les textes sont envoyés par lots, un lot par requête, dans la limite du nombre
+    d'entrées et de tokens qu'accepte l'API pour une requête."""
+    def __init__(self, openai_embeddings, model_name=OPENAI_EMBEDDING_MODEL, dimension=1536,
+                 max_batch_size=OPENAI_MAX_BATCH_SIZE, max_batch_tokens=OPENAI_MAX_BATCH_TOKENS):
+        self.openai_embeddings = openai_embeddings
+        self.model_name = model_name
+        self.dimension = dimension
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+    
+    def _batches(self, texts):
+        """Découpe les textes en lots respectant les limites d'une requête."""
+        batch, batch_tokens = [], 0
+        for text in texts:
+            # Estimation prudente (environ 3 caractères par token en français)
+            tokens = len(text) // 3 + 1
+            if batch and (len(batch) >= self.max_batch_size or batch_tokens + tokens > self.max_batch_tokens):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            yield batch
+    
+    def encode(self, texts, fallback=True, **kwargs):
+        # Convertir les embeddings OpenAI en format compatible avec FAISS
+        texts = list(texts)
+        try:
+            vectors = []
+            for batch in self._batches(texts):
+                vectors.extend(self.openai_embeddings.embed_documents(batch))
+            return np.array(vectors, dtype=np.float32).reshape(len(texts), self.dimension)
+        except Exception as e:
+            if not fallback:
+                raise
+            print(f"Erreur lors de la création des embeddings OpenAI: {e}")
+            # Fallback en cas d'erreur
+            return self._fallback_encode(texts)
+    
+    async def aencode(self, texts, fallback=True, **kwargs):
+        """Version asynchrone de encode : les lots sont envoyés en parallèle."""
+        texts = list(texts)
+        try:
+            results = await asyncio.gather(*(self.openai_embeddings.aembed_documents(batch)
+                                             for batch in self._batches(texts)))
+            vectors = [vector for batch_vectors in results for vector in batch_vectors]
+            return np.array(vectors, dtype=np.float32).reshape(len(texts), self.dimension)
+        except Exception as e:
+            if not fallback:
+                raise
+            print(f"Erreur lors de la création des embeddings OpenAI: {e}")
+            return self._fallback_encode(texts)
+    
+    def _fallback_encode(self, texts):
+        # Méthode de secours si OpenAI échoue
+        return SimpleEmbedder(self.model_name, self.dimension).encode(texts)
+
+class SimpleEmbedder:
+    """Encodeur de dernier recours : vecteurs aléatoires mais cohérents (basés sur le hash du texte)."""
+    # Ses vecteurs ne doivent pas être mis en cache à la place des vrais embeddings
+    cacheable = False
+    
+    def __init__(self, model_name, dimension):
+        self.model_name = model_name
+        self.dimension = dimension
+    
+    def encode(self, texts, **kwargs):
+        vectors = []
+        for text in texts:
+            # Générer un vecteur basé sur le hash du texte pour la cohérence
+            np.random.seed(hash(text) % 2**32)
+            vec = np.random.randn(self.dimension)
+            # Normaliser
+            vec = vec / np.linalg.norm(vec)
+            vectors.append(vec)
+        return np.array(vectors, dtype=np.float32)
+
+def create_query_embedder(backend, model_name, dimension, api_key=None):
+    """
+    Crée l'encodeur de requêtes pour le backend demandé.
+    
+    Args:
+        backend: "local" (Sentence-Transformers sur CPU), "openai", ou "simple"
+            (vecteurs aléatoires, pour tester l'application sans modèle d'embedding)
+        model_name: Modèle d'embedding avec lequel l'index a été construit
+        dimension: Dimension des vecteurs de l'index
+        api_key: Clé API OpenAI (backend "openai" uniquement)
+    
+    Une erreur d'initialisation de l'encodeur (Sentence-Transformers absent, modèle
+    introuvable...) est relancée : des vecteurs de secours aléatoires donneraient des
+    résultats de recherche sans rapport avec la requête.
+    """
+    if backend not in ("local", "openai", "simple"):
+        raise ValueError(f"Backend d'embedding inconnu: {backend}")
+    if backend == "simple":
+        print("Attention : encodeur de requêtes simple (vecteurs aléatoires), les résultats ne sont pas pertinents")
+        return SimpleEmbedder(model_name, dimension)
+    if backend == "local":
+        embedder = SentenceTransformerEmbedder(model_name)
+        print(f"Modèle d'embedding local initialisé avec succès: {model_name}")
+    else:
+        from langchain_openai import OpenAIEmbeddings
+        # chunk_size : les lots de OpenAIEmbeddingWrapper partent chacun en une seule requête
+        openai_embeddings = OpenAIEmbeddings(model=model_name, openai_api_key=api_key,
+                                             chunk_size=OPENAI_MAX_BATCH_SIZE)
+        embedder = OpenAIEmbeddingWrapper(openai_embeddings, model_name=model_name, dimension=dimension)
+        print("Modèle d'embedding OpenAI initialisé avec succès")
+    return embedder
+
+class PiagetResources:
+    """État en lecture seule partagé par toutes les sessions d'un processus.
+
+    Regroupe ce qui est coûteux à charger : l'index FAISS, le magasin de documents,
+    l'encodeur de requêtes et les caches. Plusieurs PiagetRAG (un par session, avec
+    leur propre modèle LLM et leur clé API) peuvent utiliser les mêmes ressources.
+
+    Le chargement est différé : il a lieu au premier accès à l'une des ressources,
+    ou dès la construction dans un thread d'arrière-plan avec `background`. `ready`
+    indique sans bloquer si les ressources sont prêtes et `wait` attend la fin du
+    chargement. `startup_times` détaille la durée de chaque étape."""
+    # Attributs créés par le chargement : y accéder attend la fin du chargement
+    LOADED_ATTRIBUTES = {'index', 'build_id', 'index_manifest', 'rescore_vectors', 'documents',
+                         'chunk_title_ids', 'embedding_model', 'query_cache', 'answer_cache'}
+    
+    def __init__(self, embedding_backend="local", api_key=None, query_cache_size=1024,
+                 answer_cache_threshold=0.92, answer_cache_ttl=7 * 24 * 3600, answer_cache_size=1000,
+                 mmap_index=False, background=False, search_workers=4):
         """
-        # Chargement de l'index FAISS et des documents
-        self._load_preprocessed_data()
+        Prépare le chargement des données prétraitées, de l'encodeur de requêtes et des caches.
         
-        # Vérifier si une clé API a été fournie
-        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        Args:
+            embedding_backend: "local" pour encoder les requêtes sur CPU avec le modèle
+                Sentence-Transformers de l'index, "openai" pour un index construit
+                avec les embeddings OpenAI, ou "simple" pour des vecteurs aléatoires
+                (tests sans modèle d'embedding)
+            api_key: Clé API OpenAI du backend d'embedding "openai" (par défaut la
+                variable d'environnement OPENAI_API_KEY)
+            query_cache_size: Nombre d'embeddings de requêtes gardés en mémoire (LRU) ;
+                les autres restent dans le cache SQLite partagé (data/cache/)
+            answer_cache_threshold: Similarité cosinus minimale entre deux questions pour
+                réutiliser une réponse (None désactive le cache des réponses)
+            answer_cache_ttl: Durée de validité d'une réponse en cache, en secondes
+            answer_cache_size: Nombre maximal de réponses en cache
+            mmap_index: Projette l'index FAISS en mémoire au lieu de le copier : les
+                processus d'un même hôte partagent alors une seule copie des vecteurs
+            background: Lance le chargement immédiatement dans un thread d'arrière-plan
+            search_workers: Taille du pool de threads des calculs de asearch et
+                aanswer_question (encodeur local, FAISS, caches SQLite)
+        """
+        self.options = {
+            'embedding_backend': embedding_backend, 'api_key': api_key, 'query_cache_size': query_cache_size,
+            'answer_cache_threshold': answer_cache_threshold, 'answer_cache_ttl': answer_cache_ttl,
+            'answer_cache_size': answer_cache_size, 'mmap_index': mmap_index
+        }
+        self.startup_times = {'module_import': MODULE_IMPORT_TIME}
+        # Pool borné : les requêtes asynchrones simultanées se partagent ces threads
+        self.search_executor = ThreadPoolExecutor(max_workers=search_workers, thread_name_prefix="piaget-search")
+        self._loaded = threading.Event()
+        self._load_lock = threading.Lock()
+        self._load_error = None
+        self._loader = None
+        self.background = background
+        if background:
+            threading.Thread(target=self._load_in_background, name="piaget-resources", daemon=True).start()
+    
+    def __getattr__(self, name):
+        # Appelé seulement pour les attributs absents : ressources pas encore chargées
+        # (pendant le chargement lui-même, un attribut absent est une vraie erreur)
+        if name in PiagetResources.LOADED_ATTRIBUTES and self.__dict__.get('_loader') != threading.get_ident():
+            self.load()
+            return self.__dict__[name]
+        raise AttributeError(name)
+    
+    def ready(self) -> bool:
+        """Indique, sans bloquer, si les ressources sont chargées."""
+        return self._loaded.is_set()
+    
+    def wait(self, timeout=None) -> bool:
+        """Attend la fin du chargement (le lance s'il n'est pas en arrière-plan) ; relance son erreur éventuelle."""
+        if not self.background:
+            self.load()
+        finished = self._loaded.wait(timeout)
+        if self._load_error is not None:
+            raise self._load_error
+        return finished
+    
+    def _load_in_background(self):
+        try:
+            self.load()
+        except Exception as e:
+            print(f"Erreur lors du chargement des ressources: {e}")
+    
+    def load(self):
+        """Charge les ressources si ce n'est pas déjà fait (une seule fois, même entre threads)."""
+        with self._load_lock:
+            if self._loaded.is_set():
+                if self._load_error is not None:
+                    raise self._load_error
+                return
+            start = time.perf_counter()
+            self._loader = threading.get_ident()
+            try:
+                self._load(**self.options)
+            except Exception as e:
+                self._load_error = e
+                raise
+            finally:
+                self._loader = None
+                self.startup_times['total_load'] = time.perf_counter() - start
+                self._loaded.set()
+    
+    def _load(self, embedding_backend, api_key, query_cache_size, answer_cache_threshold, answer_cache_ttl,
+              answer_cache_size, mmap_index):
+        start = time.perf_counter()
+        check_preprocessed_files()
+        # Import tardif des dépendances lourdes de la recherche
+        import faiss
+        import vector_index
+        import document_store
+        self.startup_times['import'] = time.perf_counter() - start
         
-        # Vérifier que la clé API est définie
-        if not self.api_key:
-            print("Avertissement: Aucune clé API OpenAI n'a été fournie.")
-            print("Certaines fonctionnalités peuvent ne pas fonctionner correctement.")
-        else:
-            # Définir la clé API pour OpenAI
-            os.environ["OPENAI_API_KEY"] = self.api_key
+        # Chargement de l'index FAISS et des documents
+        self._load_preprocessed_data(mmap_index)
         
         # Initialisation du modèle d'embedding (uniquement pour les requêtes)
+        start = time.perf_counter()
         print("Initialisation du système d'embedding...")
-        
-        # Utiliser OpenAI Embeddings au lieu de SentenceTransformer pour éviter les erreurs de segmentation
-        try:
-            # Utiliser OpenAI pour les embeddings (plus stable que SentenceTransformer)
-            self.embedding_model = OpenAIEmbeddings(model="text-embedding-3-small", openai_api_key=self.api_key)
-            print("Modèle d'embedding OpenAI initialisé avec succès")
-            
-            # Créer un wrapper pour rendre l'interface compatible avec notre code existant
-            class OpenAIEmbeddingWrapper:
-                def __init__(self, openai_embeddings):
-                    self.openai_embeddings = openai_embeddings
-                
-                def encode(self, texts, **kwargs):
-                    # Convertir les embeddings OpenAI en format compatible avec FAISS
-                    try:
-                        # Obtenir les embeddings un par un pour éviter les erreurs
-                        vectors = []
-                        for text in texts:
-                            embedding = self.openai_embeddings.embed_query(text)
-                            vectors.append(embedding)
-                        return np.array(vectors, dtype=np.float32)
-                    except Exception as e:
-                        print(f"Erreur lors de la création des embeddings OpenAI: {e}")
-                        # Fallback en cas d'erreur
-                        return self._fallback_encode(texts)
-                
-                def _fallback_encode(self, texts):
-                    # Méthode de secours si OpenAI échoue
-                    import numpy as np
-                    vectors = []
-                    for text in texts:
-                        np.random.seed(hash(text) % 2**32)
-                        vec = np.random.randn(1536)  # Dimension pour OpenAI embeddings
-                        vec = vec / np.linalg.norm(vec)
-                        vectors.append(vec)
-                    return np.array(vectors, dtype=np.float32)
-            
-            # Wrapper pour l'interface compatible
-            self.embedding_model = OpenAIEmbeddingWrapper(self.embedding_model)
-            
-        except Exception as e:
-            print(f"Erreur lors de l'initialisation d'OpenAI Embeddings: {e}")
-            print("Utilisation d'un modèle d'embedding de secours simple")
-            
-            # Créer une classe d'embedding simplifiée comme solution de dernier recours
-            class SimpleEmbedder:
-                def encode(self, texts, **kwargs):
-                    # Retourner des vecteurs aléatoires mais cohérents (basés sur le hash du texte)
-                    import numpy as np
-                    vectors = []
-                    for text in texts:
-                        # Générer un vecteur basé sur le hash du texte pour la cohérence
-                        np.random.seed(hash(text) % 2**32)
-                        vec = np.random.randn(384)  # Dimension standard pour ce modèle
-                        # Normaliser
-                        vec = vec / np.linalg.norm(vec)
-                        vectors.append(vec)
-                    return np.array(vectors, dtype=np.float32)
-            
-            self.embedding_model = SimpleEmbedder()
-        
-        # Initialisation du LLM avec le modèle spécifié
-        self.llm = ChatOpenAI(
-            model_name=model_name,
-            temperature=0.3,
-            openai_api_key=self.api_key
+        # L'encodeur local utilise le modèle de l'index ; le backend OpenAI n'est
+        # accepté que pour un index construit avec les embeddings OpenAI
+        if embedding_backend in ("local", "simple"):
+            embedding_model_name = self.index_manifest['embedding_model']
+        else:
+            embedding_model_name = OPENAI_EMBEDDING_MODEL
+        self.embedding_model = create_query_embedder(
+            embedding_backend,
+            embedding_model_name,
+            self.index_manifest['dimension'],
+            api_key=api_key or os.getenv("OPENAI_API_KEY")
         )
-        
-        # Stocker le nom du modèle pour référence
-        self.model_name = model_name
-        
-        # Création du template de prompt
-        self.prompt_template = self._create_prompt_template()
+        self._check_embedder_compatibility()
+        self.report_memory()
+        # Les questions déjà posées ne sont pas ré-encodées
+        self.query_cache = QueryEmbeddingCache(os.path.join(CACHE_DIR, QUERY_CACHE_FILENAME),
+                                               self.embedding_model.model_name, max_entries=query_cache_size)
+        # Les questions quasi identiques qui retrouvent les mêmes passages réutilisent la réponse
+        self.answer_cache = None
+        if answer_cache_threshold is not None:
+            self.answer_cache = AnswerCache(os.path.join(CACHE_DIR, ANSWER_CACHE_FILENAME),
+                                            threshold=answer_cache_threshold, ttl=answer_cache_ttl,
+                                            max_entries=answer_cache_size)
+        self.startup_times['embedder'] = time.perf_counter() - start
     
-    def _load_preprocessed_data(self):
+    def _load_preprocessed_data(self, mmap_index=False):
         """Charge l'index FAISS et les documents prétraités."""
+        from document_store import DocumentStore, store_exists
+        from vector_index import load_index, read_index_manifest
         # Chargement de l'index FAISS
-        self.index = faiss.read_index(INDEX_PATH)
+        start = time.perf_counter()
+        self.index = load_index(INDEX_PATH, mmap=mmap_index)
+        # Identifie la construction chargée (clé du cache des réponses)
+        self.build_id = str(os.stat(INDEX_PATH).st_mtime_ns)
         print(f"Index FAISS chargé avec {self.index.ntotal} vecteurs")
         
-        # Chargement des documents
+        # Le manifeste indique le modèle d'embedding avec lequel l'index a été construit
+        self.index_manifest = read_index_manifest(INDEX_PATH)
+        if self.index_manifest is None:
+            print(f"Avertissement: manifeste de l'index absent, modèle supposé: {DEFAULT_EMBEDDING_MODEL}")
+            self.index_manifest = {'embedding_model': DEFAULT_EMBEDDING_MODEL, 'dimension': self.index.d}
+        if self.index_manifest['dimension'] != self.index.d:
+            raise ValueError(
+                f"Le manifeste indique une dimension {self.index_manifest['dimension']} "
+                f"mais l'index FAISS a une dimension {self.index.d}"
+            )
+        
+        # Vecteurs float32 pour la re-notation exacte d'un index quantifié (projetés en
+        # mémoire : seules les lignes des candidats sont lues)
+        self.rescore_vectors = None
+        if self.index_manifest.get('rescore_vectors'):
+            self.rescore_vectors = np.load(os.path.join(PROCESSED_DIR, self.index_manifest['rescore_vectors']), mmap_mode='r')
+            print(f"Re-notation exacte activée ({self.index_manifest.get('vector_encoding')} + float32)")
+        self.startup_times['index'] = time.perf_counter() - start
+        
+        # Chargement des documents : le magasin colonnaire est projeté en mémoire
+        # et ne crée des Document que pour les chunks effectivement consultés
+        start = time.perf_counter()
+        # Identifiants de titre par chunk, seulement pour l'ancien format (voir title_ids)
+        self.chunk_title_ids = None
+        if store_exists(PROCESSED_DIR):
+            self.documents = DocumentStore(PROCESSED_DIR)
+            print(f"Documents chargés: {len(self.documents)} chunks")
+            self.startup_times['store'] = time.perf_counter() - start
+            return
+        
+        print("Magasin colonnaire absent, chargement de l'ancien fichier pickle "
+              "(convertissez-le avec: python document_store.py)")
         with open(DOCUMENTS_PATH, 'rb') as f:
             self.documents = pickle.load(f)
         print(f"Documents chargés: {len(self.documents)} chunks")
@@ -133,8 +371,139 @@ class PiagetRAG:
         for doc in self.documents:
             if 'url' not in doc.metadata:
                 doc.metadata['url'] = ""  # Ajouter une URL vide si elle n'existe pas
+        title_index = {}
+        self.chunk_title_ids = np.array([title_index.setdefault(doc.metadata['title'], len(title_index))
+                                         for doc in self.documents], dtype=np.int32)
+        self.startup_times['store'] = time.perf_counter() - start
+    
+    def title_ids(self, indices: np.ndarray) -> np.ndarray:
+        """Identifiant entier du titre de chaque chunk (limite de résultats par titre, voir search)."""
+        if self.chunk_title_ids is None:
+            return self.documents.title_ids(indices)
+        return self.chunk_title_ids[indices]
+    
+    def memory_report(self):
+        """Mémoire du processus (voir vector_index.memory_report), 'mapped' comptant
+        les pages résidentes de l'index, des textes et des vecteurs projetés en mémoire."""
+        from document_store import TEXT_FILENAME
+        from vector_index import memory_report
+        mapped_paths = [INDEX_PATH, os.path.join(PROCESSED_DIR, TEXT_FILENAME)]
+        if self.index_manifest.get('rescore_vectors'):
+            mapped_paths.append(os.path.join(PROCESSED_DIR, self.index_manifest['rescore_vectors']))
+        return memory_report(mapped_paths)
+    
+    def report_memory(self):
+        """Affiche la mémoire résidente du processus et la part partagée avec les autres processus."""
+        report = self.memory_report()
+        if report is None:
+            return
+        print(f"Mémoire du processus: {report['resident'] / 1e6:.1f} Mo résidents, dont "
+              f"{report['shared'] / 1e6:.1f} Mo partagés et {report['anonymous'] / 1e6:.1f} Mo privés anonymes ; "
+              f"fichiers projetés (index, textes, vecteurs): {report['mapped'] / 1e6:.1f} Mo résidents")
+    
+    def _check_embedder_compatibility(self):
+        """Refuse un encodeur de requêtes incompatible avec l'index chargé."""
+        expected_model = self.index_manifest['embedding_model']
+        expected_dimension = self.index_manifest['dimension']
+        if self.embedding_model.model_name != expected_model or self.embedding_model.dimension != expected_dimension:
+            raise ValueError(
+                f"L'encodeur de requêtes ({self.embedding_model.model_name}, dimension {self.embedding_model.dimension}) "
+                f"ne correspond pas à l'index ({expected_model}, dimension {expected_dimension}). "
+                "Reconstruisez l'index avec data_preprocess.py ou choisissez un autre backend d'embedding."
+            )
+
+class PiagetRAG:
+    def __init__(self, model_name="gpt-4.1-nano", api_key=None, embedding_backend="local", query_cache_size=1024,
+                 answer_cache_threshold=0.92, answer_cache_ttl=7 * 24 * 3600, answer_cache_size=1000,
+                 resources=None):
+        """
+        Initialise le système RAG pour Jean Piaget en chargeant les données prétraitées.
+        
+        Args:
+            model_name: Modèle OpenAI utilisé pour générer les réponses
+            api_key: Clé API OpenAI (par défaut la variable d'environnement OPENAI_API_KEY)
+            embedding_backend, query_cache_size, answer_cache_threshold, answer_cache_ttl,
+                answer_cache_size: Voir PiagetResources (ignorés si `resources` est fourni)
+            resources: Ressources partagées (PiagetResources) ; seul le client LLM est
+                alors propre à cette instance
+        
+        Les données sont chargées à la première question (voir PiagetResources) et le
+        client LLM à la première génération.
+        """
+        if resources is None:
+            resources = PiagetResources(embedding_backend, api_key, query_cache_size=query_cache_size,
+                                        answer_cache_threshold=answer_cache_threshold,
+                                        answer_cache_ttl=answer_cache_ttl, answer_cache_size=answer_cache_size)
+        self.resources = resources
+        self._llm = None
+        
+        # Stocker le nom du modèle pour référence
+        self.model_name = model_name
+        self.set_api_key(api_key)
+        self._prompt_template = None
     
-    def _create_prompt_template(self) -> ChatPromptTemplate:
+    def __getattr__(self, name):
+        # Index, documents, encodeur et caches sont lus dans les ressources partagées
+        if name in ('resources', '_llm', '_prompt_template'):
+            raise AttributeError(name)
+        return getattr(self.resources, name)
+    
+    @property
+    def llm(self):
+        """Client LLM, créé au premier usage."""
+        if self._llm is None:
+            start = time.perf_counter()
+            from langchain_openai import ChatOpenAI
+            # Initialisation du LLM avec le modèle spécifié
+            self._llm = ChatOpenAI(
+                model_name=self.model_name,
+                temperature=0.3,
+                openai_api_key=self.api_key
+            )
+            self.client_init_time = time.perf_counter() - start
+        return self._llm
+    
+    @llm.setter
+    def llm(self, llm):
+        self._llm = llm
+    
+    @property
+    def prompt_template(self):
+        """Template du prompt, créé au premier usage."""
+        if self._prompt_template is None:
+            self._prompt_template = self._create_prompt_template()
+        return self._prompt_template
+    
+    def ready(self) -> bool:
+        """Indique, sans bloquer, si les ressources partagées sont chargées."""
+        return self.resources.ready()
+    
+    def startup_report(self) -> Dict[str, float]:
+        """Durées (en secondes) du démarrage : import du module, imports différés,
+        index, magasin de documents, encodeur et client LLM."""
+        times = dict(self.resources.startup_times)
+        if 'client_init_time' in self.__dict__:
+            times['client'] = self.client_init_time
+        return times
+    
+    def set_api_key(self, api_key):
+        """Change la clé API de cette instance (le client LLM est recréé, pas les ressources)."""
+        # Vérifier si une clé API a été fournie
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        
+        # Vérifier que la clé API est définie
+        if not self.api_key:
+            print("Avertissement: Aucune clé API OpenAI n'a été fournie.")
+            print("Certaines fonctionnalités peuvent ne pas fonctionner correctement.")
+        self.set_model(self.model_name)
+    
+    def set_model(self, model_name):
+        """Change le modèle LLM de cette instance sans recharger les ressources."""
+        self.model_name = model_name
+        # Le client est recréé à la prochaine génération
+        self._llm = None
+    
+    def _create_prompt_template(self) -> "ChatPromptTemplate":
         """Crée le template de prompt pour le LLM."""
         template = """
         Tu es Jean Piaget, célèbre psychologue, biologiste et épistémologue suisse. 
@@ -170,9 +539,45 @@ class PiagetRAG:
         Réponse (en tant que Jean Piaget):
         """
         
+        from langchain.prompts import ChatPromptTemplate
         return ChatPromptTemplate.from_template(template)
     
-    def search(self, query: str, k: int = 8, similarity_threshold: float = 0.6) -> List[Document]:
+    def warm_up(self, queries: List[str]):
+        """Encode en un seul appel les requêtes absentes du cache (questions suggérées, par exemple)."""
+        if queries:
+            self.query_cache.encode(self.embedding_model, queries)
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Compteurs des caches des embeddings de requêtes et des réponses."""
+        stats = {'queries': self.query_cache.stats()}
+        if self.answer_cache is not None:
+            stats['answers'] = self.answer_cache.stats()
+        return stats
+    
+    def invalidate_answers(self, model_name: str = None) -> int:
+        """Supprime les réponses en cache d'un modèle (par défaut le modèle courant)."""
+        if self.answer_cache is None:
+            return 0
+        return self.answer_cache.invalidate(model_name or self.model_name)
+    
+    def _answer_cache_key(self, question: str, results, context_chars: int):
+        """Embedding de la question et empreinte des passages retrouvés, ou None si la
+        réponse ne peut pas être mise en cache (cache désactivé, encodeur de secours)."""
+        if self.answer_cache is None or not getattr(self.embedding_model, 'cacheable', True):
+            return None
+        try:
+            # Déjà calculé par search : lu dans le cache des requêtes
+            question_vector = self.query_cache.encode(self.embedding_model, [question])[0]
+        except Exception:
+            return None
+        # Ancien format pickle sans 'chunk_id' : le chunk est identifié par son texte
+        chunk_ids = [doc.metadata['chunk_id'] if 'chunk_id' in doc.metadata
+                     else hashlib.sha1(doc.page_content.encode('utf-8')).hexdigest()
+                     for doc, _ in results]
+        return question_vector, evidence_key(chunk_ids, context_chars, self.build_id)
+    
+    def search(self, query: str, k: int = 8, similarity_threshold: float = 0.6,
+               nprobe: int = None, ef_search: int = None) -> List["Document"]:
         """
         Recherche les documents les plus pertinents pour une requête donnée.
         
@@ -180,51 +585,93 @@ class PiagetRAG:
             query: La requête de recherche
             k: Nombre maximum de documents à retourner
             similarity_threshold: Seuil de similarité minimum pour filtrer les résultats
+            nprobe: Nombre de listes visitées pour un index IVF (par défaut celui du manifeste)
+            ef_search: Largeur de recherche pour un index HNSW (par défaut celle du manifeste)
             
         Returns:
             Liste de tuples (document, score de similarité)
         """
+        # Les erreurs de chargement ne doivent pas être masquées par les solutions de secours
+        if not self.resources.ready():
+            self.resources.wait()
         print(f"\n[DEBUG] Recherche pour la requête: '{query}'")
         print(f"[DEBUG] Paramètres: k={k}, seuil={similarity_threshold}")
         
+        # Méthode sécurisée pour créer l'embedding de la requête
+        try:
+            # Utiliser notre modèle d'embedding (OpenAI ou fallback)
+            print(f"[DEBUG] Création de l'embedding pour la requête: '{query}'")
+            query_embedding = self.query_cache.encode(self.embedding_model, [query])
+        except Exception as e:
+            query_embedding = self._fallback_query_embedding(query, e)
+        return self._search_embedding(query_embedding, k, similarity_threshold, nprobe, ef_search)
+    
+    async def asearch(self, query: str, k: int = 8, similarity_threshold: float = 0.6,
+                      nprobe: int = None, ef_search: int = None) -> List["Document"]:
+        """
+        Version asynchrone de search.
+        
+        L'embedding de la requête est créé de façon asynchrone (API OpenAI) ou dans le
+        pool de threads des ressources (modèle local), de même que la recherche FAISS :
+        la boucle d'événements n'est jamais bloquée par le calcul.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self.resources.search_executor
+        if not self.resources.ready():
+            await loop.run_in_executor(executor, self.resources.wait)
+        print(f"\n[DEBUG] Recherche asynchrone pour la requête: '{query}'")
+        try:
+            query_embedding = await self.query_cache.aencode(self.embedding_model, [query], executor)
+        except Exception as e:
+            query_embedding = self._fallback_query_embedding(query, e)
+        return await loop.run_in_executor(executor, self._search_embedding, query_embedding, k,
+                                          similarity_threshold, nprobe, ef_search)
+    
+    def _fallback_query_embedding(self, query: str, error: Exception) -> np.ndarray:
+        """Embedding de secours quand l'encodeur de requêtes échoue."""
+        print(f"[DEBUG] Erreur lors de la création de l'embedding: {error}")
+        # Fallback: utiliser une méthode alternative
+        # Créer un vecteur aléatoire mais déterministe basé sur le hash de la requête
+        np.random.seed(hash(query) % 2**32)
+        query_embedding = np.random.randn(1, self.index.d)  # Dimension de l'index
+        # Normaliser
+        query_embedding = query_embedding / np.linalg.norm(query_embedding, axis=1, keepdims=True)
+        print(f"[DEBUG] Embedding de secours créé, dimensions: {query_embedding.shape}")
+        return query_embedding
+    
+    def _search_embedding(self, query_embedding, k: int, similarity_threshold: float,
+                          nprobe: int = None, ef_search: int = None) -> List["Document"]:
+        """Recherche FAISS et filtrage des résultats pour un embedding de requête (voir search)."""
         try:
-            # Méthode sécurisée pour créer l'embedding de la requête
-            try:
-                # Utiliser notre modèle d'embedding (OpenAI ou fallback)
-                print(f"[DEBUG] Création de l'embedding pour la requête: '{query}'")
-                query_embedding = self.embedding_model.encode([query])
-                
-                # Vérifier que l'embedding est valide
-                if isinstance(query_embedding, np.ndarray):
-                    print(f"[DEBUG] Embedding créé avec succès, dimensions: {query_embedding.shape}")
-                else:
-                    # Convertir en numpy array si ce n'est pas déjà le cas
-                    query_embedding = np.array(query_embedding, dtype=np.float32)
-                    print(f"[DEBUG] Embedding converti en numpy array, dimensions: {query_embedding.shape}")
-            except Exception as e:
-                print(f"[DEBUG] Erreur lors de la création de l'embedding: {e}")
-                # Fallback: utiliser une méthode alternative
-                import numpy as np
-                # Créer un vecteur aléatoire mais déterministe basé sur le hash de la requête
-                np.random.seed(hash(query) % 2**32)
-                query_embedding = np.random.randn(1, 1536)  # Dimension pour OpenAI embeddings
-                # Normaliser
-                query_embedding = query_embedding / np.linalg.norm(query_embedding, axis=1, keepdims=True)
-                print(f"[DEBUG] Embedding de secours créé, dimensions: {query_embedding.shape}")
-            
             # Normalisation (s'assurer que c'est un tableau numpy)
             query_embedding = np.array(query_embedding, dtype=np.float32)
+            # Import tardif (déjà chargé par PiagetResources)
+            import faiss
+            from vector_index import rescore_candidates, search_parameters
             faiss.normalize_L2(query_embedding)
             
             # Recherche d'un nombre plus élevé de documents pour pouvoir filtrer ensuite
             # Nous cherchons k*3 documents pour avoir une large marge de filtrage
             search_k = min(k * 3, self.index.ntotal)  # Éviter de demander plus que le nombre total de documents
             print(f"[DEBUG] Recherche des {search_k} documents les plus proches")
-            scores, indices = self.index.search(query_embedding, search_k)
+            # Paramètres propres à cet appel : l'index partagé (sessions, threads) n'est pas modifié
+            default_params = self.index_manifest.get('search_params', {})
+            params = search_parameters(
+                self.index,
+                nprobe=nprobe if nprobe is not None else default_params.get('nprobe'),
+                ef_search=ef_search if ef_search is not None else default_params.get('ef_search')
+            )
+            if self.rescore_vectors is not None:
+                # Index quantifié : sur-échantillonner puis re-noter exactement en float32
+                candidates_k = min(search_k * self.index_manifest.get('rescore_factor', 2), self.index.ntotal)
+                _, candidates = self.index.search(query_embedding, candidates_k, params=params)
+                top_scores, top_indices = rescore_candidates(self.rescore_vectors, query_embedding[0], candidates[0], search_k)
+                scores, indices = top_scores[np.newaxis, :], top_indices[np.newaxis, :]
+            else:
+                scores, indices = self.index.search(query_embedding, search_k, params=params)
         except Exception as e:
             print(f"[DEBUG] Erreur critique lors de la recherche: {e}")
             # Récupération d'urgence: sélectionner des documents aléatoires
-            import numpy as np
             import random
             print("[DEBUG] Sélection de documents aléatoires comme solution de secours")
             
@@ -233,77 +680,125 @@ class PiagetRAG:
             indices = np.array([random_indices])
             scores = np.array([[0.5] * len(random_indices)])  # Scores fictifs
         
-        # Récupération des documents avec filtrage par score de similarité
-        results = []
-        print(f"[DEBUG] Scores et similarités des documents trouvés:")
-        
-        # Ensemble pour suivre les titres uniques (pour éviter la redondance)
-        unique_titles = set()
-        
-        for i, idx in enumerate(indices[0]):
-            if idx != -1:  # FAISS peut retourner -1 si moins de résultats sont trouvés
-                score = scores[0][i]
-                # Convertir le score FAISS (distance L2 normalisée) en similarité cosinus
-                # Pour FAISS normalisé, similarité = 1 - distance^2/2
-                similarity = 1 - (score ** 2) / 2
-                
-                doc = self.documents[idx]
-                title = doc.metadata['title']
-                
-                # Afficher les informations de débogage
-                if i < 15:  # Afficher plus de résultats pour le débogage
-                    print(f"[DEBUG] Doc {i+1}: score={score:.4f}, similarité={similarity:.4f}, titre='{title}', date={doc.metadata['date']}")
-                
-                # Ne garder que les documents avec une similarité suffisante
-                # et éviter trop de documents avec le même titre (max 2 par titre)
-                if similarity >= similarity_threshold:
-                    # Vérifier si nous avons déjà 2 documents avec ce titre
-                    if title in unique_titles and sum(1 for d, _ in results if d.metadata['title'] == title) >= 2:
-                        continue
-                    
-                    # Ajouter le document uniquement basé sur sa similarité
-                    results.append((doc, similarity))
-                    unique_titles.add(title)
-                    
-                    # Limiter le nombre total de documents à k
-                    if len(results) >= k:
-                        break
-        
-        # Trier les résultats par score de similarité décroissant
-        results.sort(key=lambda x: x[1], reverse=True)
-        
-        print(f"[DEBUG] Nombre de documents retenus après filtrage: {len(results)}")
-        
-        # Afficher les titres des documents retenus
-        print("[DEBUG] Documents retenus:")
-        for i, (doc, similarity) in enumerate(results):
-            print(f"[DEBUG] {i+1}. '{doc.metadata['title']}' ({doc.metadata['date']}) - Similarité: {similarity:.4f}")
-        
+        # Filtrage sur les tableaux de scores : seuil de similarité, au plus 2 documents
+        # par titre (pour éviter la redondance) et k documents au total. Les Document ne
+        # sont créés que pour les candidats retenus
+        from vector_index import select_diverse
+        indices = np.asarray(indices[0])
+        scores = np.asarray(scores[0], dtype=np.float32)
+        valid = indices != -1  # FAISS peut retourner -1 si moins de résultats sont trouvés
+        indices, scores = indices[valid], scores[valid]
+        # Convertir le score FAISS (distance L2 normalisée) en similarité cosinus
+        # Pour FAISS normalisé, similarité = 1 - distance^2/2
+        similarities = 1 - (scores ** 2) / 2
+        selected = select_diverse(similarities, self.resources.title_ids(indices), similarity_threshold, k)
+        results = [(self.documents[int(indices[i])], float(similarities[i])) for i in selected]
+        
+        print(f"[DEBUG] {len(results)} documents retenus sur {len(indices)} candidats")
         return results
     
-    def answer_question(self, question: str, k: int = 8) -> str:
+    def answer_question(self, question: str, k: int = 8, context_chars: int = 0) -> str:
         """
         Répond à une question en utilisant le RAG.
         
         Args:
             question: La question posée
             k: Nombre maximum de documents à utiliser (par défaut: 8)
+            context_chars: Texte voisin (environ, de part et d'autre) ajouté au CONTEXTE COMPLET
+                de chaque source, lu dans le magasin de documents (0 = chunk seul)
             
         Returns:
             Réponse à la question
         """
         print(f"\n[DEBUG] Traitement de la question: '{question}'")
         
-        # Abaisser le seuil de similarité pour obtenir plus de documents
-        similarity_threshold = 0.5  # Réduit de 0.6 à 0.5 pour être moins sélectif
-        print(f"[DEBUG] Seuil de similarité ajusté à {similarity_threshold}")
-        
         # Recherche des documents pertinents avec un seuil de similarité
-        results = self.search(question, k=k, similarity_threshold=similarity_threshold)
+        results = self.search(question, k=k, similarity_threshold=ANSWER_SIMILARITY_THRESHOLD)
         
         if not results:
-            return "Je ne trouve pas d'information pertinente dans mes écrits pour répondre à cette question."
+            return NO_RESULTS_ANSWER
+        
+        cache_key, cached_answer = self._lookup_answer(question, results, context_chars)
+        if cached_answer is not None:
+            return cached_answer
         
+        prompt = self._build_prompt(question, results, context_chars)
+        print("[DEBUG] Envoi du prompt au modèle LLM...")
+        
+        # Génération de la réponse
+        response = self.llm.invoke(prompt)
+        return self._finish_answer(response.content, cache_key)
+    
+    async def aanswer_question(self, question: str, k: int = 8, context_chars: int = 0) -> str:
+        """
+        Version asynchrone de answer_question (voir asearch), avec appel du LLM par ainvoke.
+        
+        Un même processus peut traiter de nombreuses questions simultanées sans
+        mobiliser un thread par question pendant la génération.
+        """
+        print(f"\n[DEBUG] Traitement asynchrone de la question: '{question}'")
+        results = await self.asearch(question, k=k, similarity_threshold=ANSWER_SIMILARITY_THRESHOLD)
+        if not results:
+            return NO_RESULTS_ANSWER
+        
+        # Le cache des réponses est une base SQLite : consulté hors de la boucle d'événements
+        loop = asyncio.get_running_loop()
+        cache_key, cached_answer = await loop.run_in_executor(
+            self.resources.search_executor, self._lookup_answer, question, results, context_chars
+        )
+        if cached_answer is not None:
+            return cached_answer
+        
+        prompt = self._build_prompt(question, results, context_chars)
+        print("[DEBUG] Envoi asynchrone du prompt au modèle LLM...")
+        response = await self.llm.ainvoke(prompt)
+        if cache_key is None:
+            return self._finish_answer(response.content, None)
+        return await loop.run_in_executor(self.resources.search_executor, self._finish_answer,
+                                          response.content, cache_key)
+    
+    def stream_answer(self, question: str, k: int = 8, context_chars: int = 0) -> AnswerStream:
+        """
+        Version de answer_question qui transmet la réponse au fur et à mesure de sa génération.
+        
+        La recherche est faite immédiatement ; le LLM (appelé par stream) n'est
+        interrogé qu'au début de l'itération.
+        
+        Args:
+            question: La question posée
+            k: Nombre maximum de documents à utiliser (par défaut: 8)
+            context_chars: Texte voisin ajouté au contexte de chaque source (voir answer_question)
+            
+        Returns:
+            AnswerStream dont l'itération produit le texte de la section RÉPONSE ; la
+            réponse complète et les sources structurées sont disponibles à la fin
+        """
+        print(f"\n[DEBUG] Traitement en flux de la question: '{question}'")
+        results = self.search(question, k=k, similarity_threshold=ANSWER_SIMILARITY_THRESHOLD)
+        if not results:
+            return AnswerStream([NO_RESULTS_ANSWER])
+        
+        cache_key, cached_answer = self._lookup_answer(question, results, context_chars)
+        if cached_answer is not None:
+            return AnswerStream([cached_answer])
+        
+        prompt = self._build_prompt(question, results, context_chars)
+        print("[DEBUG] Envoi du prompt au modèle LLM (réponse en flux)...")
+        chunks = (chunk.content for chunk in self.llm.stream(prompt))
+        return AnswerStream(chunks, on_complete=lambda text: self._finish_answer(text, cache_key))
+    
+    def _lookup_answer(self, question: str, results, context_chars: int):
+        """Clé du cache des réponses (voir _answer_cache_key) et réponse en cache éventuelle."""
+        cache_key = self._answer_cache_key(question, results, context_chars)
+        if cache_key is not None:
+            cached_answer = self.answer_cache.get(cache_key[0], self.model_name, cache_key[1])
+            if cached_answer is not None:
+                print("[DEBUG] Réponse trouvée dans le cache des réponses")
+                return cache_key, cached_answer
+        return cache_key, None
+    
+    def _build_prompt(self, question: str, results, context_chars: int = 0) -> str:
+        """Construit le prompt à partir des passages retrouvés."""
         # Préparation du contexte avec une structure claire pour faciliter l'extraction des citations
         context_parts = []
         
@@ -330,13 +825,22 @@ class PiagetRAG:
             else:
                 content_extract = content
                 
+            # Autres éditions contenant le même passage (chunks dédoublonnés)
+            editions = "".join(
+                f"\nAUTRE ÉDITION: \"{alias['title']}\" ({alias['date']}) - {alias['url']}"
+                for alias in doc.metadata.get('aliases', [])
+            )
+            full_context = content
+            # Seul le magasin colonnaire (DocumentStore) donne accès au texte voisin
+            if context_chars and hasattr(self.documents, 'context') and 'chunk_id' in doc.metadata:
+                full_context = self.documents.context(doc.metadata['chunk_id'], context_chars, context_chars).strip()
             source_block = f"""### SOURCE: \"{title}\" ({date})
-URL: {url}
+URL: {url}{editions}
 TEXTE:
 \"{content_extract}\"
 
 CONTEXTE COMPLET:
-{content}"""
+{full_context}"""
             
             context_parts.append(source_block)
         
@@ -347,15 +851,11 @@ CONTEXTE COMPLET:
         print(f"[DEBUG] Taille du contexte: {len(context)} caractères")
         
         # Préparation du prompt
-        prompt = self.prompt_template.format(context=context, question=question)
-        
-        print("[DEBUG] Envoi du prompt au modèle LLM...")
-        
-        # Génération de la réponse
-        response = self.llm.invoke(prompt)
-        
+        return self.prompt_template.format(context=context, question=question)
+    
+    def _finish_answer(self, response_text: str, cache_key) -> str:
+        """Analyse la réponse du LLM et la met en cache."""
         # Analyser la réponse pour voir combien de citations elle contient
-        response_text = response.content
         print("\n[DEBUG] Réponse reçue du modèle")
         
         # Compter le nombre de citations (texte entre guillemets)
@@ -373,6 +873,8 @@ CONTEXTE COMPLET:
         else:
             print("[DEBUG] Aucune section SOURCES détectée dans la réponse!")
         
+        if cache_key is not None:
+            self.answer_cache.put(cache_key[0], self.model_name, cache_key[1], response_text)
         return response_text
 
 def format_response(response_text):
@@ -454,10 +956,25 @@ def format_response(response_text):
         # Si aucune extraction n'est possible, retourner la réponse telle quelle
         return response_text
 
+# Durée de l'import du module, sans les dépendances lourdes importées plus tard
+MODULE_IMPORT_TIME = time.perf_counter() - _IMPORT_START
+
+def format_startup_report(times: Dict[str, float]) -> str:
+    """Met en forme la décomposition du temps de démarrage (voir PiagetRAG.startup_report)."""
+    labels = [('module_import', "import du module"), ('import', "imports différés (faiss, langchain)"),
+              ('index', "index FAISS"), ('store', "magasin de documents"), ('embedder', "encodeur et caches"),
+              ('client', "client LLM"), ('total_load', "chargement complet")]
+    return "\n".join(f"- {label}: {times[key]:.3f} s" for key, label in labels if key in times)
+
 def main():
-    # Initialisation du RAG
+    try:
+        check_preprocessed_files()
+    except FileNotFoundError as e:
+        print(f"Erreur: {e}")
+        exit(1)
+    # Initialisation du RAG : les données se chargent pendant la saisie de la première question
     print("Initialisation du système RAG pour Jean Piaget...")
-    piaget_rag = PiagetRAG()
+    piaget_rag = PiagetRAG(resources=PiagetResources(background=True))
     
     print("\nBienvenue dans l'avatar de Jean Piaget!")
     print("Posez vos questions à Jean Piaget, et il vous répondra en se basant sur ses écrits.")
@@ -474,9 +991,19 @@ def main():
             continue
         
         print("\nJean Piaget réfléchit...")
-        raw_answer = piaget_rag.answer_question(question)
-        formatted_answer = format_response(raw_answer)
-        print(f"\n{formatted_answer}")
+        first_answer = 'client_init_time' not in piaget_rag.__dict__
+        stream = piaget_rag.stream_answer(question)
+        print()
+        for token in stream:
+            print(token, end="", flush=True)
+        if stream.sources_text:
+            print(f"\n\n{'='*50}\n\n{stream.sources_text}")
+        else:
+            print()
+        if first_answer:
+            print(f"\nTemps de démarrage:\n{format_startup_report(piaget_rag.startup_report())}")
+        if stream.first_token_time is not None:
+            print(f"Premier texte affiché après {stream.first_token_time:.2f} s")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,271 @@
+import asyncio
+import functools
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+# Cache partagé par tous les processus, indépendant des constructions de l'index
+CACHE_DIR = "data/cache"
+QUERY_CACHE_FILENAME = "query_embeddings.sqlite"
+ANSWER_CACHE_FILENAME = "answers.sqlite"
+
+_SPACES = re.compile(r'\s+')
+
+def normalize_query(text: str) -> str:
+    """Forme normalisée d'une requête : Unicode NFC, minuscules, espaces réduits."""
+    return _SPACES.sub(' ', unicodedata.normalize('NFC', text)).strip().lower()
+
+class QueryEmbeddingCache:
+    """Cache à deux niveaux des embeddings de requêtes, indexé par (modèle, requête normalisée).
+
+    Le premier niveau est un LRU en mémoire borné à `max_entries` vecteurs ; le
+    second est une base SQLite (mode WAL) partagée par tous les processus et
+    conservée d'une exécution à l'autre. Une requête trouvée sur disque est remontée
+    dans le LRU. Les compteurs `memory_hits`, `disk_hits` et `misses` mesurent
+    l'efficacité du cache (voir `stats`)."""
+
+    def __init__(self, path: Optional[str], model_name: str, max_entries: int = 1024):
+        self.path = path
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.memory = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.connection = None
+        if path is not None:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            # Partagée entre les threads (Streamlit) et, via WAL, entre les processus
+            self.connection = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "model TEXT NOT NULL, query_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, query_hash))"
+            )
+            self.connection.commit()
+
+    @staticmethod
+    def _key(query: str) -> str:
+        return hashlib.sha1(normalize_query(query).encode('utf-8')).hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def get_many(self, queries: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Retourne les vecteurs en cache, par requête."""
+        found, disk_keys = {}, {}
+        with self._lock:
+            for query in queries:
+                key = self._key(query)
+                if key in self.memory:
+                    self.memory.move_to_end(key)
+                    found[query] = self.memory[key]
+                    self.memory_hits += 1
+                else:
+                    disk_keys.setdefault(key, []).append(query)
+            if disk_keys and self.connection is not None:
+                keys = list(disk_keys)
+                # SQLite limite le nombre de paramètres par requête
+                for i in range(0, len(keys), 500):
+                    batch = keys[i:i+500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self.connection.execute(
+                        f"SELECT query_hash, vector FROM query_embeddings WHERE model = ? AND query_hash IN ({placeholders})",
+                        [self.model_name, *batch]
+                    )
+                    for key, vector in rows:
+                        vector = np.frombuffer(vector, dtype=np.float32)
+                        self._remember(key, vector)
+                        for query in disk_keys.pop(key):
+                            found[query] = vector
+                            self.disk_hits += 1
+            self.misses += sum(len(pending) for pending in disk_keys.values())
+        return found
+
+    def put_many(self, queries: Sequence[str], vectors: np.ndarray):
+        """Enregistre les vecteurs calculés pour les requêtes données."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        keys = [self._key(query) for query in queries]
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._remember(key, vector.copy())
+            if self.connection is not None:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO query_embeddings (model, query_hash, vector) VALUES (?, ?, ?)",
+                    ((self.model_name, key, vector.tobytes()) for key, vector in zip(keys, vectors))
+                )
+                self.connection.commit()
+
+    def encode(self, embedder, queries: Sequence[str]) -> np.ndarray:
+        """Encode les requêtes, en n'appelant l'encodeur que pour celles absentes du cache.
+
+        Les requêtes manquantes sont encodées en un seul appel. Les encodeurs de
+        secours (attribut `cacheable` faux) ne sont jamais mis en cache."""
+        queries = list(queries)
+        if not getattr(embedder, 'cacheable', True):
+            return np.asarray(embedder.encode(queries), dtype=np.float32)
+        found = self.get_many(queries)
+        missing = list(dict.fromkeys(query for query in queries if query not in found))
+        if missing:
+            vectors = np.asarray(embedder.encode(missing, fallback=False), dtype=np.float32)
+            self.put_many(missing, vectors)
+            found.update(zip(missing, vectors))
+        return np.stack([found[query] for query in queries]).astype(np.float32, copy=False)
+
+    async def aencode(self, embedder, queries: Sequence[str], executor: Optional[Executor] = None) -> np.ndarray:
+        """Version asynchrone de encode.
+
+        Les encodeurs asynchrones (méthode `aencode`, API OpenAI) sont attendus
+        directement ; les autres, ainsi que les accès à la base SQLite, sont exécutés
+        dans `executor` pour ne pas bloquer la boucle d'événements."""
+        loop = asyncio.get_running_loop()
+        queries = list(queries)
+
+        async def embed(texts, **kwargs):
+            if hasattr(embedder, 'aencode'):
+                vectors = await embedder.aencode(texts, **kwargs)
+            else:
+                vectors = await loop.run_in_executor(executor, functools.partial(embedder.encode, texts, **kwargs))
+            return np.asarray(vectors, dtype=np.float32)
+
+        if not getattr(embedder, 'cacheable', True):
+            return await embed(queries)
+        found = await loop.run_in_executor(executor, self.get_many, queries)
+        missing = list(dict.fromkeys(query for query in queries if query not in found))
+        if missing:
+            vectors = await embed(missing, fallback=False)
+            await loop.run_in_executor(executor, self.put_many, missing, vectors)
+            found.update(zip(missing, vectors))
+        return np.stack([found[query] for query in queries]).astype(np.float32, copy=False)
+
+    def stats(self) -> Dict[str, float]:
+        """Compteurs de succès (mémoire, disque) et d'échecs, et taux de succès."""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            'memory_entries': len(self.memory)
+        }
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+def evidence_key(chunk_ids: Sequence, context_chars: int = 0, build_id: str = "") -> str:
+    """Empreinte de l'ensemble des chunks retrouvés (et du contexte ajouté) pour une question.
+
+    `build_id` identifie la construction de l'index : les indices de chunks d'une
+    construction à l'autre ne désignent pas les mêmes passages."""
+    parts = sorted(str(chunk_id) for chunk_id in chunk_ids)
+    parts.append(f"context={context_chars}")
+    parts.append(f"build={build_id}")
+    return hashlib.sha1("\x00".join(parts).encode('utf-8')).hexdigest()
+
+class AnswerCache:
+    """Cache sémantique des réponses du LLM pour les questions quasi identiques.
+
+    Chaque entrée associe l'embedding normalisé de la question, le modèle LLM, les
+    chunks retrouvés (voir `evidence_key`) et la réponse. Une nouvelle question
+    réutilise une réponse si elle est posée au même modèle, retrouve exactement
+    les mêmes chunks et si la similarité cosinus des questions atteint `threshold`.
+    Les entrées expirent après `ttl` secondes et, au-delà de `max_entries`, les
+    moins récemment utilisées sont supprimées. La base SQLite est partagée par tous
+    les processus."""
+
+    def __init__(self, path: str, threshold: float = 0.92, ttl: float = 7 * 24 * 3600, max_entries: int = 1000):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "id INTEGER PRIMARY KEY, model TEXT NOT NULL, evidence TEXT NOT NULL, vector BLOB NOT NULL, "
+            "answer TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS answers_lookup ON answers (model, evidence)")
+        self.connection.commit()
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, question_vector: np.ndarray, model_name: str, evidence: str) -> Optional[str]:
+        """Retourne la réponse d'une question assez proche posée avec les mêmes chunks, ou None."""
+        query = self._normalize(question_vector)
+        now = time.time()
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT id, vector, answer FROM answers WHERE model = ? AND evidence = ? AND created_at >= ?",
+                (model_name, evidence, now - self.ttl)
+            ).fetchall()
+            best_id, best_answer, best_similarity = None, None, self.threshold
+            for row_id, vector, answer in rows:
+                similarity = float(np.dot(query, np.frombuffer(vector, dtype=np.float32)))
+                if similarity >= best_similarity:
+                    best_id, best_answer, best_similarity = row_id, answer, similarity
+            if best_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.connection.execute("UPDATE answers SET last_used = ? WHERE id = ?", (now, best_id))
+            self.connection.commit()
+        return best_answer
+
+    def put(self, question_vector: np.ndarray, model_name: str, evidence: str, answer: str):
+        """Enregistre une réponse, puis applique l'expiration et la limite de taille."""
+        now = time.time()
+        with self._lock:
+            self.connection.execute(
+                "INSERT INTO answers (model, evidence, vector, answer, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (model_name, evidence, self._normalize(question_vector).tobytes(), answer, now, now)
+            )
+            self.connection.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl,))
+            self.connection.execute(
+                "DELETE FROM answers WHERE id NOT IN (SELECT id FROM answers ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+            self.connection.commit()
+
+    def invalidate(self, model_name: Optional[str] = None) -> int:
+        """Supprime les réponses d'un modèle (toutes si `model_name` est None) ; retourne leur nombre."""
+        with self._lock:
+            if model_name is None:
+                cursor = self.connection.execute("DELETE FROM answers")
+            else:
+                cursor = self.connection.execute("DELETE FROM answers WHERE model = ?", (model_name,))
+            self.connection.commit()
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, float]:
+        """Compteurs de succès et d'échecs, et nombre d'entrées."""
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries = self.connection.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0, 'entries': entries}
+
+    def close(self):
+        self.connection.close()
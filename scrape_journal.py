@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence
+
+# Champs d'une œuvre dans piaget_data.json
+WORK_FIELDS = ('title', 'date', 'text', 'url')
+
+def hash_content(text: str) -> str:
+    """Empreinte SHA-256 du texte nettoyé d'une œuvre."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class ScrapeJournal:
+    """Journal JSONL des œuvres scrapées, pour reprendre un scraping interrompu.
+
+    Chaque œuvre terminée est ajoutée immédiatement au journal avec son ETag, son
+    Last-Modified et l'empreinte de son texte. Chaque exécution commence par une
+    ligne {"run": n} ; avec `resume`, l'exécution interrompue est poursuivie et
+    les œuvres déjà journalisées pendant celle-ci ne sont plus demandées. Une
+    exécution terminée (journal compacté, voir `compact`) n'est pas reprise : une
+    nouvelle exécution commence, avec un message. Les
+    œuvres des exécutions précédentes servent aux requêtes conditionnelles et à
+    détecter les œuvres modifiées (statut 'added', 'changed' ou 'unchanged').
+
+    Les textes ne sont pas gardés en mémoire : seules les métadonnées de chaque
+    œuvre et la position de sa dernière version dans le journal le sont, et les
+    textes sont relus à la demande (`read_work`). Si `on_work` est fourni, il est
+    appelé avec chaque œuvre retenue pour l'exécution en cours (téléchargée,
+    inchangée ou reprise du journal), ce qui permet de la traiter aussitôt."""
+
+    def __init__(self, path: str, resume: bool = False,
+                 on_work: Optional[Callable[[Dict[str, Any]], Any]] = None):
+        self.path = path
+        self.on_work = on_work
+        self.entries = {}
+        self.statuses = {}
+        self._lock = threading.Lock()
+        last_run = 0
+        last_completed = False
+        if os.path.exists(path):
+            truncated_at = None
+            with open(path, 'rb') as f:
+                offset = 0
+                for line in f:
+                    line_offset, offset = offset, offset + len(line)
+                    if not line.endswith(b"\n"):
+                        # Dernière ligne tronquée par une interruption
+                        truncated_at = line_offset
+                        break
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if 'url' not in record:
+                        last_run = record['run']
+                        last_completed = record.get('completed', False)
+                        self.statuses = {}
+                        continue
+                    if 'text' in record:
+                        self.entries[record['url']] = self._entry_metadata(record, line_offset)
+                    self.statuses[record['url']] = record['status']
+            if truncated_at is not None:
+                # Retirée pour que les prochaines lignes ne la prolongent pas
+                with open(path, 'r+b') as f:
+                    f.truncate(truncated_at)
+        if resume and last_run and not last_completed:
+            self.run = last_run
+            print(f"Reprise de l'exécution {self.run}: {len(self.statuses)} œuvres déjà traitées")
+        else:
+            if resume:
+                print("Aucune exécution interrompue à reprendre : nouvelle exécution")
+            self.run = last_run + 1
+            self.statuses = {}
+            self._append({'run': self.run, 'started_at': time.time()})
+
+    @staticmethod
+    def _entry_metadata(record: Dict[str, Any], offset: int) -> Dict[str, Any]:
+        """Métadonnées d'une œuvre journalisée, sans son texte."""
+        entry = {key: value for key, value in record.items() if key != 'text'}
+        entry['offset'] = offset
+        return entry
+
+    def _append(self, record: Dict[str, Any]) -> int:
+        """Ajoute une ligne au journal et retourne sa position."""
+        with self._lock:
+            with open(self.path, 'ab') as f:
+                offset = f.tell()
+                f.write((json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8'))
+                f.flush()
+        return offset
+
+    def read_work(self, url: str) -> Dict[str, Any]:
+        """Relit dans le journal la dernière version connue d'une œuvre."""
+        with open(self.path, 'rb') as f:
+            f.seek(self.entries[url]['offset'])
+            record = json.loads(f.readline())
+        return {field: record[field] for field in WORK_FIELDS}
+
+    def notify(self, url: str):
+        """Transmet la dernière version connue de l'œuvre à `on_work`."""
+        if self.on_work is not None and url in self.entries:
+            self.on_work(self.read_work(url))
+
+    def done(self, url: str) -> bool:
+        """Indique si l'œuvre a déjà été traitée pendant l'exécution en cours."""
+        return url in self.statuses
+
+    def conditional_headers(self, url: str) -> Optional[Dict[str, str]]:
+        """En-têtes If-None-Match / If-Modified-Since de la dernière version connue de l'œuvre."""
+        entry = self.entries.get(url)
+        if entry is None:
+            return None
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers or None
+
+    def record(self, work: Dict[str, Any], etag: Optional[str] = None, last_modified: Optional[str] = None) -> str:
+        """Journalise une œuvre téléchargée et retourne son statut."""
+        url = work['url']
+        content_hash = hash_content(work['text'])
+        previous = self.entries.get(url)
+        if previous is None:
+            status = 'added'
+        else:
+            status = 'unchanged' if previous.get('content_hash') == content_hash else 'changed'
+        entry = {field: work[field] for field in WORK_FIELDS}
+        entry.update({'etag': etag, 'last_modified': last_modified, 'content_hash': content_hash,
+                      'run': self.run, 'status': status})
+        offset = self._append(entry)
+        with self._lock:
+            self.entries[url] = self._entry_metadata(entry, offset)
+            self.statuses[url] = status
+        if self.on_work is not None:
+            self.on_work({field: work[field] for field in WORK_FIELDS})
+        return status
+
+    def record_not_modified(self, url: str):
+        """Journalise une œuvre inchangée d'après le serveur (réponse 304)."""
+        self._append({'url': url, 'run': self.run, 'status': 'unchanged'})
+        with self._lock:
+            self.statuses[url] = 'unchanged'
+        self.notify(url)
+
+    def iter_works(self, urls: Sequence[str]) -> Iterator[Dict[str, Any]]:
+        """Relit les œuvres connues, dans l'ordre des URL données."""
+        for url in urls:
+            if url in self.entries:
+                yield self.read_work(url)
+
+    def changes(self, urls: Sequence[str]) -> Dict[str, Any]:
+        """Manifeste des œuvres ajoutées, modifiées, inchangées et retirées lors de l'exécution en cours."""
+        current = set(urls)
+        return {
+            'run': self.run,
+            'added': [url for url in urls if self.statuses.get(url) == 'added'],
+            'changed': [url for url in urls if self.statuses.get(url) == 'changed'],
+            'unchanged': sum(1 for url in urls if self.statuses.get(url) == 'unchanged'),
+            'failed': [url for url in urls if url not in self.statuses],
+            'removed': [url for url in self.entries if url not in current],
+            'fingerprint': self.fingerprint(urls)
+        }
+
+    def fingerprint(self, urls: Sequence[str]) -> str:
+        """Empreinte de l'ensemble des œuvres écrites dans piaget_data.json (ordre, métadonnées et textes)."""
+        digest = hashlib.sha256()
+        for url in urls:
+            if url in self.entries:
+                entry = self.entries[url]
+                digest.update(json.dumps([url, entry['title'], entry['date'], entry['content_hash']],
+                                         ensure_ascii=False).encode('utf-8'))
+        return digest.hexdigest()
+
+    def compact(self, urls: Sequence[str]):
+        """Réécrit le journal avec la dernière version de chaque œuvre de la liste, sous
+        l'exécution en cours, marquée comme terminée."""
+        tmp_path = self.path + ".tmp"
+        entries = {}
+        with open(self.path, 'rb') as source, open(tmp_path, 'wb') as f:
+            f.write((json.dumps({'run': self.run, 'started_at': time.time(), 'completed': True}) + "\n").encode('utf-8'))
+            for url in urls:
+                if url in self.entries:
+                    source.seek(self.entries[url]['offset'])
+                    record = json.loads(source.readline())
+                    record['status'] = self.statuses.get(url, 'unchanged')
+                    entries[url] = self._entry_metadata(record, f.tell())
+                    f.write((json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8'))
+        os.replace(tmp_path, self.path)
+        self.entries = entries
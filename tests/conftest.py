@@ -0,0 +1,25 @@
+import hashlib
+import os
+import sys
+
+import numpy as np
+
+# Les modules du projet sont à la racine du dépôt
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+class HashEncoder:
+    """Encodeur de test : vecteur normalisé déterministe dérivé du texte."""
+    model_name = "test-encoder"
+    dimension = 32
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, texts, **kwargs):
+        self.calls += 1
+        vectors = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.md5(text.encode('utf-8')).digest()[:4], 'little')
+            vector = np.random.RandomState(seed).randn(self.dimension)
+            vectors.append(vector / np.linalg.norm(vector))
+        return np.array(vectors, dtype=np.float32)
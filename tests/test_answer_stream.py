@@ -0,0 +1,53 @@
+import pytest
+
+from answer_stream import AnswerSectionParser, AnswerStream, parse_sources
+
+PLAIN = "RÉPONSE\nLa pensée précède le langage.\n\nSOURCES\n1. \"L'enfant pense\" - Le langage et la pensée (1923)"
+MARKDOWN = "**RÉPONSE**\nBla bla\n\n**SOURCES**\n1. \"x\" - T (1950)"
+
+def stream_in_pieces(text, size):
+    """Réponse reçue en fragments de `size` caractères."""
+    stream = AnswerStream([text[i:i + size] for i in range(0, len(text), size)])
+    return "".join(stream), stream
+
+def test_plain_headers():
+    answer, stream = stream_in_pieces(PLAIN, len(PLAIN))
+    assert answer == "La pensée précède le langage."
+    assert stream.sources == [{'title': "Le langage et la pensée", 'date': "1923", 'url': "",
+                               'citation': "L'enfant pense", 'text': ""}]
+    assert stream.text == PLAIN
+
+@pytest.mark.parametrize("text", [
+    MARKDOWN,
+    "## RÉPONSE\nBla bla\n\n## SOURCES\n1. \"x\" - T (1950)",
+    "**RÉPONSE:**\nBla bla\n\n**SOURCES:**\n1. \"x\" - T (1950)",
+])
+def test_markdown_headers(text):
+    answer, stream = stream_in_pieces(text, len(text))
+    assert answer == "Bla bla"
+    assert stream.sources == [{'title': "T", 'date': "1950", 'url': "", 'citation': "x", 'text': ""}]
+    assert stream.sources_text == "SOURCES\n1. \"x\" - T (1950)"
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7])
+@pytest.mark.parametrize("text, expected", [(PLAIN, "La pensée précède le langage."), (MARKDOWN, "Bla bla")])
+def test_header_split_across_chunks(text, expected, size):
+    answer, stream = stream_in_pieces(text, size)
+    assert answer == expected
+    assert stream.sources == stream_in_pieces(text, len(text))[1].sources
+
+def test_partial_header_is_held_back():
+    parser = AnswerSectionParser()
+    assert parser.feed("RÉPONSE\nBla bla\n\n**") == "Bla bla"
+    assert parser.feed("SOUR") == ""
+    assert parser.feed("CES**\n1. \"x\"") == ""
+    assert parser.close() == ""
+    assert parse_sources(parser.sources_text) == [{'title': "", 'date': "", 'url': "", 'citation': "x", 'text': ""}]
+
+def test_markdown_in_answer_is_released():
+    parser = AnswerSectionParser()
+    assert parser.feed("RÉPONSE\nUn point **") == "Un point"
+    assert parser.feed("important** ici") == " **important** ici"
+    assert parser.close() == ""
+
+def test_parse_sources_ignores_header_decoration():
+    assert len(parse_sources("**SOURCES**\n1. \"x\" - T (1950)\n2. \"y\" - U (1960)")) == 2
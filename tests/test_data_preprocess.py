@@ -0,0 +1,149 @@
+import json
+
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from langchain.schema import Document
+
+import data_preprocess
+from conftest import HashEncoder
+from data_preprocess import chunking_settings, hash_work, iter_work_chunks, iter_works
+
+WORKS = [{'title': f"Œuvre {i}", 'date': "1950", 'url': f"https://example.org/{i}",
+          'text': f"Texte de l'œuvre {i}. " * 20} for i in range(3)]
+
+def previous_build(**settings):
+    """Construction précédente fictive : un chunk marqué par œuvre."""
+    documents = [Document(page_content=f"ANCIEN {i}", metadata={'title': work['title']})
+                 for i, work in enumerate(WORKS)]
+    manifest = {**chunking_settings(1000, 200, **settings),
+                'works': [{'hash': hash_work(work), 'start': i, 'end': i + 1} for i, work in enumerate(WORKS)]}
+    return documents, manifest
+
+def chunk_texts(previous_documents, previous_manifest):
+    return [doc.page_content for _, documents in iter_work_chunks(WORKS, 1000, 200, previous_documents, previous_manifest)
+            for doc in documents]
+
+def test_incremental_reuses_compatible_build():
+    assert chunk_texts(*previous_build()) == ["ANCIEN 0", "ANCIEN 1", "ANCIEN 2"]
+
+def test_incremental_ignores_deduplicated_build():
+    texts = chunk_texts(*previous_build(dedup=True, dedup_threshold=0.8))
+    assert texts and not any(text.startswith("ANCIEN") for text in texts)
+
+def test_incremental_ignores_manifest_without_dedup_setting():
+    documents, manifest = previous_build()
+    del manifest['dedup'], manifest['dedup_threshold']
+    assert not any(text.startswith("ANCIEN") for text in chunk_texts(documents, manifest))
+
+def test_reused_sentence_chunks_keep_their_spans(tmp_path):
+    from document_store import DocumentStore, write_document_store
+    previous_dir, output_dir = tmp_path / "previous", tmp_path / "output"
+    chunks = list(iter_work_chunks(WORKS, 200, 50, chunker="sentences"))
+    write_document_store([doc for _, documents in chunks for doc in documents], str(previous_dir))
+    ranges, start = [], 0
+    for work_hash, documents in chunks:
+        ranges.append({'hash': work_hash, 'start': start, 'end': start + len(documents)})
+        start += len(documents)
+    manifest = {**chunking_settings(200, 50, "sentences"), 'works': ranges}
+
+    previous = DocumentStore(str(previous_dir))
+    reused = [doc for _, documents in iter_work_chunks(WORKS, 200, 50, previous, manifest, chunker="sentences")
+              for doc in documents]
+    assert all('start' in doc.metadata and 'work_text' in doc.metadata for doc in reused)
+    write_document_store(reused, str(output_dir))
+    store = DocumentStore(str(output_dir))
+    assert [store.text(i) for i in range(len(store))] == [previous.text(i) for i in range(len(previous))]
+    assert store.regions == previous.regions
+
+STREAM_WORKS = [{'title': "Œuvre [1]", 'date': "1923", 'url': "https://example.org/1", 'text': "Texte, avec ] et [ " * 50},
+                {'title': "Œuvre 2", 'date': None, 'url': "https://example.org/2", 'text': "« Citation » {accolades}"},
+                {'title': "Œuvre 3", 'date': "1950", 'url': "https://example.org/3", 'text': "x" * 5000}]
+
+def write_text(tmp_path, content):
+    path = tmp_path / "works.json"
+    path.write_text(content, encoding='utf-8')
+    return str(path)
+
+@pytest.mark.parametrize("read_size", [1, 2, 7, 64, 1 << 16])
+def test_iter_works_json_array(tmp_path, read_size):
+    # Format de data_scrap.py, et éléments plus longs que read_size
+    path = write_text(tmp_path, json.dumps(STREAM_WORKS, indent=2, ensure_ascii=False))
+    assert list(iter_works(path, read_size)) == STREAM_WORKS
+
+@pytest.mark.parametrize("read_size", [1, 3, 16])
+def test_iter_works_separators_at_chunk_boundaries(tmp_path, read_size):
+    content = "\n" * 40 + "[\n\n  " + " ,\n\t ".join(json.dumps(work) for work in STREAM_WORKS) + " \n ]\n"
+    assert list(iter_works(write_text(tmp_path, content), read_size)) == STREAM_WORKS
+
+@pytest.mark.parametrize("read_size", [1, 16, 1 << 16])
+def test_iter_works_jsonl(tmp_path, read_size):
+    content = "\n".join(json.dumps(work, ensure_ascii=False) for work in STREAM_WORKS) + "\n\n"
+    assert list(iter_works(write_text(tmp_path, content), read_size)) == STREAM_WORKS
+
+@pytest.mark.parametrize("content", ["[]", " [ \n ] ", ""])
+def test_iter_works_empty(tmp_path, content):
+    assert list(iter_works(write_text(tmp_path, content), 1)) == []
+
+def test_iter_works_unterminated_array(tmp_path):
+    with pytest.raises(ValueError):
+        list(iter_works(write_text(tmp_path, json.dumps(STREAM_WORKS)[:-1]), 8))
+
+class CountingModel:
+    """Remplace SentenceTransformer : vecteurs de HashEncoder et textes encodés comptés."""
+    encoded = []
+
+    def __init__(self, model_name):
+        pass
+
+    def get_sentence_embedding_dimension(self):
+        return HashEncoder.dimension
+
+    def encode(self, texts, **kwargs):
+        CountingModel.encoded.extend(texts)
+        return HashEncoder().encode(texts)
+
+def build(output_dir, works, *options):
+    CountingModel.encoded = []
+    args = data_preprocess.build_arg_parser().parse_args(["--workers", "1", "--incremental", *options])
+    documents = data_preprocess.preprocess_works(works, str(output_dir), args)
+    texts = [doc.page_content for doc in documents]
+    if hasattr(documents, 'close'):
+        documents.close()
+    return texts, list(CountingModel.encoded)
+
+@pytest.fixture
+def long_works(monkeypatch):
+    monkeypatch.setattr(data_preprocess, 'SentenceTransformer', CountingModel)
+    return [{'title': f"Œuvre {i}", 'date': "1950", 'url': f"https://example.org/{i}",
+             'text': " ".join(f"Phrase {j} de l'œuvre {i} sur l'équilibration." for j in range(120))}
+            for i in range(3)]
+
+def test_incremental_build_with_unchanged_works_encodes_nothing(tmp_path, long_works):
+    first_texts, first_encoded = build(tmp_path, long_works)
+    assert len(first_texts) > len(long_works)
+    assert sorted(first_encoded) == sorted(set(first_texts))
+
+    texts, encoded = build(tmp_path, long_works)
+    assert texts == first_texts
+    assert encoded == []
+
+    # Seule l'œuvre modifiée est redécoupée et ses nouveaux chunks encodés
+    changed = [long_works[0], {**long_works[1], 'text': long_works[1]['text'] + " Ajout final."}, long_works[2]]
+    texts, encoded = build(tmp_path, changed)
+    assert encoded and all("œuvre 1" in text for text in encoded)
+    assert [text for text in texts if "œuvre 1" not in text] == [text for text in first_texts if "œuvre 1" not in text]
+
+def test_changed_chunking_settings_invalidate_reuse(tmp_path, long_works, monkeypatch):
+    first_texts, _ = build(tmp_path / "build", long_works)
+    monkeypatch.setattr(data_preprocess, 'CHUNK_SIZE', 300)
+    monkeypatch.setattr(data_preprocess, 'CHUNK_OVERLAP', 50)
+    texts, encoded = build(tmp_path / "build", long_works)
+    # Les plages de chunks de l'ancienne construction ne sont pas reprises
+    fresh_texts, _ = build(tmp_path / "fresh", long_works)
+    assert texts == fresh_texts != first_texts
+    assert max(len(text) for text in texts) <= 300
+    assert sorted(encoded) == sorted(set(texts) - set(first_texts))
+    manifest = data_preprocess.load_build_manifest(str(tmp_path / "build"))
+    assert manifest['chunk_size'] == 300
@@ -0,0 +1,61 @@
+import pytest
+
+pytest.importorskip("selenium")
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+import data_scrap
+from data_scrap import DriverPool
+
+class FakeDriver:
+    """Navigateur factice dont `get` lève les erreurs données, puis charge la page."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        self.page_source = "<html><body><article>Texte</article></body></html>"
+        self.quit_count = 0
+
+    def get(self, url):
+        if self.errors:
+            raise self.errors.pop(0)
+
+    def quit(self):
+        self.quit_count += 1
+
+@pytest.fixture
+def launched(monkeypatch):
+    """Navigateurs lancés par le pool ; chacun échoue selon la liste d'erreurs suivante."""
+    drivers = []
+    errors = []
+
+    def create_driver():
+        drivers.append(FakeDriver(errors.pop(0) if errors else []))
+        return drivers[-1]
+    monkeypatch.setattr(data_scrap, "create_driver", create_driver)
+    monkeypatch.setattr(data_scrap, "load_page",
+                        lambda driver, url, wait_selector: (driver.get(url), driver.page_source)[1])
+    return drivers, errors
+
+def test_timeout_retries_with_same_driver(launched):
+    drivers, errors = launched
+    errors.append([TimeoutException("lent")])
+    with DriverPool(1, lazy=True) as pool:
+        assert pool.get_page("https://example.org/a") is not None
+    assert len(drivers) == 1
+
+def test_repeated_timeout_skips_page_and_keeps_driver(launched):
+    drivers, errors = launched
+    errors.append([TimeoutException("lent"), TimeoutException("lent")])
+    with DriverPool(1, lazy=True) as pool:
+        assert pool.get_page("https://example.org/a") is None
+        assert pool.get_page("https://example.org/b") is not None
+    assert len(drivers) == 1
+    assert drivers[0].quit_count == 1
+
+def test_crash_restarts_driver(launched):
+    drivers, errors = launched
+    errors.append([WebDriverException("session perdue")])
+    with DriverPool(1, lazy=True) as pool:
+        assert pool.get_page("https://example.org/a") is not None
+    assert len(drivers) == 2
+    assert drivers[0].quit_count == 1
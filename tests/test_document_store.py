@@ -0,0 +1,41 @@
+from langchain.schema import Document
+
+from document_store import DocumentStore, write_document_store
+from text_chunker import SentenceSpanChunker
+
+TEXT = ("L'enfant construit le réel (voir plus loin.)\n\nLes schèmes s'assimilent. « Ils s'accommodent. »  "
+        "Puis vient l'équilibration, qui est progressive. Le nombre se conserve ! Et l'espace ? "
+        "Les opérations deviennent réversibles. ") * 5
+
+def span_documents(text, title, keep=lambda i: True):
+    metadata = {'title': title, 'date': "1936", 'url': ""}
+    spans = SentenceSpanChunker(120, 40).split_spans(text)
+    return [Document(page_content=text[start:end],
+                     metadata={**metadata, 'start': start, 'end': end, 'work_text': text})
+            for i, (start, end) in enumerate(spans) if keep(i)]
+
+def test_work_text_is_stored_verbatim(tmp_path):
+    # Un chunk sur trois est écarté, comme par le dédoublonnage
+    documents = span_documents(TEXT, "Œuvre A", keep=lambda i: i % 3 != 1) + span_documents(TEXT.upper(), "Œuvre B")
+    write_document_store(documents, str(tmp_path))
+    store = DocumentStore(str(tmp_path))
+    assert len(store) == len(documents)
+    for idx, doc in enumerate(documents):
+        assert store.text(idx) == doc.page_content
+        metadata = store.metadata(idx)
+        assert (metadata['start'], metadata['end']) == (doc.metadata['start'], doc.metadata['end'])
+        assert 'work_text' not in metadata
+    # Le texte voisin est le texte d'origine, y compris celui des chunks écartés
+    size = len(TEXT.encode('utf-8'))
+    assert store.context(0, size, size) == TEXT
+    assert store.context(len(documents) - 1, size, size) == TEXT.upper()
+    store.close()
+
+def test_documents_without_spans(tmp_path):
+    documents = [Document(page_content=f"Chunk {i} éà", metadata={'title': "T", 'date': "1950", 'url': "u"})
+                 for i in range(3)]
+    write_document_store(documents, str(tmp_path))
+    store = DocumentStore(str(tmp_path))
+    assert [store.text(i) for i in range(3)] == [doc.page_content for doc in documents]
+    assert 'start' not in store.metadata(0)
+    store.close()
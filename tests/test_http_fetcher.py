@@ -0,0 +1,81 @@
+import asyncio
+import threading
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+
+from http_fetcher import AsyncFetcher
+
+def run_with_server(handler, scenario):
+    """Lance un serveur HTTP local servant `handler` puis exécute `scenario(base_url)`."""
+    async def run():
+        app = web.Application()
+        app.router.add_get('/{page}', handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            return await scenario(f"http://127.0.0.1:{port}")
+        finally:
+            await runner.cleanup()
+    return asyncio.run(run())
+
+async def page_handler(request):
+    return web.Response(text=f"<article>{request.match_info['page']}</article>", content_type='text/html')
+
+def test_on_result_runs_outside_event_loop():
+    loop_threads = []
+    callback_threads = []
+    # Le premier rappel attend le second : il bloquerait la boucle s'il y était exécuté
+    second_done = threading.Event()
+
+    def on_result(i, page):
+        callback_threads.append(threading.get_ident())
+        if i == 0:
+            assert second_done.wait(timeout=5)
+        else:
+            second_done.set()
+        return page['text']
+
+    async def scenario(base_url):
+        loop_threads.append(threading.get_ident())
+        async with AsyncFetcher(per_host=2, rate=None, retries=0) as fetcher:
+            return await fetcher.fetch_all([f"{base_url}/a", f"{base_url}/b"], on_result=on_result)
+
+    results = run_with_server(page_handler, scenario)
+    assert results == ["<article>a</article>", "<article>b</article>"]
+    assert loop_threads[0] not in callback_threads
+
+def test_slow_consumer_pauses_new_requests_only():
+    served = []
+    released = threading.Event()
+
+    async def counting_handler(request):
+        served.append(request.match_info['page'])
+        return await page_handler(request)
+
+    def on_result(i, page):
+        # Consommateur en retard (file d'ingestion pleine)
+        released.wait(timeout=5)
+        return i
+
+    async def scenario(base_url):
+        async with AsyncFetcher(per_host=2, rate=None, retries=0) as fetcher:
+            task = asyncio.ensure_future(fetcher.fetch_all([f"{base_url}/{i}" for i in range(10)],
+                                                           on_result=on_result, max_pending=3))
+            # La boucle d'événements reste disponible pendant que les rappels bloquent
+            ticks = 0
+            for _ in range(20):
+                await asyncio.sleep(0.01)
+                ticks += 1
+            assert ticks == 20
+            assert len(served) == 3
+            released.set()
+            return await task
+
+    assert run_with_server(counting_handler, scenario) == list(range(10))
+    assert len(served) == 10
@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("selenium")
+
+from ingest import cleanup_builds, commit_build, new_build_dir
+
+def make_build(output_dir, name, content):
+    build_dir = os.path.join(output_dir + ".builds", name)
+    os.makedirs(build_dir)
+    with open(os.path.join(build_dir, "index"), 'w') as f:
+        f.write(content)
+    return build_dir
+
+def read_index(output_dir):
+    with open(os.path.join(output_dir, "index")) as f:
+        return f.read()
+
+def test_commit_swaps_link_and_removes_previous_build(tmp_path):
+    output_dir = str(tmp_path / "processed")
+    first = make_build(output_dir, "1", "v1")
+    commit_build(first, output_dir)
+    second = make_build(output_dir, "2", "v2")
+    commit_build(second, output_dir)
+    assert os.path.islink(output_dir)
+    assert read_index(output_dir) == "v2"
+    assert os.listdir(output_dir + ".builds") == ["2"]
+
+def test_commit_replaces_plain_directory(tmp_path):
+    output_dir = str(tmp_path / "processed")
+    os.makedirs(output_dir)
+    build_dir = new_build_dir(output_dir)
+    os.makedirs(build_dir)
+    commit_build(build_dir, output_dir)
+    assert os.path.realpath(output_dir) == os.path.realpath(build_dir)
+    assert not os.path.exists(output_dir + ".old")
+
+def test_cleanup_restores_interrupted_commit(tmp_path):
+    output_dir = str(tmp_path / "processed")
+    # Interruption entre la mise de côté de l'ancienne construction et la publication du lien
+    os.makedirs(output_dir + ".old")
+    with open(os.path.join(output_dir + ".old", "index"), 'w') as f:
+        f.write("v1")
+    make_build(output_dir, "abandonnee", "v2")
+    cleanup_builds(output_dir)
+    assert read_index(output_dir) == "v1"
+    assert not os.path.exists(output_dir + ".old")
+    assert os.listdir(output_dir + ".builds") == []
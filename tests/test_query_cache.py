@@ -0,0 +1,215 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+import query_cache
+from conftest import HashEncoder
+from query_cache import AnswerCache, QueryEmbeddingCache, evidence_key
+
+MODEL = "gpt-test"
+
+class Clock:
+    """Horloge contrôlée par le test, à la place de time.time dans query_cache."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(query_cache.time, 'time', clock)
+    return clock
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+def rotated(angle):
+    """Vecteur unitaire à `angle` radians du premier axe (similarité cosinus = cos(angle))."""
+    return np.array([np.cos(angle), np.sin(angle), 0.0], dtype=np.float32)
+
+@pytest.fixture
+def answers(tmp_path, clock):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite"), threshold=0.9, ttl=100, max_entries=3)
+    yield cache
+    cache.close()
+
+EVIDENCE = evidence_key([3, 1, 2], build_id="b1")
+
+def test_hit_above_threshold(answers):
+    answers.put(rotated(0.0), MODEL, EVIDENCE, "réponse")
+    # cos(0.3) ≈ 0.955 ≥ 0.9 ; les vecteurs sont normalisés par le cache
+    assert answers.get(3 * rotated(0.3), MODEL, EVIDENCE) == "réponse"
+    assert answers.stats()['hits'] == 1
+
+def test_miss_below_threshold(answers):
+    answers.put(rotated(0.0), MODEL, EVIDENCE, "réponse")
+    # cos(0.6) ≈ 0.825 < 0.9
+    assert answers.get(rotated(0.6), MODEL, EVIDENCE) is None
+    assert answers.stats()['misses'] == 1
+
+def test_miss_when_evidence_or_model_differs(answers):
+    answers.put(rotated(0.0), MODEL, EVIDENCE, "réponse")
+    assert evidence_key([1, 2, 3], build_id="b1") == EVIDENCE
+    assert answers.get(rotated(0.0), MODEL, evidence_key([1, 2, 4], build_id="b1")) is None
+    assert answers.get(rotated(0.0), MODEL, evidence_key([1, 2, 3], build_id="b2")) is None
+    assert answers.get(rotated(0.0), MODEL, evidence_key([1, 2, 3], context_chars=10, build_id="b1")) is None
+    assert answers.get(rotated(0.0), "autre-modele", EVIDENCE) is None
+
+def test_best_match_wins(answers):
+    answers.put(rotated(0.2), MODEL, EVIDENCE, "proche")
+    answers.put(rotated(0.0), MODEL, EVIDENCE, "identique")
+    assert answers.get(rotated(0.0), MODEL, EVIDENCE) == "identique"
+
+def test_ttl_expiry(answers, clock):
+    answers.put(rotated(0.0), MODEL, EVIDENCE, "réponse")
+    clock.now += 99
+    assert answers.get(rotated(0.0), MODEL, EVIDENCE) == "réponse"
+    clock.now += 2
+    assert answers.get(rotated(0.0), MODEL, EVIDENCE) is None
+    # L'entrée expirée est supprimée au prochain enregistrement
+    answers.put(unit(0, 0, 1), MODEL, EVIDENCE, "nouvelle")
+    assert answers.stats()['entries'] == 1
+
+def test_lru_eviction(answers, clock):
+    for i in range(3):
+        answers.put(rotated(i), MODEL, EVIDENCE, f"réponse {i}")
+        clock.now += 1
+    # La réponse 0 est réutilisée : la moins récemment utilisée devient la réponse 1
+    assert answers.get(rotated(0), MODEL, EVIDENCE) == "réponse 0"
+    clock.now += 1
+    answers.put(rotated(3), MODEL, EVIDENCE, "réponse 3")
+    assert answers.stats()['entries'] == 3
+    assert answers.get(rotated(1), MODEL, EVIDENCE) is None
+    assert [answers.get(rotated(i), MODEL, EVIDENCE) for i in (0, 2, 3)] == ["réponse 0", "réponse 2", "réponse 3"]
+
+def test_invalidate(answers):
+    answers.put(rotated(0.0), MODEL, EVIDENCE, "réponse")
+    answers.put(rotated(0.0), "autre-modele", EVIDENCE, "autre")
+    assert answers.invalidate(MODEL) == 1
+    assert answers.get(rotated(0.0), MODEL, EVIDENCE) is None
+    assert answers.get(rotated(0.0), "autre-modele", EVIDENCE) == "autre"
+    assert answers.invalidate() == 1
+    assert answers.stats()['entries'] == 0
+
+def test_shared_between_instances(tmp_path, clock):
+    path = str(tmp_path / "answers.sqlite")
+    first = AnswerCache(path, threshold=0.9)
+    first.put(rotated(0.0), MODEL, EVIDENCE, "réponse")
+    first.close()
+    second = AnswerCache(path, threshold=0.9)
+    assert second.get(rotated(0.0), MODEL, EVIDENCE) == "réponse"
+    second.close()
+
+class RecordingEncoder(HashEncoder):
+    """HashEncoder qui garde les textes encodés à chaque appel."""
+
+    def __init__(self):
+        super().__init__()
+        self.encoded = []
+
+    def encode(self, texts, **kwargs):
+        self.encoded.append(list(texts))
+        return super().encode(texts, **kwargs)
+
+class AsyncEncoder(RecordingEncoder):
+    """Encodeur asynchrone (comme OpenAIEmbeddingWrapper)."""
+
+    async def aencode(self, texts, **kwargs):
+        return self.encode(texts, **kwargs)
+
+@pytest.fixture
+def embeddings_path(tmp_path):
+    return str(tmp_path / "query_embeddings.sqlite")
+
+def test_memory_hit(embeddings_path):
+    cache = QueryEmbeddingCache(embeddings_path, HashEncoder.model_name)
+    encoder = RecordingEncoder()
+    first = cache.encode(encoder, ["Le stade sensori-moteur"])
+    # Même requête normalisée (casse, espaces) : pas de nouvel encodage
+    second = cache.encode(encoder, ["  le stade   SENSORI-MOTEUR "])
+    assert encoder.encoded == [["Le stade sensori-moteur"]]
+    np.testing.assert_array_equal(first, second)
+    assert cache.stats()['memory_hits'] == 1
+    cache.close()
+
+def test_disk_hit_in_new_instance(embeddings_path):
+    first = QueryEmbeddingCache(embeddings_path, HashEncoder.model_name)
+    expected = first.encode(RecordingEncoder(), ["assimilation", "accommodation"])
+    first.close()
+
+    second = QueryEmbeddingCache(embeddings_path, HashEncoder.model_name)
+    encoder = RecordingEncoder()
+    np.testing.assert_array_equal(second.encode(encoder, ["accommodation", "assimilation"]), expected[::-1])
+    assert encoder.encoded == []
+    assert second.stats()['disk_hits'] == 2
+    # Remontée dans le LRU : le second accès est un succès mémoire
+    second.encode(encoder, ["assimilation"])
+    assert second.stats()['memory_hits'] == 1
+    second.close()
+
+def test_other_model_is_a_miss(embeddings_path):
+    first = QueryEmbeddingCache(embeddings_path, HashEncoder.model_name)
+    first.encode(RecordingEncoder(), ["assimilation"])
+    first.close()
+    other = QueryEmbeddingCache(embeddings_path, "autre-modele")
+    encoder = RecordingEncoder()
+    other.encode(encoder, ["assimilation"])
+    assert encoder.encoded == [["assimilation"]]
+    other.close()
+
+def test_memory_eviction_at_size_limit():
+    cache = QueryEmbeddingCache(None, HashEncoder.model_name, max_entries=2)
+    encoder = RecordingEncoder()
+    cache.encode(encoder, ["a", "b"])
+    cache.encode(encoder, ["a"])
+    cache.encode(encoder, ["c"])
+    assert list(cache.memory) == [cache._key("a"), cache._key("c")]
+    # "b", la moins récemment utilisée, a été évincée
+    cache.encode(encoder, ["b"])
+    assert encoder.encoded == [["a", "b"], ["c"], ["b"]]
+
+def test_missing_queries_encoded_once_together():
+    cache = QueryEmbeddingCache(None, HashEncoder.model_name)
+    encoder = RecordingEncoder()
+    cache.encode(encoder, ["a"])
+    vectors = cache.encode(encoder, ["b", "a", "c", "b"])
+    assert encoder.encoded == [["a"], ["b", "c"]]
+    np.testing.assert_array_equal(vectors, HashEncoder().encode(["b", "a", "c", "b"]))
+
+@pytest.mark.parametrize("encoder_class", [RecordingEncoder, AsyncEncoder])
+def test_aencode(embeddings_path, encoder_class):
+    cache = QueryEmbeddingCache(embeddings_path, HashEncoder.model_name)
+    encoder = encoder_class()
+    first = asyncio.run(cache.aencode(encoder, ["a", "b"]))
+    second = asyncio.run(cache.aencode(encoder, ["b", "a"]))
+    assert encoder.encoded == [["a", "b"]]
+    np.testing.assert_array_equal(first, HashEncoder().encode(["a", "b"]))
+    np.testing.assert_array_equal(second, first[::-1])
+    cache.close()
+
+def test_uncacheable_encoder_is_not_cached():
+    class Fallback(RecordingEncoder):
+        cacheable = False
+    cache = QueryEmbeddingCache(None, HashEncoder.model_name)
+    encoder = Fallback()
+    cache.encode(encoder, ["a"])
+    cache.encode(encoder, ["a"])
+    assert encoder.encoded == [["a"], ["a"]]
+    assert cache.stats()['memory_entries'] == 0
+
+def test_stats_counters(embeddings_path):
+    first = QueryEmbeddingCache(embeddings_path, HashEncoder.model_name)
+    first.encode(RecordingEncoder(), ["disque"])
+    first.close()
+    cache = QueryEmbeddingCache(embeddings_path, HashEncoder.model_name)
+    encoder = RecordingEncoder()
+    cache.encode(encoder, ["nouvelle", "disque"])
+    cache.encode(encoder, ["nouvelle", "disque", "autre"])
+    assert cache.stats() == {'memory_hits': 2, 'disk_hits': 1, 'misses': 2, 'hit_rate': 3 / 5,
+                             'memory_entries': 3}
+    cache.close()
@@ -0,0 +1,155 @@
+import asyncio
+import os
+
+import faiss
+import pytest
+from langchain.schema import Document
+
+import piaget_rag_engine
+from conftest import HashEncoder
+from document_store import write_document_store
+from vector_index import write_index_manifest
+
+N_CHUNKS = 200
+
+@pytest.fixture
+def processed_dir(tmp_path, monkeypatch):
+    """Construction minimale (index exact et magasin de documents) encodée avec HashEncoder."""
+    processed = tmp_path / "processed"
+    texts = [f"Passage {i} sur le développement de l'intelligence" for i in range(N_CHUNKS)]
+    write_document_store([Document(page_content=text, metadata={'title': f"Œuvre {i}", 'date': "1950", 'url': ""})
+                          for i, text in enumerate(texts)], str(processed))
+    index = faiss.IndexFlatIP(HashEncoder.dimension)
+    index.add(HashEncoder().encode(texts))
+    index_path = str(processed / "piaget_index.faiss")
+    faiss.write_index(index, index_path)
+    write_index_manifest(index_path, HashEncoder.model_name, HashEncoder.dimension)
+
+    monkeypatch.setattr(piaget_rag_engine, 'PROCESSED_DIR', str(processed))
+    monkeypatch.setattr(piaget_rag_engine, 'INDEX_PATH', index_path)
+    monkeypatch.setattr(piaget_rag_engine, 'CACHE_DIR', str(tmp_path / "cache"))
+    return texts
+
+def test_search_uses_query_encoder(processed_dir, monkeypatch):
+    encoder = HashEncoder()
+    monkeypatch.setattr(piaget_rag_engine, 'create_query_embedder', lambda *args, **kwargs: encoder)
+
+    def no_fallback(self, query, error):
+        raise AssertionError(f"Embedding de secours utilisé: {error!r}")
+    monkeypatch.setattr(piaget_rag_engine.PiagetRAG, '_fallback_query_embedding', no_fallback)
+
+    rag = piaget_rag_engine.PiagetRAG(api_key="test", answer_cache_threshold=None)
+    query = processed_dir[123]
+    results = rag.search(query, k=1, similarity_threshold=0.0)
+    assert encoder.calls == 1
+    assert [doc.metadata['chunk_id'] for doc, _ in results] == [123]
+
+def test_broken_local_encoder_is_an_error(processed_dir, monkeypatch):
+    def broken_encoder(model_name):
+        raise ImportError("No module named 'sentence_transformers'")
+    monkeypatch.setattr(piaget_rag_engine, 'SentenceTransformerEmbedder', broken_encoder)
+
+    resources = piaget_rag_engine.PiagetResources(answer_cache_threshold=None)
+    with pytest.raises(ImportError):
+        resources.load()
+
+def test_simple_backend_is_explicit(processed_dir):
+    resources = piaget_rag_engine.PiagetResources(embedding_backend="simple", answer_cache_threshold=None)
+    resources.load()
+    assert isinstance(resources.embedding_model, piaget_rag_engine.SimpleEmbedder)
+
+class FakeOpenAIEmbeddings:
+    """Client OpenAIEmbeddings factice : chaque texte « t<i> » devient le vecteur [i, 0, 0, 0].
+
+    Les lots asynchrones se terminent dans l'ordre inverse de leur envoi."""
+
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [[float(text[1:]), 0.0, 0.0, 0.0] for text in texts]
+
+    async def aembed_documents(self, texts):
+        position = len(self.batches)
+        vectors = self.embed_documents(texts)
+        await asyncio.sleep(0.01 * (10 - position))
+        return vectors
+
+def estimated_tokens(text):
+    return len(text) // 3 + 1
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_openai_batches_respect_limits_and_order(asynchronous):
+    client = FakeOpenAIEmbeddings()
+    wrapper = piaget_rag_engine.OpenAIEmbeddingWrapper(client, dimension=4, max_batch_size=3, max_batch_tokens=12)
+    # Textes courts (2 tokens estimés) et, un sur quatre, longs (10 tokens estimés)
+    texts = [f"t{i}" + (" " * 25 if i % 4 == 0 else "") for i in range(10)]
+    if asynchronous:
+        vectors = asyncio.run(wrapper.aencode(texts, fallback=False))
+    else:
+        vectors = wrapper.encode(texts, fallback=False)
+
+    assert [text for batch in client.batches for text in batch] == texts
+    assert len(client.batches) > 1
+    for batch in client.batches:
+        assert len(batch) <= 3
+        assert len(batch) == 1 or sum(estimated_tokens(text) for text in batch) <= 12
+    assert vectors.shape == (10, 4)
+    assert vectors[:, 0].tolist() == list(range(10))
+
+def test_openai_errors_propagate_without_fallback():
+    class FailingEmbeddings(FakeOpenAIEmbeddings):
+        def embed_documents(self, texts):
+            raise RuntimeError("quota dépassé")
+    wrapper = piaget_rag_engine.OpenAIEmbeddingWrapper(FailingEmbeddings(), dimension=4)
+    with pytest.raises(RuntimeError):
+        wrapper.encode(["t0"], fallback=False)
+    with pytest.raises(RuntimeError):
+        asyncio.run(wrapper.aencode(["t0"], fallback=False))
+
+class FakeAsyncLLM:
+    """LLM asynchrone factice : répond en citant la question du prompt ; les premiers
+    appels se terminent en dernier."""
+
+    def __init__(self, questions):
+        self.questions = questions
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        delay = 0.05 / self.calls
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(delay)
+        self.in_flight -= 1
+        question = next(question for question in self.questions if question in prompt)
+        return type("Message", (), {'content': f"RÉPONSE\nRéponse à : {question}\n\nSOURCES\n1. \"{question}\""})()
+
+def test_concurrent_aanswer_question(processed_dir, monkeypatch):
+    monkeypatch.setattr(piaget_rag_engine, 'create_query_embedder', lambda *args, **kwargs: HashEncoder())
+    monkeypatch.setattr(piaget_rag_engine, 'ANSWER_SIMILARITY_THRESHOLD', 0.0)
+    questions = [f"Question {i} sur {processed_dir[i * 10]}" for i in range(6)]
+    rag = piaget_rag_engine.PiagetRAG(api_key="test")
+    rag.llm = llm = FakeAsyncLLM(questions)
+
+    async def ask_all():
+        return await asyncio.gather(*(rag.aanswer_question(question, k=3) for question in questions))
+
+    answers = asyncio.run(ask_all())
+    assert [answer.split("\n")[1] for answer in answers] == [f"Réponse à : {question}" for question in questions]
+    assert llm.calls == len(questions)
+    assert llm.max_in_flight > 1
+    stats = rag.cache_stats()
+    assert stats['queries']['misses'] == len(questions)
+    assert stats['queries']['memory_entries'] == len(questions)
+    assert stats['answers']['entries'] == len(questions)
+
+    # Mêmes questions : réponses servies par le cache, sans LLM ni nouvel encodage
+    assert asyncio.run(ask_all()) == answers
+    assert llm.calls == len(questions)
+    stats = rag.cache_stats()
+    assert stats['answers']['hits'] == len(questions)
+    assert stats['queries']['misses'] == len(questions)
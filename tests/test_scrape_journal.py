@@ -0,0 +1,106 @@
+import json
+
+import pytest
+
+from scrape_journal import ScrapeJournal
+
+URLS = [f"https://example.org/piaget/{i}" for i in range(3)]
+
+def work(i, text=None):
+    return {'title': f"Œuvre {i}", 'date': "1950", 'text': text or f"Texte de l'œuvre {i}.", 'url': URLS[i]}
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "journal.jsonl")
+
+def completed_run(path, works):
+    """Exécution complète : toutes les œuvres journalisées puis journal compacté."""
+    journal = ScrapeJournal(path)
+    for i, item in enumerate(works):
+        journal.record(item, etag=f'"etag-{i}"', last_modified="Mon, 01 Jan 2024 00:00:00 GMT")
+    journal.compact([item['url'] for item in works])
+    return journal
+
+def test_resume_after_interruption(path):
+    completed_run(path, [work(0), work(1), work(2)])
+    journal = ScrapeJournal(path)
+    journal.record(work(0, "Texte modifié."))
+    # Interruption au milieu d'une ligne
+    with open(path, 'ab') as f:
+        f.write(b'{"url": "' + URLS[1].encode() + b'", "tit')
+
+    resumed = ScrapeJournal(path, resume=True)
+    assert resumed.run == journal.run == 2
+    assert resumed.done(URLS[0]) and not resumed.done(URLS[1]) and not resumed.done(URLS[2])
+    assert resumed.read_work(URLS[0])['text'] == "Texte modifié."
+    # Les œuvres restantes sont demandées avec les validateurs de l'exécution précédente
+    assert resumed.conditional_headers(URLS[1]) == {'If-None-Match': '"etag-1"',
+                                                    'If-Modified-Since': "Mon, 01 Jan 2024 00:00:00 GMT"}
+    resumed.record(work(1))
+    # La ligne tronquée ne corrompt pas les œuvres journalisées après la reprise
+    assert ScrapeJournal(path, resume=True).done(URLS[1])
+    resumed.record(work(2))
+    assert resumed.changes(URLS)['changed'] == [URLS[0]]
+
+def test_resume_after_completed_run_starts_new_run(path, capsys):
+    completed_run(path, [work(0)])
+    journal = ScrapeJournal(path, resume=True)
+    assert "Aucune exécution interrompue" in capsys.readouterr().out
+    assert journal.run == 2
+    assert not journal.done(URLS[0])
+
+def test_not_modified_keeps_previous_entry(path):
+    completed_run(path, [work(0)])
+    received = []
+    journal = ScrapeJournal(path, on_work=received.append)
+    journal.record_not_modified(URLS[0])
+    assert journal.done(URLS[0])
+    assert journal.read_work(URLS[0]) == work(0)
+    assert journal.conditional_headers(URLS[0])['If-None-Match'] == '"etag-0"'
+    assert received == [work(0)]
+    assert journal.changes([URLS[0]])['unchanged'] == 1
+
+def test_changes_and_fingerprint(path):
+    first = completed_run(path, [work(0), work(1), work(2)])
+    first_fingerprint = first.fingerprint(URLS)
+
+    journal = ScrapeJournal(path)
+    journal.record(work(0))
+    journal.record(work(1, "Nouveau texte."))
+    new_url = "https://example.org/piaget/nouvelle"
+    journal.record({**work(2), 'url': new_url})
+    urls = [URLS[0], URLS[1], new_url, "https://example.org/piaget/echec"]
+    changes = journal.changes(urls)
+    assert changes['run'] == 2
+    assert changes['added'] == [new_url]
+    assert changes['changed'] == [URLS[1]]
+    assert changes['unchanged'] == 1
+    assert changes['failed'] == ["https://example.org/piaget/echec"]
+    assert changes['removed'] == [URLS[2]]
+    assert changes['fingerprint'] == journal.fingerprint(urls)
+
+    # L'empreinte ne dépend que du contenu : identique si rien n'a changé, quel que soit le run
+    assert ScrapeJournal(path).fingerprint(URLS) != first_fingerprint
+    unchanged = ScrapeJournal(str(path) + ".2")
+    for i in range(3):
+        unchanged.record(work(i))
+    assert unchanged.fingerprint(URLS) == first_fingerprint
+    assert unchanged.fingerprint(URLS[::-1]) != first_fingerprint
+
+def test_compact(path):
+    journal = ScrapeJournal(path)
+    for i in range(3):
+        journal.record(work(i))
+    journal.record(work(1, "Deuxième version."))
+    journal.compact(URLS[:2])
+
+    with open(path, encoding='utf-8') as f:
+        lines = [json.loads(line) for line in f]
+    assert lines[0]['run'] == 1 and lines[0]['completed']
+    assert [line['url'] for line in lines[1:]] == URLS[:2]
+    assert journal.read_work(URLS[1])['text'] == "Deuxième version."
+
+    reloaded = ScrapeJournal(path)
+    assert reloaded.run == 2
+    assert list(reloaded.iter_works(URLS)) == [work(0), work(1, "Deuxième version.")]
+    assert reloaded.entries[URLS[1]]['content_hash'] == journal.entries[URLS[1]]['content_hash']
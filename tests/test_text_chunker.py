@@ -0,0 +1,15 @@
+from text_chunker import SentenceSpanChunker
+
+def test_closing_characters_stay_in_sentence():
+    text = ('Il le dit (voir plus loin.) Ensuite « il part. » Puis il dit : "Non." '
+            'Enfin M. Dupont vient. "Début" ici.')
+    sentences = [text[start:end] for start, end in SentenceSpanChunker(40, 10).sentence_spans(text)]
+    assert sentences == ['Il le dit (voir plus loin.)', 'Ensuite « il part. »', 'Puis il dit : "Non."',
+                         'Enfin M. Dupont vient.', '"Début" ici.']
+
+def test_gaps_between_sentences_are_whitespace():
+    text = "Première phrase (entre parenthèses.)\n\nDeuxième « citée. »  Troisième. Quatrième ! Cinquième ?"
+    spans = SentenceSpanChunker(30, 10).sentence_spans(text)
+    gaps = [text[end:next_start] for (_, end), (next_start, _) in zip(spans, spans[1:])]
+    assert all(gap.strip() == "" for gap in gaps)
+    assert spans[-1][1] == len(text)
@@ -0,0 +1,17 @@
+import glob
+import os
+
+import pytest
+
+from text_cleaner import clean_text, load_html_sample, reference_clean_text
+
+# Pages brutes représentatives du site (titres, dates, notes, références finales, Unicode)
+RAW_PAGES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "fixtures", "raw_pages", "*.html")))
+
+def test_fixtures_present():
+    assert RAW_PAGES
+
+@pytest.mark.parametrize("path", RAW_PAGES, ids=os.path.basename)
+def test_clean_text_matches_reference(path):
+    raw_text, title = load_html_sample(path)
+    assert clean_text(raw_text, title) == reference_clean_text(raw_text, title)
@@ -0,0 +1,81 @@
+import os
+import faiss
+import numpy as np
+import pytest
+
+from vector_index import benchmark_index, build_index, load_index, search_parameters, select_diverse
+
+@pytest.fixture(scope="module")
+def embeddings():
+    vectors = np.random.RandomState(0).randn(2000, 32).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+def test_benchmark_keeps_default_search_params(embeddings):
+    ivf = build_index(embeddings, "ivf_flat")
+    hnsw = build_index(embeddings, "hnsw")
+    benchmark_index(ivf, embeddings, "ivf_flat", n_queries=20)
+    benchmark_index(hnsw, embeddings, "hnsw", n_queries=20)
+    assert faiss.extract_index_ivf(ivf).nprobe == 1
+    assert faiss.downcast_index(hnsw).hnsw.efSearch == 16
+
+def test_search_parameters_do_not_modify_index(embeddings):
+    ivf = build_index(embeddings, "ivf_flat")
+    params = search_parameters(ivf, nprobe=ivf.nlist, ef_search=64)
+    assert isinstance(params, faiss.SearchParametersIVF)
+    # Toutes les listes visitées : résultats identiques à la recherche exacte
+    exact = faiss.IndexFlatIP(embeddings.shape[1])
+    exact.add(embeddings)
+    _, expected = exact.search(embeddings[:10], 5)
+    _, found = ivf.search(embeddings[:10], 5, params=params)
+    assert (found == expected).all()
+    assert ivf.nprobe == 1
+    assert isinstance(search_parameters(build_index(embeddings, "hnsw"), ef_search=64), faiss.SearchParametersHNSW)
+    assert search_parameters(exact, nprobe=8, ef_search=64) is None
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/maps"), reason="/proc/self/maps requis")
+@pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "ivf_pq", "hnsw"])
+def test_load_index_mmap(embeddings, tmp_path, index_type):
+    path = str(tmp_path / f"{index_type}.faiss")
+    faiss.write_index(build_index(embeddings, index_type, pq_m=8), path)
+    index = load_index(path, mmap=True)
+    with open("/proc/self/maps") as f:
+        assert path in f.read()
+    _, found = index.search(embeddings[:5], 1, params=search_parameters(index, nprobe=1000))
+    assert index.ntotal == len(embeddings)
+    assert found.shape == (5, 1)
+
+def select_with_loop(similarities, titles, threshold, k, per_title=2):
+    """Sélection historique de _search_embedding (boucle par candidat), sur des positions."""
+    results = []
+    for i, title in enumerate(titles):
+        if similarities[i] >= threshold:
+            if sum(1 for j in results if titles[j] == title) >= per_title:
+                continue
+            results.append(i)
+            if len(results) >= k:
+                break
+    results.sort(key=lambda i: similarities[i], reverse=True)
+    return results
+
+@pytest.mark.parametrize("seed", range(20))
+def test_select_diverse_matches_loop(seed):
+    rng = np.random.RandomState(seed)
+    n = rng.randint(1, 60)
+    # Candidats dans l'ordre de FAISS (similarité décroissante), avec des ex æquo et des titres répétés
+    similarities = np.sort(rng.choice(np.linspace(0, 1, 15), n))[::-1].astype(np.float32)
+    if seed % 4 == 0:
+        # Ordre quelconque (index approchés, rescoring)
+        rng.shuffle(similarities)
+    titles = rng.randint(0, rng.randint(1, 8), n)
+    for threshold in (0.0, 0.5, 0.9, 1.1):
+        for k in (1, 3, 8, 100):
+            for per_title in (1, 2, 3):
+                expected = select_with_loop(similarities, titles, threshold, k, per_title)
+                assert select_diverse(similarities, titles, threshold, k, per_title).tolist() == expected
+
+def test_select_diverse_fewer_candidates_than_k():
+    similarities = np.array([0.9, 0.8, 0.7], dtype=np.float32)
+    assert select_diverse(similarities, np.array([0, 0, 0]), 0.5, 8).tolist() == [0, 1]
+    assert select_diverse(similarities, np.array([0, 1, 2]), 0.75, 8).tolist() == [0, 1]
+    assert select_diverse(similarities[:0], np.array([], dtype=np.int64), 0.0, 8).tolist() == []
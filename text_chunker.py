@@ -0,0 +1,100 @@
+import re
+from typing import Callable, List, Optional, Tuple
+
+# Fin de phrase : ponctuation finale, guillemets et parenthèses fermants (qui appartiennent
+# à la phrase, groupe 'close'), puis espaces et début de phrase plausible
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?…])(?P<close>(?:\s?[»"”)])*)\s+(?=(?:[«"“(\[]\s*)?[A-ZÀ-ÖØ-Þ0-9])')
+LAST_WORD = re.compile(r'(\S+)\s*$')
+
+# Abréviations courantes dans les textes de Piaget, après lesquelles un point ne termine pas la phrase
+ABBREVIATIONS = {
+    "m.", "mm.", "mme.", "mlle.", "dr.", "prof.", "cf.", "p.", "pp.", "etc.", "ex.", "vol.", "éd.", "chap.",
+    "fig.", "n.", "no.", "t.", "op.", "cit.", "ibid.", "id.", "env.", "sq.", "sqq.", "trad.", "av.", "apr.", "j.-c."
+}
+
+class SentenceSpanChunker:
+    """Découpe un texte français en chunks alignés sur les phrases, sans copier le texte.
+
+    Les chunks sont retournés sous forme d'intervalles (début, fin) de caractères
+    dans le texte d'origine. Un chunk regroupe des phrases entières tant qu'il reste
+    sous `chunk_size` caractères (et sous `max_tokens` tokens si un compteur est
+    fourni) ; le chunk suivant reprend les dernières phrases du précédent dans la
+    limite de `chunk_overlap` caractères. Une phrase trop longue est coupée sur un
+    espace."""
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, max_tokens: Optional[int] = None,
+                 token_counter: Optional[Callable[[List[str]], List[int]]] = None):
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap doit être inférieur à chunk_size")
+        if max_tokens is not None and token_counter is None:
+            raise ValueError("max_tokens nécessite un token_counter")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.max_tokens = max_tokens
+        self.token_counter = token_counter
+
+    def sentence_spans(self, text: str) -> List[Tuple[int, int]]:
+        """Intervalles des phrases du texte (avec leurs guillemets et parenthèses fermants,
+        sans les espaces qui les séparent)."""
+        spans = []
+        start = 0
+        for match in SENTENCE_BOUNDARY.finditer(text):
+            # Le point d'une abréviation ou d'une initiale ne termine pas la phrase
+            word = LAST_WORD.search(text, start, match.start())
+            if word:
+                token = word.group(1)
+                if token.lower() in ABBREVIATIONS or (len(token) == 2 and token[0].isupper()):
+                    continue
+            spans.extend(self._split_long(text, start, match.end('close')))
+            start = match.end()
+        spans.extend(self._split_long(text, start, len(text.rstrip())))
+        return [(s, e) for s, e in spans if e > s]
+
+    def _split_long(self, text: str, start: int, end: int) -> List[Tuple[int, int]]:
+        """Coupe sur des espaces une phrase plus longue que chunk_size."""
+        pieces = []
+        while end - start > self.chunk_size:
+            cut = text.rfind(' ', start + 1, start + self.chunk_size + 1)
+            if cut <= start:
+                cut = start + self.chunk_size
+            pieces.append((start, cut))
+            start = cut
+            while start < end and text[start].isspace():
+                start += 1
+        pieces.append((start, end))
+        return pieces
+
+    def split_spans(self, text: str) -> List[Tuple[int, int]]:
+        """Retourne les intervalles (début, fin) des chunks du texte."""
+        sentences = self.sentence_spans(text)
+        if not sentences:
+            return []
+        tokens = None
+        if self.max_tokens is not None:
+            tokens = self.token_counter([text[s:e] for s, e in sentences])
+
+        chunks = []
+        i = 0
+        while i < len(sentences):
+            # Regrouper les phrases tant que le chunk respecte les limites
+            j = i
+            n_tokens = tokens[i] if tokens else 0
+            while j + 1 < len(sentences) and sentences[j + 1][1] - sentences[i][0] <= self.chunk_size:
+                if tokens and n_tokens + tokens[j + 1] > self.max_tokens:
+                    break
+                j += 1
+                n_tokens += tokens[j] if tokens else 0
+            chunk_end = sentences[j][1]
+            chunks.append((sentences[i][0], chunk_end))
+            if j + 1 >= len(sentences):
+                break
+            # Chevauchement : reprendre les dernières phrases dans la limite de chunk_overlap,
+            # à condition que le chunk suivant puisse encore accueillir la phrase suivante
+            next_end = sentences[j + 1][1]
+            k = j + 1
+            while (k - 1 > i and chunk_end - sentences[k - 1][0] <= self.chunk_overlap
+                   and next_end - sentences[k - 1][0] <= self.chunk_size
+                   and (not tokens or sum(tokens[k - 1:j + 2]) <= self.max_tokens)):
+                k -= 1
+            i = k
+        return chunks
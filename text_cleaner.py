@@ -0,0 +1,313 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from bs4 import BeautifulSoup
+
+# Cache des pages HTML brutes écrit par data_scrap.py, pour renettoyer sans rescraper
+RAW_HTML_DIR = os.path.join("data", "raw_html")
+RAW_HTML_INDEX = "index.json"
+
+# Règles de nettoyage, compilées une seule fois
+TAG = re.compile(r'<.*?>')
+CONTROL_CHARS = re.compile(r'[\x00-\x1F\x7F-\x9F]')
+LEADING_DATE = re.compile(r'\(\d{4}\)[a-z]*\s*')
+ISOLATED_LETTER = re.compile(r'\s+[a-z]\s*\.\s*')
+TRAILING_REFERENCES = re.compile(r'\.[a-z]+\.\s*\d{4}\.')
+SPACE_BEFORE_PUNCTUATION = re.compile(r'\s+(?=[.,;:])')
+WHITESPACE = re.compile(r'\s+')
+
+@lru_cache(maxsize=4096)
+def _title_patterns(title):
+    """Motifs (compilés une fois par titre) du titre en tête de texte, avec et sans date."""
+    escaped_title = re.escape(title)
+    return re.compile(escaped_title + r'\s*\(\d{4}\)[a-z]*\s*'), re.compile(escaped_title + r'\s*')
+
+def clean_text(text, title=None):
+    """Nettoye le texte en enlevant les balises HTML, les caractères spéciaux et en normalisant les accents.
+    Si un titre est fourni, il sera également retiré du début du texte.
+
+    Produit exactement le même résultat que reference_clean_text en moins de passes :
+    les motifs sont précompilés, les préfixes (titre, date) sont retirés par une
+    seule découpe, la coupure des références finales remplace une substitution
+    jusqu'à la fin du texte, et les règles d'espaces sont fusionnées (après la
+    suppression des caractères de contrôle, le texte ne contient plus de retours
+    à la ligne et les espaces après la ponctuation sont déjà uniques)."""
+    # Balises HTML, puis normalisation (qui ne doit pas faire apparaître de nouvelles balises à retirer)
+    text = TAG.sub('', text)
+    text = unicodedata.normalize('NFKC', text)
+    text = CONTROL_CHARS.sub('', text)
+    
+    # Titre (avec ou sans date) puis date en début de texte
+    start = 0
+    if title:
+        with_date, bare = _title_patterns(title)
+        match = with_date.match(text)
+        if match:
+            start = match.end()
+        match = bare.match(text, start)
+        if match:
+            start = match.end()
+    match = LEADING_DATE.match(text, start)
+    if match:
+        start = match.end()
+    if start:
+        text = text[start:]
+    
+    # Lettres isolées suivies d'un point
+    text = ISOLATED_LETTER.sub(' ', text)
+    
+    # Références bibliographiques à la fin
+    match = TRAILING_REFERENCES.search(text)
+    if match:
+        text = text[:match.start()]
+    
+    # Espaces avant la ponctuation, puis espaces multiples
+    text = SPACE_BEFORE_PUNCTUATION.sub('', text)
+    return WHITESPACE.sub(' ', text).strip()
+
+def extract_title_and_date(title_text):
+    """Extrait la date et le titre propre d'une chaîne de format "Piaget (1911) Titre de l'œuvre"."""
+    # Supprimer les balises HTML
+    title_text = re.sub(r'<.*?>', '', title_text)
+    
+    # Extraire la date entre parenthèses
+    date_match = re.search(r'\((\d{4})\)', title_text)
+    if date_match:
+        date = date_match.group(1)
+        # Supprimer le numéro (ex: "1.") au début
+        title_text = re.sub(r'^\d+\.\s*', '', title_text)
+        # Supprimer le nom de l'auteur et la date
+        title_text = re.sub(r'^Piaget\s+\(\d{4}\)\s*', '', title_text)
+        title = title_text.strip()
+    else:
+        date = None
+        title = title_text.strip()
+    
+    # Nettoyer le titre
+    title = re.sub(r'\s+', ' ', title).strip()
+    
+    return title, date
+
+def reference_clean_text(text, title=None):
+    """Implémentation historique de clean_text (une passe par règle), conservée comme
+    référence pour la vérification d'équivalence (--check)."""
+    # Supprimer les balises HTML
+    text = re.sub(r'<.*?>', '', text)
+    
+    # Normaliser les accents pour préserver les caractères français
+    text = unicodedata.normalize('NFKC', text)
+    
+    # Supprimer les caractères spéciaux de contrôle
+    text = re.sub(r'[\x00-\x1F\x7F-\x9F]', '', text)
+    
+    # Retirer le titre du texte s'il est présent au début
+    if title:
+        # Échapper les caractères spéciaux dans le titre pour l'utiliser dans une regex
+        escaped_title = re.escape(title)
+        # Retirer le titre avec ou sans la date et autres caractères
+        text = re.sub(r'^' + escaped_title + r'\s*\(\d{4}\)[a-z]*\s*', '', text)
+        text = re.sub(r'^' + escaped_title + r'\s*', '', text)
+    
+    # Supprimer les dates en début de texte (ex: "(1907)a") et les caractères spéciaux
+    text = re.sub(r'^\(\d{4}\)[a-z]*\s*', '', text)
+    
+    # Nettoyer les caractères spéciaux isolés qui pourraient rester
+    text = re.sub(r'\s+[a-z]\s*\.\s*', ' ', text)  # Supprime les lettres isolées suivies d'un point
+    
+    # Supprimer les références bibliographiques à la fin
+    text = re.sub(r'\.[a-z]+\.\s*\d{4}\..*$', '', text)
+    
+    # Nettoyer les espaces et la ponctuation
+    text = text.replace('\n', ' ').replace('\r', '')
+    text = re.sub(r'\s+', ' ', text).strip()
+    
+    # Nettoyer les espaces avant la ponctuation
+    text = re.sub(r'\s+\.', '.', text)
+    text = re.sub(r'\s+,', ',', text)
+    text = re.sub(r'\s+;', ';', text)
+    text = re.sub(r'\s+:', ':', text)
+    
+    # Nettoyer les espaces doubles après ponctuation
+    text = re.sub(r'([.,:;!?])\s+', r'\1 ', text)
+    
+    # Préserver les accents français au lieu de les remplacer
+    # Supprimé: text = text.replace('É', 'E').replace('È', 'E')...
+    
+    return text
+
+def parse_work(work_soup, link_text, work_url):
+    """Extrait le titre, la date et le texte nettoyé d'une page d'œuvre (None si l'article est absent)."""
+    # Récupérer l'article
+    article = work_soup.find('article')
+    if not article:
+        print("Article non trouvé sur la page")
+        return None
+    
+    # Extraire le titre complet de la page et le traiter directement
+    raw_title = work_soup.title.text if work_soup.title else link_text
+    title, date = extract_title_and_date(raw_title)
+    
+    # Extraire le texte brut
+    raw_text = article.get_text(strip=True)
+    
+    # Nettoyer le texte en retirant le titre et en appliquant les autres nettoyages
+    cleaned_text = clean_text(raw_text, title)
+    
+    # Affichage minimal pour le suivi
+    print(f"Œuvre traitée: {title} ({date}) - {len(cleaned_text)} caractères")
+    
+    return {
+        'title': title,
+        'date': date,
+        'text': cleaned_text,
+        'url': work_url
+    }
+
+def raw_html_path(cache_dir, url):
+    """Chemin du fichier du cache HTML brut pour une URL."""
+    return os.path.join(cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + ".html.gz")
+
+def save_raw_html(cache_dir, url, html):
+    """Enregistre la page HTML brute dans le cache."""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = raw_html_path(cache_dir, url)
+    with gzip.open(path + ".tmp", 'wt', encoding='utf-8', compresslevel=3) as f:
+        f.write(html)
+    os.replace(path + ".tmp", path)
+
+def load_raw_html(cache_dir, url):
+    """Lit une page du cache HTML brut (None si elle est absente)."""
+    path = raw_html_path(cache_dir, url)
+    if not os.path.exists(path):
+        return None
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return f.read()
+
+def save_raw_html_index(cache_dir, links):
+    """Enregistre la liste ordonnée des pages du cache : [(url, texte du lien), ...]."""
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, RAW_HTML_INDEX), 'w', encoding='utf-8') as f:
+        json.dump([{'url': url, 'link_text': link_text} for url, link_text in links], f, ensure_ascii=False)
+
+def _extract_cached_work(cache_dir, page):
+    """Extrait l'article brut d'une page du cache : (lien, URL, titre, date, texte brut) ou None."""
+    html = load_raw_html(cache_dir, page['url'])
+    if html is None:
+        return None
+    work_soup = BeautifulSoup(html, 'html.parser')
+    article = work_soup.find('article')
+    if not article:
+        return None
+    raw_title = work_soup.title.text if work_soup.title else page['link_text']
+    title, date = extract_title_and_date(raw_title)
+    return title, date, article.get_text(strip=True), page['url']
+
+def _clean_cached_page(cache_dir, page):
+    """Travail d'un worker : extraction et nettoyage d'une page du cache ; retourne (œuvre, octets de texte brut)."""
+    extracted = _extract_cached_work(cache_dir, page)
+    if extracted is None:
+        return None, 0
+    title, date, raw_text, url = extracted
+    return {'title': title, 'date': date, 'text': clean_text(raw_text, title), 'url': url}, len(raw_text.encode('utf-8'))
+
+def clean_cache(cache_dir=RAW_HTML_DIR, workers=None):
+    """Renettoie toutes les pages du cache HTML brut sur un pool de processus.
+
+    Returns:
+        Les œuvres dans l'ordre de l'index du cache
+    """
+    with open(os.path.join(cache_dir, RAW_HTML_INDEX), 'r', encoding='utf-8') as f:
+        pages = json.load(f)
+    workers = workers or os.cpu_count() or 1
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_clean_cached_page, [cache_dir] * len(pages), pages, chunksize=8))
+    elapsed = time.time() - start_time
+    oeuvres = [oeuvre for oeuvre, _ in results if oeuvre is not None]
+    total_bytes = sum(size for _, size in results)
+    print(f"{len(oeuvres)}/{len(pages)} pages nettoyées sur {workers} processus en {elapsed:.2f} s "
+          f"({total_bytes / 1e6 / max(elapsed, 1e-9):.1f} Mo/s de texte brut, analyse HTML comprise)")
+    return oeuvres
+
+# Textes de contrôle couvrant les cas limites des règles de nettoyage
+CHECK_SAMPLES = [
+    ("Titre (1923)a  Le texte  .  Suite ,et ; fin : ok", "Titre"),
+    ("(1907)a <b>Gras</b>\n\ttexte\r\n avec  a. lettre isolée", None),
+    ("Début ＜i＞ pleine chasse﹤x﹥ \u00a0insécable\u2028ligne . Fin.bibl. 1950. Annexe", None),
+    ("  . , ;  Texte  !  ?   x .y", None),
+    ("Titre Titre (1930) répété", "Titre"),
+    ("", "Titre"),
+]
+
+def load_html_sample(path):
+    """Texte brut de l'article et titre d'une page HTML de contrôle."""
+    with open(path, 'r', encoding='utf-8') as f:
+        work_soup = BeautifulSoup(f.read(), 'html.parser')
+    article = work_soup.find('article') or work_soup.body or work_soup
+    title, _ = extract_title_and_date(work_soup.title.text if work_soup.title else "")
+    return article.get_text(strip=True), title
+
+def check_equivalence(cache_dir=None, html_files=()):
+    """Compare clean_text à reference_clean_text, octet par octet, et mesure leurs débits.
+
+    Les pages de contrôle sont celles du cache HTML brut et/ou les fichiers HTML
+    fournis, plus des textes couvrant les cas limites. Retourne True si tous les
+    résultats sont identiques."""
+    samples = list(CHECK_SAMPLES)
+    if cache_dir:
+        with open(os.path.join(cache_dir, RAW_HTML_INDEX), 'r', encoding='utf-8') as f:
+            for page in json.load(f):
+                extracted = _extract_cached_work(cache_dir, page)
+                if extracted is not None:
+                    samples.append((extracted[2], extracted[0]))
+    samples.extend(load_html_sample(path) for path in html_files)
+    
+    mismatches = 0
+    for text, title in samples:
+        expected = reference_clean_text(text, title).encode('utf-8')
+        actual = clean_text(text, title).encode('utf-8')
+        if actual != expected:
+            mismatches += 1
+            position = next((i for i, (a, b) in enumerate(zip(actual, expected)) if a != b), min(len(actual), len(expected)))
+            print(f"Différence pour '{title}' à l'octet {position}: {actual[position:position + 40]!r} != {expected[position:position + 40]!r}")
+    
+    total_bytes = sum(len(text.encode('utf-8')) for text, _ in samples)
+    for name, function in [("reference_clean_text", reference_clean_text), ("clean_text", clean_text)]:
+        start_time = time.time()
+        for text, title in samples:
+            function(text, title)
+        elapsed = max(time.time() - start_time, 1e-9)
+        print(f"{name}: {total_bytes / 1e6 / elapsed:.1f} Mo/s")
+    print(f"{len(samples) - mismatches}/{len(samples)} textes identiques octet par octet")
+    return mismatches == 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Nettoyage des textes depuis le cache HTML brut du scraper")
+    parser.add_argument("--cache", default=RAW_HTML_DIR, help="Répertoire du cache HTML brut")
+    parser.add_argument("--output", default=os.path.join("data", "piaget_data.json"), help="Fichier JSON de sortie")
+    parser.add_argument("--workers", type=int, default=None, help="Nombre de processus (par défaut: nombre de cœurs)")
+    parser.add_argument("--check", action="store_true",
+                        help="Vérifie que clean_text produit exactement la sortie de l'implémentation historique")
+    parser.add_argument("--fixtures", nargs="*", default=[], help="Pages HTML de contrôle supplémentaires (--check)")
+    args = parser.parse_args()
+    
+    if args.check:
+        cache_dir = args.cache if os.path.exists(os.path.join(args.cache, RAW_HTML_INDEX)) else None
+        raise SystemExit(0 if check_equivalence(cache_dir, args.fixtures) else 1)
+    
+    oeuvres = clean_cache(args.cache, args.workers)
+    tmp_path = args.output + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(oeuvres, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, args.output)
+    print(f"{len(oeuvres)} œuvres sauvegardées dans {args.output}")
+
+if __name__ == '__main__':
+    main()
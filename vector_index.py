@@ -0,0 +1,365 @@
+import json
+import os
+import time
+from typing import Dict, Any, List, Optional
+import faiss
+import numpy as np
+
+def manifest_path(index_path: str) -> str:
+    """Chemin du manifeste associé à un fichier d'index FAISS."""
+    return os.path.splitext(index_path)[0] + ".json"
+
+def write_index_manifest(index_path: str, embedding_model: str, dimension: int, **extra):
+    """Écrit à côté de l'index le modèle d'embedding et la dimension utilisés."""
+    manifest = {
+        'embedding_model': embedding_model,
+        'dimension': int(dimension),
+        'normalized': True
+    }
+    manifest.update(extra)
+    with open(manifest_path(index_path), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+def read_index_manifest(index_path: str) -> Optional[Dict[str, Any]]:
+    """Lit le manifeste de l'index, ou retourne None s'il n'existe pas."""
+    path = manifest_path(index_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+# Types d'index disponibles (toutes les variantes utilisent le produit scalaire)
+INDEX_TYPES = ["flat", "ivf_flat", "hnsw", "ivf_pq"]
+
+# Encodages de stockage des vecteurs
+VECTOR_ENCODINGS = ["float32", "fp16", "int8", "pq"]
+SCALAR_QUANTIZERS = {
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit
+}
+
+# Vecteurs float32 conservés pour la re-notation exacte
+VECTORS_FILENAME = "piaget_vectors.npy"
+
+def default_nlist(n_vectors: int) -> int:
+    """Nombre de listes IVF par défaut (~4·√n, avec au moins 39 vecteurs d'entraînement par liste)."""
+    return max(1, min(int(4 * np.sqrt(n_vectors)), n_vectors // 39))
+
+def build_index(embeddings: np.ndarray, index_type: str = "flat", nlist: Optional[int] = None,
+                hnsw_m: int = 32, pq_m: int = 48, train_size: int = 100000,
+                vector_encoding: str = "float32"):
+    """
+    Construit un index FAISS du type demandé à partir d'embeddings normalisés.
+    
+    Args:
+        embeddings: Matrice float32 (n, d) de vecteurs normalisés
+        index_type: "flat" (exact), "ivf_flat", "hnsw" ou "ivf_pq"
+        nlist: Nombre de listes IVF (par défaut: default_nlist)
+        hnsw_m: Nombre de voisins par nœud du graphe HNSW
+        pq_m: Nombre de sous-quantificateurs PQ (doit diviser la dimension)
+        train_size: Nombre maximum de vecteurs utilisés pour l'entraînement
+        vector_encoding: Stockage des vecteurs : "float32", "fp16", "int8" (quantification
+            scalaire) ou "pq" (quantification par produit, index flat ou ivf_flat)
+    """
+    n_vectors, dimension = embeddings.shape
+    index = new_index(dimension, index_type=index_type, n_vectors=n_vectors, nlist=nlist,
+                      hnsw_m=hnsw_m, pq_m=pq_m, vector_encoding=vector_encoding)
+    train_index(index, embeddings, train_size=train_size)
+    add_in_blocks(index, embeddings)
+    return index
+
+def requires_training(index_type: str, vector_encoding: str = "float32") -> bool:
+    """Indique si l'index doit être entraîné (et donc tous les vecteurs connus) avant tout ajout."""
+    return index_type in ("ivf_flat", "ivf_pq") or vector_encoding in ("int8", "pq")
+
+def new_index(dimension: int, index_type: str = "flat", n_vectors: Optional[int] = None,
+              nlist: Optional[int] = None, hnsw_m: int = 32, pq_m: int = 48, vector_encoding: str = "float32"):
+    """Crée un index FAISS vide (non entraîné) ; voir build_index pour les paramètres.
+
+    `n_vectors` n'est nécessaire que pour calculer le nombre de listes IVF par défaut."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Type d'index inconnu: {index_type} (choix: {', '.join(INDEX_TYPES)})")
+    if vector_encoding not in VECTOR_ENCODINGS:
+        raise ValueError(f"Encodage inconnu: {vector_encoding} (choix: {', '.join(VECTOR_ENCODINGS)})")
+    if index_type == "ivf_pq" and vector_encoding not in ("float32", "pq"):
+        raise ValueError("L'index ivf_pq stocke déjà les vecteurs en quantification par produit")
+    if index_type == "hnsw" and vector_encoding == "pq":
+        raise ValueError("Encodage pq non disponible pour hnsw, utilisez ivf_pq ou fp16/int8")
+    if (vector_encoding == "pq" or index_type == "ivf_pq") and dimension % pq_m != 0:
+        raise ValueError(f"pq_m={pq_m} doit diviser la dimension {dimension}")
+    
+    if index_type == "flat":
+        if vector_encoding in SCALAR_QUANTIZERS:
+            return faiss.IndexScalarQuantizer(dimension, SCALAR_QUANTIZERS[vector_encoding], faiss.METRIC_INNER_PRODUCT)
+        if vector_encoding == "pq":
+            return faiss.IndexPQ(dimension, pq_m, 8, faiss.METRIC_INNER_PRODUCT)
+        return faiss.IndexFlatIP(dimension)
+    if index_type == "hnsw":
+        if vector_encoding in SCALAR_QUANTIZERS:
+            return faiss.IndexHNSWSQ(dimension, SCALAR_QUANTIZERS[vector_encoding], hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        return faiss.IndexHNSWFlat(dimension, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+    
+    if nlist is None:
+        if n_vectors is None:
+            raise ValueError("nlist ou n_vectors est requis pour un index IVF")
+        nlist = default_nlist(n_vectors)
+    quantizer = faiss.IndexFlatIP(dimension)
+    if index_type == "ivf_pq" or vector_encoding == "pq":
+        return faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, 8, faiss.METRIC_INNER_PRODUCT)
+    if vector_encoding in SCALAR_QUANTIZERS:
+        return faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, SCALAR_QUANTIZERS[vector_encoding],
+                                             faiss.METRIC_INNER_PRODUCT)
+    return faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+
+def train_index(index, embeddings: np.ndarray, train_size: int = 100000):
+    """Entraîne l'index si nécessaire sur un échantillon déterministe des embeddings."""
+    if index.is_trained:
+        return
+    n_vectors = len(embeddings)
+    if n_vectors > train_size:
+        sample = np.random.RandomState(0).choice(n_vectors, train_size, replace=False)
+        training_vectors = embeddings[np.sort(sample)]
+    else:
+        training_vectors = embeddings
+    print(f"Entraînement de l'index sur {len(training_vectors)} vecteurs...")
+    index.train(training_vectors)
+
+def add_in_blocks(index, embeddings: np.ndarray, block_size: int = 65536):
+    """Ajoute les vecteurs à l'index par blocs (vues sans copie de la matrice)."""
+    for start in range(0, len(embeddings), block_size):
+        index.add(embeddings[start:start+block_size])
+
+def set_search_params(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """Applique les paramètres de recherche (nprobe pour IVF, efSearch pour HNSW) s'ils s'appliquent à l'index."""
+    if nprobe is not None:
+        try:
+            faiss.extract_index_ivf(index).nprobe = nprobe
+        except RuntimeError:
+            pass  # Pas un index IVF
+    if ef_search is not None:
+        hnsw_index = faiss.downcast_index(index)
+        if hasattr(hnsw_index, 'hnsw'):
+            hnsw_index.hnsw.efSearch = ef_search
+
+def search_parameters(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """
+    Paramètres de recherche propres à un appel (nprobe pour IVF, efSearch pour HNSW).
+    
+    À passer à `index.search(..., params=...)` : contrairement à set_search_params,
+    l'index n'est pas modifié, ce qui permet de le partager entre threads.
+    
+    Returns:
+        faiss.SearchParametersIVF, faiss.SearchParametersHNSW, ou None si aucun
+        paramètre ne s'applique à l'index
+    """
+    index = faiss.downcast_index(index)
+    if nprobe is not None and isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(nprobe=nprobe)
+    if ef_search is not None and isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=ef_search)
+    return None
+
+def evaluate_index(index, reference_index, queries: np.ndarray, k: int = 10,
+                   nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> Dict[str, float]:
+    """
+    Mesure le rappel@k d'un index par rapport à l'index exact et la latence par requête.
+    
+    Returns:
+        Dictionnaire avec recall, p50_ms et p99_ms
+    """
+    _, expected = reference_index.search(queries, k)
+    # Réglage propre à l'évaluation : l'index garde ses paramètres par défaut
+    params = search_parameters(index, nprobe=nprobe, ef_search=ef_search)
+    
+    found = np.empty_like(expected)
+    latencies = np.empty(len(queries))
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, found[i:i+1] = index.search(queries[i:i+1], k, params=params)
+        latencies[i] = time.perf_counter() - start
+    
+    hits = sum(len(set(found[i]) & set(expected[i]) - {-1}) for i in range(len(queries)))
+    return {
+        'recall': hits / (len(queries) * k),
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000)
+    }
+
+def benchmark_index(index, embeddings: np.ndarray, index_type: str, k: int = 10, n_queries: int = 500):
+    """Affiche le rappel@k et la latence p50/p99 de l'index pour plusieurs réglages de recherche."""
+    n_queries = min(n_queries, len(embeddings))
+    sample = np.random.RandomState(1).choice(len(embeddings), n_queries, replace=False)
+    # Requêtes proches des chunks indexés, mais pas identiques
+    queries = embeddings[sample] + np.random.RandomState(2).normal(0, 0.05, (n_queries, embeddings.shape[1])).astype(np.float32)
+    faiss.normalize_L2(queries)
+    
+    reference_index = faiss.IndexFlatIP(embeddings.shape[1])
+    reference_index.add(embeddings)
+    
+    if index_type.startswith("ivf"):
+        settings = [{'nprobe': nprobe} for nprobe in (1, 4, 8, 16, 32, 64)
+                    if nprobe <= faiss.extract_index_ivf(index).nlist]
+    elif index_type == "hnsw":
+        settings = [{'ef_search': ef_search} for ef_search in (16, 32, 64, 128, 256)]
+    else:
+        settings = [{}]
+    
+    print(f"\nÉvaluation de l'index {index_type} ({n_queries} requêtes, k={k}):")
+    results = []
+    for params in settings:
+        metrics = evaluate_index(index, reference_index, queries, k=k, **params)
+        label = ", ".join(f"{name}={value}" for name, value in params.items()) or "exact"
+        print(f"  {label:<16} rappel@{k}={metrics['recall']:.3f}  p50={metrics['p50_ms']:.3f} ms  p99={metrics['p99_ms']:.3f} ms")
+        results.append((params, metrics))
+    return results
+
+def load_index(index_path: str, mmap: bool = False):
+    """
+    Lit un index FAISS, éventuellement projeté en mémoire.
+    
+    Avec `mmap`, les codes des vecteurs (index plats, quantifiés, HNSW) et les listes
+    inversées (IVF) sont lus directement dans le fichier projeté au lieu d'être
+    copiés : tous les processus qui ouvrent le même fichier partagent les mêmes
+    pages du cache du système. Si l'index ne le permet pas, il est lu normalement.
+    """
+    if not mmap:
+        return faiss.read_index(index_path)
+    # IO_FLAG_MMAP_IFC (projection des codes des index plats et HNSW) n'existe que dans
+    # les versions récentes et n'est pas accepté avec les listes inversées des index IVF,
+    # qui ne se projettent qu'avec IO_FLAG_MMAP seul
+    attempts = [faiss.IO_FLAG_MMAP]
+    if hasattr(faiss, 'IO_FLAG_MMAP_IFC'):
+        attempts.insert(0, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_MMAP_IFC)
+    error = None
+    for flags in attempts:
+        try:
+            return faiss.read_index(index_path, flags)
+        except RuntimeError as e:
+            error = e
+    print(f"Avertissement: projection en mémoire de l'index impossible ({error}), lecture complète")
+    return faiss.read_index(index_path)
+
+def memory_report(mapped_paths: Optional[List[str]] = None) -> Optional[Dict[str, int]]:
+    """
+    Mémoire du processus courant, en octets (Linux uniquement, None ailleurs).
+    
+    Returns:
+        Dictionnaire avec 'resident' (RSS), 'shared' (pages partagées avec d'autres
+        processus), 'private', 'anonymous' (tas, copies privées) et 'mapped' (pages
+        résidentes des fichiers `mapped_paths` projetés en mémoire)
+    """
+    try:
+        with open('/proc/self/smaps', 'r') as f:
+            smaps = f.read().splitlines()
+    except OSError:
+        return None
+    fields = {'Rss': 0, 'Shared_Clean': 0, 'Shared_Dirty': 0, 'Private_Clean': 0, 'Private_Dirty': 0, 'Anonymous': 0}
+    mapped = 0
+    targets = {os.path.realpath(path) for path in mapped_paths or []}
+    current_path = None
+    for line in smaps:
+        parts = line.split()
+        if not parts[0].endswith(':'):
+            # En-tête d'une projection : adresses, droits, ..., chemin éventuel
+            current_path = parts[5] if len(parts) > 5 else None
+            continue
+        name = parts[0][:-1]
+        if name in fields:
+            value = int(parts[1]) * 1024
+            fields[name] += value
+            if name == 'Rss' and current_path in targets:
+                mapped += value
+    return {
+        'resident': fields['Rss'],
+        'shared': fields['Shared_Clean'] + fields['Shared_Dirty'],
+        'private': fields['Private_Clean'] + fields['Private_Dirty'],
+        'anonymous': fields['Anonymous'],
+        'mapped': mapped
+    }
+
+def index_size_bytes(index) -> int:
+    """Taille sérialisée de l'index, proche de sa mémoire une fois chargé."""
+    return int(faiss.serialize_index(index).nbytes)
+
+def rescore_candidates(vectors: np.ndarray, query: np.ndarray, indices: np.ndarray, k: int):
+    """
+    Re-note exactement des candidats avec les vecteurs float32 et retourne les k meilleurs.
+    
+    Seules les lignes des candidats sont lues, ce qui, avec une matrice projetée
+    en mémoire, ne charge qu'une petite partie des vecteurs.
+    
+    Args:
+        vectors: Matrice float32 (n, d), éventuellement projetée en mémoire
+        query: Vecteur de requête normalisé (d,)
+        indices: Identifiants des candidats retournés par l'index (-1 ignorés)
+        k: Nombre de résultats à conserver
+    
+    Returns:
+        Tuple (scores, indices) triés par score décroissant
+    """
+    candidates = np.unique(indices[indices >= 0])  # Triés : accès séquentiel au fichier
+    scores = np.asarray(vectors[candidates], dtype=np.float32) @ np.asarray(query, dtype=np.float32)
+    order = np.argsort(-scores, kind='stable')[:k]
+    return scores[order], candidates[order]
+
+def select_diverse(similarities: np.ndarray, groups: np.ndarray, threshold: float, k: int,
+                   per_group: int = 2) -> np.ndarray:
+    """
+    Sélectionne les candidats d'une recherche avec un seuil de similarité et un
+    nombre maximal de résultats par groupe (par exemple par titre).
+    
+    Les candidats sont examinés dans l'ordre donné : chacun est retenu si sa
+    similarité atteint `threshold` et si moins de `per_group` candidats de son
+    groupe l'ont été avant lui, jusqu'à `k` résultats. Le tout est calculé sur les
+    tableaux, sans boucle Python.
+    
+    Args:
+        similarities: Similarité de chaque candidat (n,)
+        groups: Identifiant entier du groupe de chaque candidat (n,)
+        threshold: Similarité minimale
+        k: Nombre maximal de résultats
+        per_group: Nombre maximal de résultats par groupe
+    
+    Returns:
+        Positions des candidats retenus, triées par similarité décroissante
+    """
+    kept = np.flatnonzero(similarities >= threshold)
+    if len(kept) == 0:
+        return kept
+    # Rang de chaque candidat dans son groupe (0 pour le premier, dans l'ordre donné)
+    kept_groups = np.asarray(groups)[kept]
+    order = np.argsort(kept_groups, kind='stable')
+    sorted_groups = kept_groups[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    sizes = np.diff(np.r_[starts, len(sorted_groups)])
+    ranks = np.empty(len(kept), dtype=np.int64)
+    ranks[order] = np.arange(len(kept)) - np.repeat(starts, sizes)
+    kept = kept[ranks < per_group][:k]
+    return kept[np.argsort(-similarities[kept], kind='stable')]
+
+def report_quantization(index, embeddings: np.ndarray, k: int = 10, n_queries: int = 500,
+                        rescore_factor: int = 0, search_params: Optional[Dict[str, Any]] = None):
+    """Affiche l'économie mémoire de l'index quantifié et l'accord de classement avec l'index float32."""
+    params = search_parameters(index, **(search_params or {}))
+    float32_bytes = embeddings.nbytes
+    quantized_bytes = index_size_bytes(index)
+    print(f"\nMémoire des vecteurs: {quantized_bytes / 1e6:.1f} Mo (float32: {float32_bytes / 1e6:.1f} Mo, "
+          f"économie {100 * (1 - quantized_bytes / float32_bytes):.1f}%)")
+    
+    n_queries = min(n_queries, len(embeddings))
+    sample = np.random.RandomState(1).choice(len(embeddings), n_queries, replace=False)
+    queries = embeddings[sample] + np.random.RandomState(2).normal(0, 0.05, (n_queries, embeddings.shape[1])).astype(np.float32)
+    faiss.normalize_L2(queries)
+    
+    reference_index = faiss.IndexFlatIP(embeddings.shape[1])
+    reference_index.add(embeddings)
+    _, expected = reference_index.search(queries, k)
+    _, found = index.search(queries, k, params=params)
+    agreement = np.mean([len(set(found[i]) & set(expected[i])) / k for i in range(n_queries)])
+    print(f"Accord du top-{k} avec l'index float32: {agreement:.3f}")
+    
+    if rescore_factor:
+        _, candidates = index.search(queries, k * rescore_factor, params=params)
+        rescored = [rescore_candidates(embeddings, queries[i], candidates[i], k)[1] for i in range(n_queries)]
+        agreement = np.mean([len(set(rescored[i]) & set(expected[i])) / k for i in range(n_queries)])
+        print(f"Accord du top-{k} après re-notation exacte ({k * rescore_factor} candidats): {agreement:.3f}")
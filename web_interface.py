@@ -1,8 +1,8 @@
 import streamlit as st
 import os
 import time
-import re
-from piaget_rag_engine import PiagetRAG, format_response
+from answer_stream import parse_sources
+from piaget_rag_engine import PiagetRAG, PiagetResources, format_response
 
 # Configuration de la page
 st.set_page_config(
@@ -182,100 +182,20 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Fonction pour analyser et formater les sources avec des liens cliquables
+# Fonction pour formater les sources avec des liens cliquables
 def format_sources_with_links(sources_text):
     """
-    Analyse le texte des sources et le formate avec des liens cliquables et une meilleure présentation.
+    Analyse le texte des sources (voir parse_sources) et le formate avec des liens cliquables et une meilleure présentation.
     """
-    # Vérifier si le texte des sources est vide
-    if not sources_text.strip():
+    sources = parse_sources(sources_text)
+    if not sources:
         return "Aucune source disponible."
     
-    # Supprimer le préfixe "SOURCES :" ou "SOURCES:" s'il existe
-    if sources_text.startswith("SOURCES :") or sources_text.startswith("SOURCES:"):
-        sources_text = sources_text[9:].strip()
+    print(f"[DEBUG] Nombre de blocs de sources détectés: {len(sources)}")
     
-    # Diviser le texte en sources individuelles (numérotées)
     sources_html = ""
-    
-    # Diviser le texte en sources individuelles
-    source_blocks = []
-    lines = sources_text.split('\n')
-    current_block = ""
-    
-    for line in lines:
-        if line.strip() and any(line.strip().startswith(str(i) + ".") for i in range(1, 20)):
-            if current_block:
-                source_blocks.append(current_block.strip())
-            current_block = line
-        else:
-            current_block += "\n" + line if current_block else line
-    
-    if current_block:
-        source_blocks.append(current_block.strip())
-    
-    print(f"[DEBUG] Nombre de blocs de sources détectés: {len(source_blocks)}")
-    
-    # Formater chaque source
-    for i, source in enumerate(source_blocks):
-        # Extraire le numéro de la source (mais ne pas l'afficher)
-        source_num = i + 1
-        
-        # Nettoyer la source en supprimant le numéro au début et les préfixes "SOURCES"
-        cleaned_source = re.sub(r'^\d+\.\s*', '', source).strip()
-        # Supprimer également les préfixes comme "SOURCES1." ou "SOURCES:" qui pourraient se retrouver dans le titre
-        cleaned_source = re.sub(r'^SOURCES\d*\.?\s*', '', cleaned_source).strip()
-        cleaned_source = re.sub(r'^SOURCES\s*:\s*', '', cleaned_source).strip()
-        
-        # Extraire la citation (tout ce qui est entre guillemets)
-        citation_match = re.search(r'"([^"]+)"', cleaned_source)
-        citation = ""
-        if citation_match:
-            citation = citation_match.group(1).strip()
-            # Supprimer la citation du texte restant pour l'analyse
-            remaining_text = cleaned_source.replace(citation_match.group(0), "").strip()
-        else:
-            remaining_text = cleaned_source
-        
-        # Extraire le titre et la date
-        # Chercher un pattern comme "Titre (1972)" ou "- Titre (1972)"
-        title_date_match = re.search(r'[-–—]?\s*([^\(]+)\s*\((\d{4})\)', remaining_text)
-        
-        title = ""
-        date = ""
-        url = ""
-        
-        if title_date_match:
-            title = title_date_match.group(1).strip()
-            # Nettoyer le titre des préfixes indésirables
-            title = re.sub(r'^SOURCES\d*\.?\s*', '', title).strip()
-            title = re.sub(r'^[-–—]\s*', '', title).strip()
-            date = title_date_match.group(2).strip()
-            
-            # Chercher l'URL après le titre et la date
-            after_title_date = remaining_text[remaining_text.find(title_date_match.group(0)) + len(title_date_match.group(0)):]
-            url_match = re.search(r'(https?://\S+)', after_title_date)
-            if url_match:
-                url = url_match.group(1).strip()
-        else:
-            # Essayer un pattern plus simple pour la date seule
-            date_match = re.search(r'\((\d{4})\)', remaining_text)
-            if date_match:
-                date = date_match.group(1).strip()
-                
-                # Essayer de trouver le titre avant la date
-                before_date = remaining_text[:remaining_text.find(date_match.group(0))].strip()
-                if before_date:
-                    # Supprimer les tirets, préfixes SOURCES, et autres séparateurs
-                    title = before_date.strip('- ').strip()
-                    title = re.sub(r'^SOURCES\d*\.?\s*', '', title).strip()
-                    title = re.sub(r'^[-–—]\s*', '', title).strip()
-            
-            # Chercher l'URL
-            url_match = re.search(r'(https?://\S+)', remaining_text)
-            if url_match:
-                url = url_match.group(1).strip()
-        
+    for i, source in enumerate(sources):
+        title, date, url, citation = source['title'], source['date'], source['url'], source['citation']
         print(f"[DEBUG] Source {i+1}: titre='{title}', date='{date}', citation='{citation[:50]}...'")
         
         # Créer le HTML pour cette source
@@ -289,7 +209,7 @@ def format_sources_with_links(sources_text):
         elif date:
             sources_html += f"<div class='source-header'>Ouvrage de {date}</div>\n"
         else:
-            sources_html += f"<div class='source-header'>Source {source_num}</div>\n"
+            sources_html += f"<div class='source-header'>Source {i + 1}</div>\n"
         
         # Afficher le lien vers la source si disponible
         if url:
@@ -300,25 +220,40 @@ def format_sources_with_links(sources_text):
             # Nettoyer la citation (enlever les guillemets supplémentaires)
             clean_citation = citation.replace('"', '').replace('\"', '').strip('. ')
             sources_html += f"<div class='citation'>\"{clean_citation}\"</div>\n"
-        else:
+        elif source['text']:
             # Si pas de citation extraite, utiliser le texte sans les métadonnées
-            # Supprimer le titre, la date et l'URL
-            clean_text = cleaned_source
-            if title:
-                clean_text = clean_text.replace(title, "").strip()
-            if date:
-                clean_text = clean_text.replace(f"({date})", "").strip()
-            if url:
-                clean_text = clean_text.replace(url, "").strip()
-            # Nettoyer les séparateurs restants
-            clean_text = re.sub(r'[-–—]\s*', '', clean_text).strip()
-            if clean_text:
-                sources_html += f"<div class='citation'>{clean_text}</div>\n"
+            sources_html += f"<div class='citation'>{source['text']}</div>\n"
         
         sources_html += "</div>\n"
     
     return sources_html
 
+# Index FAISS, documents, encodeur et caches : chargés une seule fois par processus
+# et partagés par toutes les sessions (chaque session n'a que son client LLM). L'index
+# est projeté en mémoire : les processus d'un même hôte en partagent une seule copie.
+# Le chargement se fait en arrière-plan pendant l'affichage de la page
+@st.cache_resource(show_spinner=False)
+def get_shared_resources():
+    return PiagetResources(mmap_index=True, background=True)
+
+def wait_shared_resources(block=True):
+    """Attend le chargement des ressources partagées (ou vérifie seulement, si `block`
+    est faux, qu'il n'a pas échoué) et les retourne. Un chargement en échec est retiré
+    du cache pour que la prochaine exécution du script le relance, puis son erreur
+    est relancée."""
+    resources = get_shared_resources()
+    try:
+        if not resources.ready():
+            if not block:
+                return resources
+            with st.spinner("Chargement de l'index et des textes de Jean Piaget..."):
+                resources.wait()
+        resources.wait()
+    except Exception:
+        get_shared_resources.clear()
+        raise
+    return resources
+
 # Fonction pour initialiser l'état de session
 def init_session_state():
     # Initialiser les variables d'état de session si elles n'existent pas déjà
@@ -341,7 +276,8 @@ def init_session_state():
         st.session_state.current_model = "gpt-4.1"
 
 # Fonction pour traiter la question et obtenir une réponse
-def process_question(question):
+# La réponse est affichée au fur et à mesure de sa génération dans `answer_placeholder`
+def process_question(question, answer_placeholder=None):
     if not question.strip():
         return
     
@@ -370,7 +306,9 @@ def process_question(question):
     # Initialiser le système RAG si nécessaire
     if 'piaget_rag' not in st.session_state or st.session_state.piaget_rag is None:
         try:
-            st.session_state.piaget_rag = PiagetRAG(model_name=st.session_state.current_model, api_key=st.session_state.api_key)
+            st.session_state.piaget_rag = PiagetRAG(model_name=st.session_state.current_model,
+                                                    api_key=st.session_state.api_key,
+                                                    resources=wait_shared_resources())
         except Exception as e:
             error_message = f"Erreur lors de l'initialisation du système RAG: {str(e)}"
             st.session_state.chat_history.append({"role": "assistant", "content": error_message})
@@ -381,8 +319,13 @@ def process_question(question):
     
     # Obtenir la réponse du système RAG
     try:
-        raw_answer = st.session_state.piaget_rag.answer_question(question)
-        formatted_answer = format_response(raw_answer)
+        stream = st.session_state.piaget_rag.stream_answer(question)
+        shown_answer = ""
+        for token in stream:
+            shown_answer += token
+            if answer_placeholder is not None:
+                answer_placeholder.markdown(shown_answer + "▌")
+        formatted_answer = format_response(stream.text)
     except Exception as e:
         formatted_answer = f"Erreur lors de la génération de la réponse: {str(e)}"
     
@@ -468,10 +411,9 @@ def render_model_controls():
                 
             # Fonction pour mettre à jour la clé API
             def on_api_key_change():
-                # Mettre à jour la clé API dans l'état de session
-                if 'piaget_rag' in st.session_state:
-                    # Supprimer l'instance RAG existante pour forcer sa réinitialisation avec la nouvelle clé
-                    st.session_state.pop('piaget_rag')
+                # Seul le client LLM de la session est recréé avec la nouvelle clé
+                if st.session_state.get('piaget_rag') is not None:
+                    st.session_state.piaget_rag.set_api_key(st.session_state.api_key_input)
             
             # Champ de saisie pour la clé API
             api_key = st.text_input(
@@ -497,9 +439,9 @@ def render_model_controls():
                 
                 # Vérifier si le modèle a changé
                 if 'current_model' in st.session_state and st.session_state.current_model != selected:
-                    # Supprimer l'instance RAG existante pour forcer sa réinitialisation
-                    if 'piaget_rag' in st.session_state:
-                        st.session_state.pop('piaget_rag')
+                    # Changer de modèle ne recharge pas l'index : seul le client LLM change
+                    if st.session_state.get('piaget_rag') is not None:
+                        st.session_state.piaget_rag.set_model(selected)
                     # Mettre à jour le modèle actuel
                     st.session_state.current_model = selected
                 elif 'current_model' not in st.session_state:
@@ -666,6 +608,13 @@ def main():
     # Initialiser l'état de session
     init_session_state()
     
+    # Lancer le chargement des ressources partagées dès le premier affichage
+    # (ou le relancer si le précédent a échoué)
+    try:
+        wait_shared_resources(block=False)
+    except Exception as e:
+        st.error(f"Erreur lors du chargement de l'index et des textes de Jean Piaget: {e}")
+    
     # Afficher la sidebar
     render_sidebar()
     
@@ -735,12 +684,14 @@ def main():
                     st.error("Veuillez entrer votre clé API OpenAI dans l'onglet API des paramètres pour pouvoir utiliser PiaGPT.")
             else:
                 # Afficher l'indicateur de réflexion
+                # (remplacé par la réponse dès l'arrivée des premiers mots)
                 with st.chat_message("assistant", avatar="🧠"):
-                    st.markdown("<p class='thinking'>Jean Piaget réfléchit...</p>", unsafe_allow_html=True)
+                    answer_placeholder = st.empty()
+                    answer_placeholder.markdown("<p class='thinking'>Jean Piaget réfléchit...</p>", unsafe_allow_html=True)
                 
                 # Basculer en mode temporaire pour n'afficher que la question en cours
                 st.session_state.display_mode = "temp"
-                process_question(question_to_process)
+                process_question(question_to_process, answer_placeholder)
 
 if __name__ == "__main__":
     main()